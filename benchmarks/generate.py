@@ -0,0 +1,376 @@
+"""
+Generate a synthetic plate of CellProfiler output for benchmarking.
+
+The plate has one directory per site (e.g. ``A01-1``), holding an image CSV file and either one CSV
+file per compartment or a single object CSV file with a two-row header (compartment, column), as
+consumed by ``cytominer_database.munge``. Column names, types and value ranges follow those of the
+CellProfiler pipelines in ``tests/data_*``; values are random, drawn from a seeded generator, so a
+plate is reproduced exactly by the same arguments.
+
+Example::
+
+    python benchmarks/generate.py path/to/plate --wells 384 --sites 9 --objects 300
+"""
+
+import itertools
+import os
+
+import click
+import numpy as np
+import pandas as pd
+
+CHANNELS = ["DNA", "ER", "RNA", "AGP", "Mito"]
+
+# (category, measurements): measured once per channel, except AreaShape and Neighbors
+CATEGORIES = [
+    (
+        "AreaShape",
+        [
+            "Area",
+            "Center_X",
+            "Center_Y",
+            "Compactness",
+            "Eccentricity",
+            "EulerNumber",
+            "Extent",
+            "FormFactor",
+            "MajorAxisLength",
+            "MaxFeretDiameter",
+            "MaximumRadius",
+            "MeanRadius",
+            "MedianRadius",
+            "MinFeretDiameter",
+            "MinorAxisLength",
+            "Orientation",
+            "Perimeter",
+            "Solidity",
+        ]
+        + [
+            "Zernike_{}_{}".format(n, m)
+            for n in range(10)
+            for m in range(n % 2, n + 1, 2)
+        ],
+    ),
+    ("Neighbors", ["NumberOfNeighbors_Adjacent", "PercentTouching_Adjacent"]),
+    (
+        "Intensity",
+        [
+            "IntegratedIntensity",
+            "IntegratedIntensityEdge",
+            "LowerQuartileIntensity",
+            "MADIntensity",
+            "MassDisplacement",
+            "MaxIntensity",
+            "MaxIntensityEdge",
+            "MeanIntensity",
+            "MeanIntensityEdge",
+            "MedianIntensity",
+            "MinIntensity",
+            "MinIntensityEdge",
+            "StdIntensity",
+            "StdIntensityEdge",
+            "UpperQuartileIntensity",
+        ],
+    ),
+    ("Granularity", [str(n) for n in range(1, 17)]),
+    (
+        "RadialDistribution",
+        [
+            "{}_{}of4".format(measure, ring)
+            for measure in ["FracAtD", "MeanFrac", "RadialCV"]
+            for ring in range(1, 5)
+        ],
+    ),
+    (
+        "Texture",
+        [
+            "{}_{}_{:02d}".format(measure, scale, angle)
+            for measure in [
+                "AngularSecondMoment",
+                "Contrast",
+                "Correlation",
+                "DifferenceVariance",
+                "Entropy",
+                "InverseDifferenceMoment",
+                "SumAverage",
+                "Variance",
+            ]
+            for scale in [3, 5]
+            for angle in [0, 1]
+        ],
+    ),
+]
+
+# features that CellProfiler writes as integers
+INTEGER_FEATURES = [
+    "AreaShape_Area",
+    "AreaShape_EulerNumber",
+    "Neighbors_NumberOfNeighbors_Adjacent",
+]
+
+
+def feature_names(features):
+    """
+    CellProfiler-like feature names.
+
+    :param features: number of features.
+
+    :return: list of ``features`` distinct names. Beyond the names of ``CATEGORIES``, names are numbered.
+    """
+    names = []
+
+    for category, measurements in CATEGORIES:
+        if category in ["AreaShape", "Neighbors"]:
+            names += ["_".join([category, measurement]) for measurement in measurements]
+        else:
+            names += [
+                "_".join([category, measurement, channel])
+                for channel in CHANNELS
+                for measurement in measurements
+            ]
+
+    names += ["Feature_{}".format(n) for n in range(len(names), features)]
+
+    return names[:features]
+
+
+def compartment_table(compartment, objects, features, random_state):
+    """
+    Measurements of the objects of a site in one compartment.
+
+    :param compartment: compartment name, e.g. "Cells".
+    :param objects: number of objects.
+    :param features: number of feature columns.
+    :param random_state: ``numpy.random.RandomState``.
+
+    :return: dataframe with ImageNumber, ObjectNumber, Number_Object_Number and the feature columns.
+    """
+    names = feature_names(features)
+
+    values = random_state.standard_normal((objects, len(names))) * 100.0
+
+    table = pd.DataFrame(values, columns=names)
+
+    for name in INTEGER_FEATURES:
+        if name in table:
+            table[name] = np.abs(table[name]).astype("int64")
+
+    numbers = np.arange(1, objects + 1)
+
+    table.insert(0, "ImageNumber", 1)
+    table.insert(1, "ObjectNumber", numbers)
+    table.insert(2, "Number_Object_Number", numbers)
+
+    if compartment == "Cytoplasm":
+        table.insert(3, "Parent_Cells", numbers)
+        table.insert(4, "Parent_Nuclei", numbers)
+
+    return table
+
+
+def image_table(plate, well, site, counts, random_state):
+    """
+    Per-image measurements and metadata of a site.
+
+    :param plate: plate name.
+    :param well: well name, e.g. "A01".
+    :param site: site number.
+    :param counts: dictionary of the number of objects, keyed by compartment.
+    :param random_state: ``numpy.random.RandomState``.
+
+    :return: single-row dataframe.
+    """
+    row = {
+        "ImageNumber": 1,
+        "Metadata_Plate": plate,
+        "Metadata_Well": well,
+        "Metadata_Site": site,
+        "Metadata_Row": well[0],
+        "Metadata_Col": int(well[1:]),
+    }
+
+    for compartment, count in counts.items():
+        row["Count_{}".format(compartment)] = count
+
+    for channel in CHANNELS:
+        row["FileName_Orig{}".format(channel)] = "{}_{}_s{}_{}.tiff".format(
+            plate, well, site, channel
+        )
+        row["PathName_Orig{}".format(channel)] = "/images/{}".format(plate)
+
+        for measure in [
+            "FocusScore",
+            "LocalFocusScore",
+            "PowerLogLogSlope",
+            "Correlation",
+        ]:
+            row["ImageQuality_{}_Orig{}".format(measure, channel)] = (
+                random_state.random_sample()
+            )
+
+        for measure in [
+            "MeanIntensity",
+            "MedianIntensity",
+            "StdIntensity",
+            "TotalIntensity",
+        ]:
+            row["Intensity_{}_Orig{}".format(measure, channel)] = (
+                random_state.random_sample()
+            )
+
+    return pd.DataFrame([row])
+
+
+def object_table(tables):
+    """
+    Merge the compartment tables of a site into a single object table, whose two-level columns
+    give the compartment and the name of every column (see ``cytominer_database.munge``).
+
+    :param tables: dictionary of compartment tables, keyed by compartment.
+
+    :return: dataframe with a two-level column index.
+    """
+    columns = [("Image", "ImageNumber")]
+    frames = [next(iter(tables.values()))[["ImageNumber"]]]
+
+    for compartment, table in tables.items():
+        table = table.drop(columns="ImageNumber")
+        columns += [(compartment, name) for name in table.columns]
+        frames += [table]
+
+    table = pd.concat(frames, axis=1)
+    table.columns = pd.MultiIndex.from_tuples(columns)
+
+    return table
+
+
+def well_names(wells):
+    """
+    Names of the first ``wells`` wells of a 384-well plate (A01, A02, ..., P24), row by row.
+
+    :param wells: number of wells.
+    """
+    names = [
+        "{}{:02d}".format(row, column)
+        for row, column in itertools.product("ABCDEFGHIJKLMNOP", range(1, 25))
+    ]
+
+    if wells > len(names):
+        raise ValueError("At most {} wells, got {}".format(len(names), wells))
+
+    return names[:wells]
+
+
+def generate_plate(
+    target,
+    wells=4,
+    sites=4,
+    objects=100,
+    compartments=("Cells", "Cytoplasm", "Nuclei"),
+    features=600,
+    object_csv=False,
+    plate="SQ00000001",
+    seed=0,
+):
+    """
+    Write a synthetic plate, one directory per site, and a configuration file (``config.ini``).
+
+    :param target: output directory.
+    :param wells: number of wells.
+    :param sites: number of sites per well.
+    :param objects: mean number of objects per site. The number of every site is drawn from a
+     Poisson distribution, and is the same in all compartments.
+    :param compartments: compartment names.
+    :param features: number of feature columns per compartment.
+    :param object_csv: True if all compartments are written to a single object CSV file (``object.csv``)
+     instead of one CSV file per compartment.
+    :param plate: plate name (``Metadata_Plate``).
+    :param seed: seed of the random values.
+
+    :return: list of the site directories.
+    """
+    random_state = np.random.RandomState(seed)
+
+    directories = []
+
+    for well in well_names(wells):
+        for site in range(1, sites + 1):
+            directory = os.path.join(target, "{}-{}".format(well, site))
+            os.makedirs(directory, exist_ok=True)
+
+            count = int(random_state.poisson(objects))
+
+            tables = {
+                compartment: compartment_table(
+                    compartment, count, features, random_state
+                )
+                for compartment in compartments
+            }
+
+            image_table(
+                plate, well, site, {name: count for name in compartments}, random_state
+            ).to_csv(os.path.join(directory, "Image.csv"), index=False)
+
+            if object_csv:
+                object_table(tables).to_csv(
+                    os.path.join(directory, "object.csv"), index=False
+                )
+            else:
+                for compartment, table in tables.items():
+                    table.to_csv(
+                        os.path.join(directory, compartment + ".csv"), index=False
+                    )
+
+            directories += [directory]
+
+    with open(os.path.join(target, "config.ini"), "w") as fd:
+        fd.write("[filenames]\nimage = Image.csv\n")
+        if object_csv:
+            fd.write("object = object.csv\n")
+
+    return directories
+
+
+@click.command(help="Generate a synthetic plate of CellProfiler output in TARGET.")
+@click.argument("target", type=click.Path(file_okay=False, writable=True))
+@click.option("--wells", default=4, show_default=True, help="Number of wells.")
+@click.option("--sites", default=4, show_default=True, help="Number of sites per well.")
+@click.option(
+    "--objects", default=100, show_default=True, help="Mean number of objects per site."
+)
+@click.option(
+    "--compartments",
+    default="Cells,Cytoplasm,Nuclei",
+    show_default=True,
+    help="Comma-separated compartment names.",
+)
+@click.option(
+    "--features",
+    default=600,
+    show_default=True,
+    help="Number of feature columns per compartment.",
+)
+@click.option(
+    "--object-csv/--no-object-csv",
+    default=False,
+    show_default=True,
+    help="Write a single object CSV file per site, to be munged.",
+)
+@click.option("--seed", default=0, show_default=True, help="Seed of the random values.")
+def command(target, wells, sites, objects, compartments, features, object_csv, seed):
+    directories = generate_plate(
+        target,
+        wells=wells,
+        sites=sites,
+        objects=objects,
+        compartments=tuple(compartments.split(",")),
+        features=features,
+        object_csv=object_csv,
+        seed=seed,
+    )
+
+    click.echo("Wrote {} site directories to {}.".format(len(directories), target))
+
+
+if __name__ == "__main__":
+    command()
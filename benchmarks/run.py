@@ -0,0 +1,466 @@
+"""
+Benchmark the ingestion of a plate by every engine.
+
+Every case runs ``--repeat`` times, each time in a fresh Python process, so that the peak resident set size
+(RSS) of a run is not inflated by an earlier one. The peak RSS includes worker processes. The runner reports:
+
+- wall time (median over the repeats),
+- rows/s: data rows of all input CSV files per second,
+- MB/s: bytes of all input CSV files per second,
+- peak RSS (maximum over the repeats),
+- output MB: size of the database or of the Parquet files (of the last repeat).
+
+The results can be written to a JSON file (``--output``), together with the versions of the package and of
+its dependencies, and compared with the results of an earlier release (``--baseline``).
+
+Example::
+
+    python benchmarks/run.py --wells 24 --sites 9 --objects 300 --output results.json
+    python benchmarks/run.py --source path/to/plate --case ingest_variable_engine:Parquet --workers 4
+"""
+
+import configparser
+import json
+import os
+import platform
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import click
+
+import generate
+
+# case: (module, engine). "munge" splits the object CSV files into compartment CSV files only.
+CASES = {
+    "ingest": ("ingest", "SQLite"),
+    "ingest_variable_engine:Parquet": ("ingest_variable_engine", "Parquet"),
+    "ingest_variable_engine:SQLite": ("ingest_variable_engine", "SQLite"),
+    "munge": ("munge", None),
+}
+
+
+def count_input(source):
+    """
+    Count the data rows and bytes of the CSV files of a plate. The header lines are not counted as
+    rows (two for an object CSV file).
+
+    :param source: plate directory.
+
+    :return: a tuple (rows, bytes).
+    """
+    rows, size = 0, 0
+
+    for directory, _, filenames in os.walk(source):
+        for filename in filenames:
+            if not filename.endswith(".csv"):
+                continue
+
+            path = os.path.join(directory, filename)
+            size += os.path.getsize(path)
+
+            with open(path, "rb") as fd:
+                lines = sum(
+                    chunk.count(b"\n") for chunk in iter(lambda: fd.read(1 << 20), b"")
+                )
+
+            rows += lines - (2 if filename == "object.csv" else 1)
+
+    return rows, size
+
+
+def write_config(source, engine, overrides, path):
+    """
+    Write the configuration file of a case: the configuration of the plate (``config.ini``), the engine,
+    and the sections of an optional override file.
+
+    :param source: plate directory.
+    :param engine: "SQLite", "Parquet" or None.
+    :param overrides: configuration file whose values override the others, or None.
+    :param path: path of the configuration file to write.
+    """
+    config = configparser.ConfigParser()
+    config.read(
+        [os.path.join(source, "config.ini")] + ([overrides] if overrides else [])
+    )
+
+    if engine:
+        if not config.has_section("ingestion_engine"):
+            config.add_section("ingestion_engine")
+        config["ingestion_engine"]["engine"] = engine
+
+    # the checksum cache would make repeated runs faster than the first
+    if not (overrides and config.has_option("ingestion_engine", "checksum_cache")):
+        if not config.has_section("ingestion_engine"):
+            config.add_section("ingestion_engine")
+        config["ingestion_engine"]["checksum_cache"] = ""
+
+    with open(path, "w") as fd:
+        config.write(fd)
+
+
+def peak_rss():
+    """
+    Peak resident set size of this process and of its terminated worker processes, in bytes.
+    """
+    # ru_maxrss is in kilobytes on Linux, in bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+
+    return scale * max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    )
+
+
+def directory_size(directory):
+    """
+    Total size of the files of a directory and of its subdirectories, in bytes.
+    """
+    return sum(
+        os.path.getsize(os.path.join(root, filename))
+        for root, _, filenames in os.walk(directory)
+        for filename in filenames
+    )
+
+
+def run_case(case, source, config_path, workdir, workers, munge):
+    """
+    Run a single case in this process, and return its wall time in seconds.
+
+    :param case: key of ``CASES``.
+    :param source: plate directory.
+    :param config_path: configuration file.
+    :param workdir: empty directory for the output.
+    :param workers: number of worker processes.
+    :param munge: True if object CSV files are split into compartments in memory.
+    """
+    module, engine = CASES[case]
+
+    if engine == "SQLite":
+        target = "sqlite:///{}".format(os.path.join(workdir, "output.sqlite"))
+    else:
+        target = os.path.join(workdir, "output")
+        os.mkdir(target)
+
+    if module == "munge":
+        import cytominer_database.munge
+
+        start = time.perf_counter()
+        cytominer_database.munge.munge(
+            config_path, source, target, workers=workers, force=True
+        )
+        return time.perf_counter() - start
+
+    if module == "ingest":
+        import cytominer_database.ingest
+
+        start = time.perf_counter()
+        cytominer_database.ingest.seed(
+            source, target, config_path, workers=workers, munge=munge
+        )
+        return time.perf_counter() - start
+
+    import cytominer_database.ingest_variable_engine
+
+    start = time.perf_counter()
+    cytominer_database.ingest_variable_engine.seed(
+        source, target, config_path, workers=workers, munge=munge
+    )
+    return time.perf_counter() - start
+
+
+def run_in_process(case, source, config_path, workers, munge):
+    """
+    Run a case in a new Python process.
+
+    :return: dictionary with the wall time ("seconds"), the peak RSS in bytes ("peak_rss")
+     and the size of the output in bytes ("output_bytes").
+    """
+    output = subprocess.run(
+        [
+            sys.executable,
+            os.path.abspath(__file__),
+            "--measure",
+            case,
+            "--source",
+            source,
+            "--config-file",
+            config_path,
+            "--workers",
+            str(workers),
+            "--munge" if munge else "--no-munge",
+        ],
+        check=True,
+        stdout=subprocess.PIPE,
+        universal_newlines=True,
+    ).stdout
+
+    # the result is the last line; the ingest may print messages before
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def summarize(case, runs, rows, size):
+    """
+    Summarize the repeated runs of a case.
+
+    :return: dictionary of the case results.
+    """
+    seconds = statistics.median(run["seconds"] for run in runs)
+
+    return {
+        "case": case,
+        "seconds": seconds,
+        "rows_per_second": rows / seconds,
+        "mb_per_second": size / 1e6 / seconds,
+        "peak_rss_mb": max(run["peak_rss"] for run in runs) / 1e6,
+        "output_mb": runs[-1]["output_bytes"] / 1e6,
+        "runs": runs,
+    }
+
+
+def environment():
+    """
+    Versions of Python, of the package and of its main dependencies.
+    """
+    versions = {"python": platform.python_version(), "platform": platform.platform()}
+
+    for name in ["cytominer_database", "pandas", "pyarrow", "numpy", "sqlalchemy"]:
+        try:
+            module = __import__(name)
+            versions[name] = getattr(module, "__version__", None)
+        except ImportError:
+            versions[name] = None
+
+    if versions["cytominer_database"] is None:
+        try:
+            import pkg_resources
+
+            versions["cytominer_database"] = pkg_resources.get_distribution(
+                "cytominer_database"
+            ).version
+        except Exception:
+            pass
+
+    return versions
+
+
+def print_results(results, baseline=None):
+    """
+    Print a table of the results, with the speedup over a baseline if given.
+
+    :param results: list of case results (see ``summarize``).
+    :param baseline: dictionary of baseline case results, keyed by case.
+    """
+    header = "{:<32} {:>10} {:>12} {:>10} {:>12} {:>10}".format(
+        "case", "seconds", "rows/s", "MB/s", "peak RSS MB", "output MB"
+    )
+
+    if baseline:
+        header += " {:>9}".format("speedup")
+
+    click.echo(header)
+
+    for result in results:
+        line = "{:<32} {:>10.2f} {:>12.0f} {:>10.1f} {:>12.0f} {:>10.1f}".format(
+            result["case"],
+            result["seconds"],
+            result["rows_per_second"],
+            result["mb_per_second"],
+            result["peak_rss_mb"],
+            result["output_mb"],
+        )
+
+        if baseline:
+            previous = baseline.get(result["case"])
+            line += " {:>9}".format(
+                "{:.2f}x".format(previous["seconds"] / result["seconds"])
+                if previous
+                else "-"
+            )
+
+        click.echo(line)
+
+
+@click.command(help="Benchmark the ingestion of a synthetic (or given) plate.")
+@click.option(
+    "--source",
+    type=click.Path(exists=True, file_okay=False),
+    help="Plate to ingest. If not given, a plate is generated.",
+)
+@click.option(
+    "--case",
+    "cases",
+    multiple=True,
+    type=click.Choice(sorted(CASES)),
+    help="Case to run; can be repeated. Default: every case that applies to the plate.",
+)
+@click.option(
+    "-c",
+    "--config-file",
+    type=click.Path(exists=True),
+    help="Configuration file whose values override those of the plate.",
+)
+@click.option(
+    "--workers", default=1, show_default=True, help="Number of worker processes."
+)
+@click.option(
+    "--repeat", default=3, show_default=True, help="Number of runs of every case."
+)
+@click.option(
+    "--munge/--no-munge",
+    default=None,
+    help="Split object CSV files in memory. Default: if the plate has object CSV files.",
+)
+@click.option(
+    "--output",
+    type=click.Path(dir_okay=False, writable=True),
+    help="JSON file of the results.",
+)
+@click.option(
+    "--baseline",
+    type=click.Path(exists=True, dir_okay=False),
+    help="JSON file of earlier results to compare with.",
+)
+@click.option(
+    "--wells", default=4, show_default=True, help="Generated plate: number of wells."
+)
+@click.option(
+    "--sites",
+    default=4,
+    show_default=True,
+    help="Generated plate: number of sites per well.",
+)
+@click.option(
+    "--objects",
+    default=100,
+    show_default=True,
+    help="Generated plate: mean number of objects per site.",
+)
+@click.option(
+    "--features",
+    default=600,
+    show_default=True,
+    help="Generated plate: number of feature columns per compartment.",
+)
+@click.option(
+    "--object-csv/--no-object-csv",
+    default=False,
+    show_default=True,
+    help="Generated plate: write object CSV files.",
+)
+@click.option("--measure", type=click.Choice(sorted(CASES)), hidden=True)
+def command(
+    source,
+    cases,
+    config_file,
+    workers,
+    repeat,
+    munge,
+    output,
+    baseline,
+    wells,
+    sites,
+    objects,
+    features,
+    object_csv,
+    measure,
+):
+    if measure:
+        # single run in a new process, called by run_in_process(): the config file is the case configuration
+        workdir = tempfile.mkdtemp()
+        try:
+            seconds = run_case(measure, source, config_file, workdir, workers, munge)
+            output_bytes = directory_size(workdir)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+        click.echo(
+            json.dumps(
+                {
+                    "seconds": seconds,
+                    "peak_rss": peak_rss(),
+                    "output_bytes": output_bytes,
+                }
+            )
+        )
+        return
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        if source is None:
+            source = os.path.join(temp_dir, "plate")
+            click.echo(
+                "Generating a plate of {} wells x {} sites in {}.".format(
+                    wells, sites, source
+                )
+            )
+            generate.generate_plate(
+                source,
+                wells=wells,
+                sites=sites,
+                objects=objects,
+                features=features,
+                object_csv=object_csv,
+            )
+
+        has_object_csv = configparser.ConfigParser()
+        has_object_csv.read(os.path.join(source, "config.ini"))
+        has_object_csv = has_object_csv.has_option("filenames", "object")
+
+        if munge is None:
+            munge = has_object_csv
+
+        if not cases:
+            cases = [
+                case for case in sorted(CASES) if case != "munge" or has_object_csv
+            ]
+
+        rows, size = count_input(source)
+
+        click.echo("{} rows, {:.1f} MB of CSV files.".format(rows, size / 1e6))
+
+        results = []
+
+        for case in cases:
+            config_path = os.path.join(
+                temp_dir, "config_{}.ini".format(case.replace(":", "_"))
+            )
+            write_config(source, CASES[case][1], config_file, config_path)
+
+            runs = [
+                run_in_process(case, source, config_path, workers, munge)
+                for _ in range(repeat)
+            ]
+
+            results += [summarize(case, runs, rows, size)]
+
+    previous = None
+
+    if baseline:
+        with open(baseline, "r") as fd:
+            previous = {result["case"]: result for result in json.load(fd)["results"]}
+
+    print_results(results, previous)
+
+    if output:
+        with open(output, "w") as fd:
+            json.dump(
+                {
+                    "environment": environment(),
+                    "input": {
+                        "rows": rows,
+                        "bytes": size,
+                        "workers": workers,
+                        "munge": munge,
+                    },
+                    "results": results,
+                },
+                fd,
+                indent=2,
+            )
+
+
+if __name__ == "__main__":
+    command()
@@ -4,8 +4,9 @@ import os
 import pkg_resources
 
 import cytominer_database.ingest
+import cytominer_database.instrumentation
+import cytominer_database.progress
 import cytominer_database.ingest_variable_engine
-import cytominer_database.munge
 
 """
 Runs new code (ingest_variable_engine.py instead of ingest.py).
@@ -44,7 +45,18 @@ TARGET is a connection string for the database.
     help="""\
 True if the CSV files for individual compartments \
 have been merged into a single CSV file; \
-the CSV will be split into one CSV per compartment \
+the CSV will be split into one table per compartment \
+in memory (Default: true).
+""",
+)
+@click.option(
+    "--write-munged/--no-write-munged",
+    default=True,
+    help="""\
+True if, with --munge, the CSV file of every compartment \
+should be written next to the merged CSV file, as earlier \
+versions did. The compartments are ingested from memory \
+either way; use --no-write-munged to skip writing them \
 (Default: true).
 """,
 )
@@ -68,13 +80,111 @@ which backend engine is used (path of which is passed as a flag).\
 Default: False (--no-variable-engine) 
 """,
 )
-def command(source, target, config_file, munge, skip_image_prefix, variable_engine):
-    if munge:
-        cytominer_database.munge.munge(config_path=config_file, source=source)
+@click.option(
+    "--workers",
+    default=1,
+    type=click.IntRange(min=1),
+    help="""\
+Number of worker processes. With --variable-engine, workers \
+parse and type-convert the CSV files and a single process writes. \
+Otherwise, each worker ingests into its own SQLite shard, and the \
+shards are merged into TARGET at the end (Default: 1).
+""",
+)
+@click.option(
+    "--resume/--no-resume",
+    default=False,
+    help="""\
+True if the directories that have been ingested by a \
+previous, interrupted run and have not changed since \
+should be skipped. The completed directories are only \
+recorded in the manifest (_ingest_manifest) with --resume, \
+so start an ingest that may have to be resumed with \
+--resume as well (Default: false).
+""",
+)
+@click.option(
+    "--trace",
+    default=None,
+    type=click.Path(file_okay=False, writable=True),
+    help="""\
+Directory to which the duration, row and byte counts of \
+every stage of the ingest are written: a summary by \
+stage, table and file (ingest_summary.json) and a \
+timeline in Chrome trace format (ingest_trace.json). \
+Not recorded if not given.
+""",
+)
+@click.option(
+    "--progress/--no-progress",
+    default=True,
+    help="""\
+True if the progress of the ingest (directories done, \
+rows and MB written, rows/s, MB/s and ETA) should be \
+reported on the standard error and to the metrics file, \
+if any (Default: true).
+""",
+)
+@click.option(
+    "--progress-interval",
+    default=60.0,
+    type=click.FloatRange(min=0),
+    help="""\
+Minimum number of seconds between two progress reports \
+(Default: 60).
+""",
+)
+@click.option(
+    "--metrics-file",
+    default=None,
+    type=click.Path(dir_okay=False, writable=True),
+    help="""\
+File to which the progress is written at every report, \
+in the Prometheus text format, e.g. for the textfile \
+collector of a node exporter. Not written if not given.
+""",
+)
+def command(
+    source,
+    target,
+    config_file,
+    munge,
+    write_munged,
+    skip_image_prefix,
+    variable_engine,
+    workers,
+    resume,
+    trace,
+    progress,
+    progress_interval,
+    metrics_file,
+):
+    progress = cytominer_database.progress.Progress(
+        progress_interval if progress else None, metrics_file
+    )
 
-    if variable_engine:
-        cytominer_database.ingest_variable_engine.seed(
-            source, target, config_file, skip_image_prefix
-        )
-    else:
-        cytominer_database.ingest.seed(source, target, config_file, skip_image_prefix)
+    with cytominer_database.instrumentation.recording(trace):
+        if variable_engine:
+            cytominer_database.ingest_variable_engine.seed(
+                source,
+                target,
+                config_file,
+                skip_image_prefix,
+                workers=workers,
+                resume=resume,
+                munge=munge,
+                write_munged=write_munged,
+                progress=progress,
+            )
+        else:
+            cytominer_database.ingest.seed(
+                source,
+                target,
+                config_file,
+                skip_image_prefix,
+                workers=workers,
+                resume=resume,
+                munge=munge,
+                write_munged=write_munged,
+                progress=progress,
+            )
@@ -38,18 +38,29 @@ Example::
 """
 
 import os.path
+import concurrent.futures
 import csv
+import io
+import sqlite3
 import click
 import warnings
-import zlib
 
+import numpy as np
 import pandas as pd
 import tempfile
 import sqlalchemy.exc
 from sqlalchemy import create_engine
+from sqlalchemy.engine.url import make_url
 from sqlalchemy.pool import NullPool
 
+import cytominer_database.instrumentation
+import cytominer_database.inventory
+import cytominer_database.load
+import cytominer_database.manifest
+import cytominer_database.munge
+import cytominer_database.progress
 import cytominer_database.utils
+import cytominer_database.write
 
 
 def __format__(name, header):
@@ -59,16 +70,58 @@ def __format__(name, header):
     return "{}_{}".format(name, header)
 
 
-def into(input, output, name, identifier, con, skip_table_prefix=False):
+def into(
+    input,
+    output,
+    name,
+    identifier,
+    con,
+    skip_table_prefix=False,
+    buffer=None,
+    bulk_insert=False,
+    chunk_rows=None,
+    dataframes=None,
+    progress=None,
+):
     """Ingest a CSV file into a table in a database.
 
     :param input: Input CSV file.
-    :param output: Connection string for the database.
+    :param output: Connection string for the database. Only used if ``con`` is None.
     :param name: Table in database into which the CSV file will be ingested
     :param identifier: Unique identifier for ``input``.
+    :param con: Open connection to the database, shared by all files of an ingest.
+     If None, a connection is opened (and closed) for this file only.
     :param skip_table_prefix: True if the prefix of the table name should be excluded
      from the names of columns.
+    :param buffer: Content of ``input``. If given, it is parsed instead of reading ``input``.
+    :param bulk_insert: True if the rows should be written with a prepared executemany insert
+     (SQLite bulk-load mode, requires ``con``).
+    :param chunk_rows: If given, ``input`` is read and written in chunks of ``chunk_rows`` rows,
+     so that only one chunk is held in memory at a time.
+    :param dataframes: If given, an iterable of dataframes that are ingested instead of reading ``input``,
+     e.g. a compartment split from an object CSV file (see ``cytominer_database.munge.read_compartments``).
+    :param progress: ``cytominer_database.progress.Progress`` that counts the rows written, or None.
+
+    :return: Number of rows ingested.
     """
+    if con is None:
+        engine = create_engine(output, poolclass=NullPool)
+        with engine.connect() as con:
+            number_of_rows = into(
+                input,
+                output,
+                name,
+                identifier,
+                con,
+                skip_table_prefix=skip_table_prefix,
+                buffer=buffer,
+                chunk_rows=chunk_rows,
+                dataframes=dataframes,
+                progress=progress,
+            )
+        engine.dispose()
+
+        return number_of_rows
 
     with warnings.catch_warnings():
         # Suppress the following warning on Python 3:
@@ -76,49 +129,81 @@ def into(input, output, name, identifier, con, skip_table_prefix=False):
         #   /usr/local/lib/python3.6/site-packages/odo/utils.py:128: DeprecationWarning: inspect.getargspec() is
         #     deprecated, use inspect.signature() or inspect.getfullargspec()
         warnings.simplefilter("ignore", category=DeprecationWarning)
-        engine = create_engine(output)
-        con = engine.connect()
-
-        df = pd.read_csv(input)
-        # add "name" prefix to column headers
-        if not skip_table_prefix:
-            no_prefix = ["ImageNumber", "ObjectNumber"]  # exception columns
-            prefixed_columns = []
-            for col in df.columns:
-                if col in no_prefix:
-                    prefixed_columns += [col]
-                else:
-                    prefixed_columns += ["{}_{}".format(name, col)]
-            df.columns = prefixed_columns
-        # add TableNumber
-        number_of_rows, _ = df.shape
-        table_number_column = [identifier] * number_of_rows  # create additional column
-        df.insert(0, "TableNumber", table_number_column, allow_duplicates=False)
-        df.to_sql(name=name, con=con, if_exists="append", index=False)
 
+        if dataframes is not None:
+            chunks = dataframes
+        elif chunk_rows:
+            chunks = cytominer_database.load.read_csv_chunks(input, chunk_rows)
+        else:
+            chunks = [pd.read_csv(input if buffer is None else io.BytesIO(buffer))]
 
-def checksum(pathname, buffer_size=65536):
-    """
-    Generate a 32-bit unique identifier for a file.
+        number_of_rows = 0
 
-    :param buffer_size: buffer size
-    :param pathname: input file
-    """
-    with open(pathname, "rb") as stream:
-        result = zlib.crc32(bytes(0))
+        chunks = iter(chunks)
 
         while True:
-            buffer = stream.read(buffer_size)
-
-            if not buffer:
+            with cytominer_database.instrumentation.stage(
+                "parse", name, input
+            ) as timer:
+                df = next(chunks, None)
+                if df is not None:
+                    timer.count(rows=df.shape[0])
+
+            if df is None:
                 break
 
-            result = zlib.crc32(buffer, result)
+            # add "name" prefix to column headers
+            if not skip_table_prefix:
+                no_prefix = ["ImageNumber", "ObjectNumber"]  # exception columns
+                prefixed_columns = []
+                for col in df.columns:
+                    if col in no_prefix:
+                        prefixed_columns += [col]
+                    else:
+                        prefixed_columns += ["{}_{}".format(name, col)]
+                df.columns = prefixed_columns
+            # add TableNumber
+            rows, _ = df.shape
+            table_number_column = [identifier] * rows  # create additional column
+            df.insert(0, "TableNumber", table_number_column, allow_duplicates=False)
+
+            with cytominer_database.instrumentation.stage(
+                "write", name, input, rows=rows
+            ):
+                if bulk_insert:
+                    cytominer_database.write.insert_rows(df, name, con)
+                else:
+                    df.to_sql(name=name, con=con, if_exists="append", index=False)
+
+            if progress is not None:
+                progress.add_table(name, df)
+
+            number_of_rows += rows
+
+    return number_of_rows
 
-    return result & 0xFFFFFFFF
 
+def checksum(pathname, buffer_size=65536):
+    """
+    Generate a 32-bit unique identifier for a file (see ``cytominer_database.utils.checksum``).
 
-def seed(source, target, config_path, skip_image_prefix=True):
+    :param buffer_size: unused, kept for backward compatibility
+    :param pathname: input file
+    """
+    return cytominer_database.utils.checksum(pathname)
+
+
+def seed(
+    source,
+    target,
+    config_path,
+    skip_image_prefix=True,
+    workers=1,
+    resume=False,
+    munge=False,
+    write_munged=False,
+    progress=None,
+):
     """
     Read CSV files into a database backend.
     :param source: Directory containing subdirectories that contain CSV files.
@@ -127,57 +212,499 @@ def seed(source, target, config_path, skip_image_prefix=True):
 
     :param skip_image_prefix: True if the prefix of image table name should be excluded
      from the names of columns from per image table
+    :param workers: Number of worker processes. If larger than 1, every worker ingests
+     a contiguous share of the subdirectories into its own SQLite shard database, and the
+     shards are merged into ``target`` afterwards (SQLite targets only).
+    :param resume: True if the directories that have been ingested by a previous, interrupted run
+     and have not changed since should be skipped (see ``cytominer_database.manifest``). The
+     manifest is only written with ``resume``, so an ingest can only be resumed if it was
+     started with ``resume``.
+    :param munge: True if the object CSV file of every subdirectory should be split into one table
+     per compartment in memory, and ingested instead of compartment CSV files
+     (see ``cytominer_database.munge.read_compartments``).
+    :param write_munged: True if, with ``munge``, the CSV file of every compartment should be
+     written as well, as ``cytominer_database.munge.munge`` does.
+    :param progress: ``cytominer_database.progress.Progress`` that reports the directories done and the rows
+     written. With several workers, the progress of a shard is reported when it is merged.
+     Default: nothing is reported.
     """
+    if workers < 1:
+        raise ValueError("workers must be at least 1, got {}".format(workers))
+
+    if progress is None:
+        progress = cytominer_database.progress.Progress(interval=None)
+
     config_file = cytominer_database.utils.read_config(config_path)
 
-    # list the subdirectories that contain CSV files
-    directories = sorted(list(cytominer_database.utils.find_directories(source)))
+    cytominer_database.utils.check_precision(config_file)
 
-    engine = create_engine(target, poolclass=NullPool)
+    # list the subdirectories that contain CSV files, once for all stages
+    inventory = cytominer_database.inventory.open_inventory(config_file, source)
+
+    directories = inventory.directories
+
+    # TableNumbers of unchanged image CSVs are not computed again
+    cache = cytominer_database.utils.open_checksum_cache(config_file)
+
+    # a single engine and connection are used for all files
+    engine = cytominer_database.write.create_database_engine(target, config_file)
     con = engine.connect()
-    
+
+    try:
+        # skip the directories that were completed by a previous run
+        if resume:
+            tables = cytominer_database.manifest.table_names(
+                config_file, directories, munge, inventory
+            )
+        else:
+            tables = ()
+
+        completed = cytominer_database.manifest.open_table_manifest(
+            con, source, config_file, resume, cache, inventory, tables
+        )
+
+        directories = [
+            directory
+            for directory in directories
+            if cytominer_database.manifest.directory_key(source, directory)
+            not in completed
+        ]
+
+        progress.start(len(directories))
+
+        if workers == 1:
+            ingest_directories(
+                directories,
+                target,
+                config_file,
+                con,
+                skip_image_prefix,
+                # the completed directories are recorded with resume only
+                source if resume else None,
+                cache,
+                munge=munge,
+                write_munged=write_munged,
+                inventory=inventory,
+                progress=progress,
+            )
+    finally:
+        con.close()
+        engine.dispose()
+        cache.save()
+
+    if workers > 1:
+        seed_sharded(
+            directories,
+            target,
+            config_file,
+            skip_image_prefix,
+            workers,
+            source if resume else None,
+            munge=munge,
+            write_munged=write_munged,
+            inventory=inventory,
+            progress=progress,
+        )
+
+    progress.close()
+
+
+def ingest_directories(
+    directories,
+    target,
+    config_file,
+    con,
+    skip_image_prefix=True,
+    source=None,
+    cache=None,
+    munge=False,
+    write_munged=False,
+    inventory=None,
+    progress=None,
+):
+    """
+    Read the CSV files of a list of directories into a database backend.
+    Directories with invalid CSV files are skipped. Completed directories are
+    recorded in the manifest table (see ``cytominer_database.manifest``).
+
+    :param directories: Subdirectories that contain CSV files.
+    :param target: Connection string for the database.
+    :param config_file: Parsed configuration (output of ``cytominer_database.utils.read_config``).
+    :param con: Open connection to ``target``.
+    :param skip_image_prefix: True if the prefix of image table name should be excluded
+     from the names of columns from per image table
+    :param source: Directory containing the subdirectories. Directories are recorded in the
+     manifest relative to ``source``. If None, the manifest is not written.
+    :param cache: ``cytominer_database.utils.ChecksumCache`` of the image CSV checksums.
+    :param munge: True if object CSV files should be split into compartments in memory (see ``seed``).
+    :param write_munged: True if the munged compartments should be written to CSV files as well.
+    :param inventory: ``cytominer_database.inventory.Inventory`` of the directories. If None, they are listed.
+    :param progress: ``cytominer_database.progress.Progress`` that counts the directories done and the rows
+     written, or None.
+    """
+    if progress is None:
+        progress = cytominer_database.progress.Progress(interval=None)
+
+    # SQLite bulk-load mode: prepared inserts, one transaction per directory (or per N rows)
+    bulk_load = (
+        con.dialect.name == "sqlite"
+        and cytominer_database.write.is_bulk_load(config_file)
+    )
+    if bulk_load:
+        transaction = cytominer_database.write.BulkTransaction(
+            con, int(config_file["sqlite"]["transaction_rows"])
+        )
+
+    # files larger than max_memory are read in chunks (see cytominer_database.utils.is_streamed)
+    chunk_rows = int(config_file["ingestion_engine"]["chunk_rows"])
+
     for directory in directories:
         # get the image CSV and the CSVs for each of the compartments
         try:
-            compartments, image = cytominer_database.utils.validate_csv_set(
-                config_file, directory
+            compartments, image, scans = cytominer_database.utils.read_csv_set(
+                config_file, directory, cache, inventory
             )
         except IOError as e:
             click.echo(e)
+            progress.end_directory()
             continue
         except sqlalchemy.exc.DatabaseError as e:
             click.echo(e)
+            progress.end_directory()
             continue
 
+        # split the object CSV into compartments in memory. These replace the compartment
+        # CSVs written by an earlier munge.
+        object_csv, munged = None, {}
+
+        if munge:
+            try:
+                object_csv, munged = cytominer_database.munge.read_compartments(
+                    config_file, directory, write_munged, inventory
+                )
+            except IOError as e:
+                click.echo(e)
+                progress.end_directory()
+                continue
+
+            munged_names = [name.capitalize() for name in munged]
+
+            compartments = [
+                compartment
+                for compartment in compartments
+                if cytominer_database.utils.get_name(compartment) not in munged_names
+            ]
+
         # get a unique identifier for the image CSV. This will later be used as the TableNumber column
         # the casting to int is to allow the database to be readable by CellProfiler Analyst, which
         # requires TableNumber to be an integer.
-        identifier = checksum(image)
+        identifier, image_buffer = scans[image]
         name, _ = os.path.splitext(config_file["filenames"]["image"])
 
         # ingest the image CSV
         try:
-            into(
+            rows = into(
                 input=image,
                 output=target,
                 name=name.capitalize(),
                 identifier=identifier,
                 con=con,
-                skip_table_prefix=skip_image_prefix
+                skip_table_prefix=skip_image_prefix,
+                buffer=image_buffer,
+                bulk_insert=bulk_load,
+                chunk_rows=chunk_rows if image_buffer is None else None,
+                progress=progress,
             )
         except sqlalchemy.exc.DatabaseError as e:
             click.echo(e)
+            progress.end_directory()
             continue
 
         # ingest the CSV for each compartment
         for compartment in compartments:
             name, _ = os.path.splitext(os.path.basename(compartment))
 
-            into(
+            _, buffer = scans[compartment]
+
+            rows += into(
                 input=compartment,
                 output=target,
                 name=name.capitalize(),
                 identifier=identifier,
-                con=con
+                con=con,
+                buffer=buffer,
+                bulk_insert=bulk_load,
+                chunk_rows=chunk_rows if buffer is None else None,
+                progress=progress,
             )
-    con.close()
+
+        for name, dataframe in munged.items():
+            rows += into(
+                input=object_csv,
+                output=target,
+                name=name.capitalize(),
+                identifier=identifier,
+                con=con,
+                bulk_insert=bulk_load,
+                dataframes=dataframe() if callable(dataframe) else [dataframe],
+                progress=progress,
+            )
+
+        # record the completed directory
+        if source is not None:
+            filenames = [image] + compartments + ([object_csv] if object_csv else [])
+
+            cytominer_database.manifest.record_table_entry(
+                con,
+                source,
+                cytominer_database.manifest.directory_entry(
+                    directory, identifier, filenames, inventory
+                ),
+            )
+
+        if bulk_load:
+            transaction.add(rows)
+            transaction.end_directory()
+
+        progress.end_directory()
+
+    if bulk_load:
+        transaction.close()
+
+
+def seed_shard(
+    directories,
+    target,
+    config_file,
+    skip_image_prefix=True,
+    source=None,
+    munge=False,
+    write_munged=False,
+    inventory=None,
+):
+    """
+    Read the CSV files of a list of directories into a shard database.
+    This is run in a worker process by ``seed_sharded``.
+
+    :param directories: Subdirectories that contain CSV files.
+    :param target: Connection string for the shard database.
+    :param config_file: Parsed configuration (output of ``cytominer_database.utils.read_config``).
+    :param skip_image_prefix: True if the prefix of image table name should be excluded
+     from the names of columns from per image table
+    :param source: Directory containing the subdirectories (see ``ingest_directories``).
+    :param munge: True if object CSV files should be split into compartments in memory (see ``seed``).
+    :param write_munged: True if the munged compartments should be written to CSV files as well.
+    :param inventory: ``cytominer_database.inventory.Inventory`` of the directories. If None, they are listed.
+
+    :return: ``target``
+    """
+    cache = cytominer_database.utils.open_checksum_cache(config_file)
+
+    engine = cytominer_database.write.create_database_engine(target, config_file)
+    con = engine.connect()
+
+    try:
+        if source is not None:
+            cytominer_database.manifest.manifest_table().create(con, checkfirst=True)
+
+        ingest_directories(
+            directories,
+            target,
+            config_file,
+            con,
+            skip_image_prefix,
+            source,
+            cache,
+            munge=munge,
+            write_munged=write_munged,
+            inventory=inventory,
+        )
+    finally:
+        con.close()
+        engine.dispose()
+        cache.save()
+
+    return target
+
+
+def seed_sharded(
+    directories,
+    target,
+    config_file,
+    skip_image_prefix=True,
+    workers=2,
+    source=None,
+    munge=False,
+    write_munged=False,
+    inventory=None,
+    progress=None,
+):
+    """
+    Read CSV files into a SQLite database using several processes.
+
+    SQLite allows only a single writer. The directories are therefore split into ``workers``
+    contiguous groups, each of which is ingested by a separate process into its own
+    shard database. The shards are merged into ``target`` in directory order, so that the
+    result is the same as that of a serial ingestion.
+
+    :param directories: Sorted subdirectories that contain CSV files.
+    :param target: Connection string for the SQLite database.
+    :param config_file: Parsed configuration (output of ``cytominer_database.utils.read_config``).
+    :param skip_image_prefix: True if the prefix of image table name should be excluded
+     from the names of columns from per image table
+    :param workers: Number of worker processes (and shards).
+    :param source: Directory containing the subdirectories (see ``ingest_directories``).
+    :param munge: True if object CSV files should be split into compartments in memory (see ``seed``).
+    :param write_munged: True if the munged compartments should be written to CSV files as well.
+    :param inventory: ``cytominer_database.inventory.Inventory`` of the directories. Every worker
+     receives the inventory of its own directories only.
+    :param progress: ``cytominer_database.progress.Progress`` that counts the directories and rows of every
+     shard when it is merged, or None.
+    """
+    url = make_url(target)
+
+    if url.get_backend_name() != "sqlite" or url.database in [None, "", ":memory:"]:
+        raise ValueError(
+            "Parallel ingestion requires a file-based SQLite target, got {}".format(
+                target
+            )
+        )
+
+    groups = [
+        group.tolist() for group in np.array_split(directories, workers) if len(group)
+    ]
+
+    # keep the shards on the same file system as the target, which makes the final merge cheap
+    shard_directory = os.path.dirname(os.path.abspath(url.database))
+
+    with tempfile.TemporaryDirectory(dir=shard_directory) as temp_dir:
+        shards = [
+            "sqlite:///{}".format(
+                os.path.join(temp_dir, "shard_{}.sqlite".format(index))
+            )
+            for index in range(len(groups))
+        ]
+
+        # the stages run by the workers are recorded there and sent back with their result
+        ingest_shard = cytominer_database.instrumentation.remote(seed_shard)
+
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(
+                    ingest_shard,
+                    group,
+                    shard,
+                    config_file,
+                    skip_image_prefix,
+                    source,
+                    munge,
+                    write_munged,
+                    inventory.subset(group) if inventory is not None else None,
+                )
+                for group, shard in zip(groups, shards)
+            ]
+
+            # merge shards in order, as soon as they are done
+            for group, future in zip(groups, futures):
+                shard = cytominer_database.instrumentation.receive(future.result())
+
+                with cytominer_database.instrumentation.stage("merge"):
+                    rows = merge_shard(
+                        make_url(shard).database,
+                        url.database,
+                        cytominer_database.write.get_sqlite_pragmas(config_file),
+                    )
+
+                if progress is not None:
+                    for name, count in rows.items():
+                        progress.add(name, count)
+
+                    progress.end_directory(len(group))
+
+
+def merge_shard(shard, database, pragmas=()):
+    """
+    Append all tables of a SQLite shard database to the tables of the same name in ``database``,
+    using ``ATTACH`` and ``INSERT ... SELECT`` in a single transaction. Tables missing in
+    ``database`` are created with the schema of the shard.
+
+    :param shard: Path to the shard database file.
+    :param database: Path to the target SQLite database file.
+    :param pragmas: PRAGMA statements to execute on the target database first
+     (see ``cytominer_database.write.get_sqlite_pragmas``).
+
+    :return: dictionary of the number of rows appended to every table, except the manifest table.
+    """
+    connection = sqlite3.connect(database, isolation_level=None)
+
+    try:
+        for pragma in pragmas:
+            connection.execute(pragma)
+
+        # ATTACH is not allowed inside a transaction
+        connection.execute("ATTACH DATABASE ? AS shard", (shard,))
+
+        connection.execute("BEGIN")
+
+        rows = append_shard_tables(connection)
+
+        connection.execute("COMMIT")
+
+        connection.execute("DETACH DATABASE shard")
+    finally:
+        # a failed merge leaves the target database unchanged; closing detaches the shard
+        if connection.in_transaction:
+            connection.execute("ROLLBACK")
+
+        connection.close()
+
+    return rows
+
+
+def append_shard_tables(connection):
+    """
+    Append all tables of the attached database ``shard`` to the tables of the same name in the
+    main database, in the current transaction (see ``merge_shard``).
+
+    :param connection: sqlite3 connection to the target database, with the shard attached as ``shard``.
+
+    :return: dictionary of the number of rows appended to every table, except the manifest table.
+    """
+    existing = [
+        row[0]
+        for row in connection.execute(
+            "SELECT name FROM main.sqlite_master WHERE type = 'table'"
+        )
+    ]
+
+    rows = {}
+
+    shard_tables = connection.execute(
+        "SELECT name, sql FROM shard.sqlite_master WHERE type = 'table'"
+    ).fetchall()
+
+    for name, create_statement in shard_tables:
+        if name not in existing:
+            connection.execute(create_statement)
+
+        columns = ", ".join(
+            '"{}"'.format(row[1])
+            for row in connection.execute('PRAGMA shard.table_info("{}")'.format(name))
+        )
+
+        # directories of the manifest may have been recorded by a previous run
+        if name == cytominer_database.manifest.MANIFEST_TABLE:
+            statement = "INSERT OR REPLACE"
+        else:
+            statement = "INSERT"
+
+        cursor = connection.execute(
+            '{statement} INTO main."{name}" ({columns}) SELECT {columns} FROM shard."{name}" ORDER BY rowid'.format(
+                statement=statement, name=name, columns=columns
+            )
+        )
+
+        if name != cytominer_database.manifest.MANIFEST_TABLE:
+            rows[name] = cursor.rowcount
+
+    return rows
@@ -46,23 +46,43 @@ Example:
 """
 import csv
 import click
-import zlib
+import concurrent.futures
+import functools
+import os
 import pandas as pd
 import tempfile
+import warnings
 import sqlalchemy.exc
 from sqlalchemy import create_engine
+from sqlalchemy.pool import NullPool
 import pyarrow
 import pyarrow.parquet as pq
 import pyarrow.csv
 import collections
 import numpy as np
 import cytominer_database
+import cytominer_database.instrumentation
+import cytominer_database.inventory
+import cytominer_database.manifest
+import cytominer_database.munge
+import cytominer_database.progress
 import cytominer_database.utils
 import cytominer_database.write
 import cytominer_database.tableSchema
 
 
-def seed(source, output_path, config_path, skip_image_prefix=True, directories=None):
+def seed(
+    source,
+    output_path,
+    config_path,
+    skip_image_prefix=True,
+    directories=None,
+    workers=1,
+    resume=False,
+    munge=False,
+    write_munged=False,
+    progress=None,
+):
     """
     Main function. Loads configuration. Opens ParquetWriter.
     Calls writer function. Closes ParquetWriter.
@@ -73,48 +93,508 @@ def seed(source, output_path, config_path, skip_image_prefix=True, directories=N
      the image.csv files should be prefixed with the table name ("Image").
     :directories: Pass subdirectories path list instead of generating a
         path list from the source path. Added to test special cases. Can be removed.
+    :workers: number of worker processes that validate, checksum, parse and type-convert
+     the CSV files. All writes are done by the calling process, in directory order,
+     so the output matches a serial ingestion row for row. The reference tables
+     of the sampled schema are validated by worker processes as well. Default: 1 (serial).
+    :resume: skip the directories that have been ingested by a previous, interrupted run
+     and have not changed since, as recorded in the manifest (see cytominer_database.manifest).
+     The manifest is only written with resume (or with [parquet] checkpoint_directories), so an
+     ingest can only be resumed if it was started with resume.
+    :munge: split the object .csv file of every directory into one table per compartment in memory,
+     and ingest these tables instead of compartment .csv files (see cytominer_database.munge.read_compartments()).
+    :write_munged: with munge, also write the .csv file of every compartment, as cytominer_database.munge.munge() does.
+    :progress: cytominer_database.progress.Progress that reports the directories done and the rows written.
+     Default: nothing is reported.
 
     """
+    if workers < 1:
+        raise ValueError("workers must be at least 1, got {}".format(workers))
+
+    if progress is None:
+        progress = cytominer_database.progress.Progress(interval=None)
+
     config = cytominer_database.utils.read_config(config_path)
     engine = config["ingestion_engine"]["engine"]
+    # [schema] precision = single is ignored for SQLite
+    cytominer_database.utils.check_precision(config)
+    # TableNumbers of unchanged image CSVs are not computed again
+    cache = cytominer_database.utils.open_checksum_cache(config)
+    # the site directories are listed once, for all stages
+    inventory = cytominer_database.inventory.open_inventory(config, source, directories)
 
-    # get dictionary that contains [name]["writer"], [name]["schema"], [name]["pandas_dataframe"]
+    # with resume, completed directories are recorded in a manifest. Parquet files of a previous run
+    # are moved aside before the writers (re)create them, unless the tables are written
+    # to part files that are closed (checkpointed) every N directories.
+    checkpoint_directories = 0
+    if engine == "Parquet":
+        checkpoint_directories = (
+            cytominer_database.tableSchema.get_checkpoint_directories(config)
+        )
+        if resume and config["parquet"]["layout"] == "partitioned":
+            warnings.warn(
+                "A partitioned Parquet dataset cannot be resumed. Ingesting all directories.",
+                UserWarning,
+            )
+            resume = False
+    if checkpoint_directories:
+        completed, part = cytominer_database.manifest.open_checkpoint_manifest(
+            output_path, source, config, resume, cache, inventory
+        )
+    elif engine == "Parquet":
+        (
+            completed,
+            previous_files,
+            table_numbers,
+        ) = cytominer_database.manifest.open_file_manifest(
+            output_path, source, config, resume, cache, inventory
+        )
+    # get dictionary that contains [name]["writer"], [name]["schema"]
     writers_dict = cytominer_database.tableSchema.open_writers(
-        source, output_path, config, skip_image_prefix
+        source, output_path, config, skip_image_prefix, munge, workers, inventory
     )
     # lists the subdirectories that contain CSV files
     if not directories:
-        directories = sorted(list(cytominer_database.utils.find_directories(source)))
-    # ----------------------------- iterate over subfolders in source folder------------------------------------
-    for directory in directories:
-        # ....................... get input .csv file paths ......................
-        try:
-            compartments, image = cytominer_database.utils.validate_csv_set(
-                config, directory
+        directories = inventory.directories
+    # a single database engine and connection are used for all files
+    db_engine, con = open_connection(output_path, engine, config)
+    # SQLite bulk-load mode: prepared inserts, one transaction per directory (or per N rows)
+    bulk_load = con is not None and cytominer_database.write.is_bulk_load(config)
+    try:
+        if engine == "SQLite":
+            # without a reference schema, the tables are named after the .csv files
+            if writers_dict:
+                tables = list(writers_dict)
+            elif resume:
+                tables = cytominer_database.manifest.table_names(
+                    config, directories, munge, inventory
+                )
+            else:
+                tables = ()
+            completed = cytominer_database.manifest.open_table_manifest(
+                con, source, config, resume, cache, inventory, tables
+            )
+            if writers_dict:
+                cytominer_database.write.create_tables(writers_dict, con)
+        elif checkpoint_directories:
+            checkpoint(writers_dict, part)
+            # entries of the directories written to the current part files
+            pending = []
+        else:
+            cytominer_database.manifest.copy_previous_tables(
+                previous_files, table_numbers, writers_dict
             )
-        except IOError as e:
-            click.echo(e)
-            continue
-
-        identifier = checksum(image)
-        csv_locations = [image] + compartments
-        # ----------------------------------- iterate over .csv's ---------------------------------------
-        for input_path in csv_locations:
-            table_name = cytominer_database.utils.get_name(input_path)
+        directories = [
+            directory
+            for directory in directories
+            if cytominer_database.manifest.directory_key(source, directory)
+            not in completed
+        ]
+        progress.start(len(directories))
+        if bulk_load:
+            transaction = cytominer_database.write.BulkTransaction(
+                con, int(config["sqlite"]["transaction_rows"])
+            )
+        # ----------------------------- iterate over subfolders in source folder------------------------------------
+        for result, error in map_directories(
+            directories,
+            config,
+            skip_image_prefix,
+            workers,
+            cache,
+            munge,
+            write_munged,
+            inventory,
+            cytominer_database.tableSchema.get_parse_schemas(writers_dict, config),
+        ):
+            if error:
+                click.echo(error)
+                progress.end_directory()
+                continue
+            tables, entry = result
+            # ----------------------------------- iterate over .csv's ---------------------------------------
+            for table_name, dataframe in tables:
+                # large files are loaded here, one chunk at a time (see load_chunks())
+                chunks = dataframe() if callable(dataframe) else [dataframe]
+                for chunk in chunks:
+                    cytominer_database.write.write_to_disk(
+                        chunk,
+                        table_name,
+                        output_path,
+                        engine,
+                        writers_dict,
+                        con=con,
+                        bulk_insert=bulk_load,
+                    )
+                    if bulk_load:
+                        transaction.add(len(chunk))
+                    progress.add_table(table_name, chunk)
+            # ------------------------------- record completed directory ----------------------------------
+            if engine == "SQLite" and resume:
+                cytominer_database.manifest.record_table_entry(con, source, entry)
+            elif checkpoint_directories:
+                pending.append(dict(entry, checkpoint=part))
+                if len(pending) == checkpoint_directories:
+                    part = record_checkpoint(
+                        writers_dict, part, pending, output_path, source
+                    )
+            elif engine == "Parquet" and resume:
+                cytominer_database.manifest.record_file_entry(
+                    output_path, source, entry
+                )
+            if bulk_load:
+                transaction.end_directory()
+            progress.end_directory()
+        if bulk_load:
+            transaction.close()
+        if checkpoint_directories:
+            record_checkpoint(writers_dict, part, pending, output_path, source)
+        progress.close()
+    finally:
+        # --------------------------------------- close writers ---------------------------------------------
+        close_writers(writers_dict, engine)
+        close_connection(db_engine, con)
+        cache.save()
+
+
+def load_directory(
+    directory,
+    config,
+    skip_image_prefix=True,
+    cache=None,
+    munge=False,
+    write_munged=False,
+    inventory=None,
+    schemas=None,
+):
+    """
+    Validates, checksums, parses and type-converts all .csv files of a single directory.
+    Returns a list of (table_name, dataframe) tuples, image table first, and the manifest
+    entry of the directory (see cytominer_database.manifest.directory_entry()). The tables
+    are pyarrow tables if the Parquet engine is used with the arrow csv_reader, and pandas
+    dataframes otherwise. Files that are too large to be read at once (see
+    cytominer_database.utils.is_streamed()) are not loaded: their table is replaced by a
+    callable that returns an iterator over chunks of the table (see load_chunks()).
+    Does not write anything, so that it can run in a worker process.
+    Raises IOError if the directory does not contain a valid set of .csv files.
+    :param directory: directory containing the .csv files of one site
+    :param config: parsed configuration data (output from cytominer_database.utils.read_config(config_path))
+    :param skip_image_prefix: Boolean value specifying if the column headers of
+     the image.csv files should be prefixed with the table name ("Image").
+    :param cache: cytominer_database.utils.ChecksumCache of the image CSV checksums
+    :param munge: Boolean value specifying if the object .csv file is split into one table per
+     compartment in memory (see cytominer_database.munge.read_compartments()). These tables
+     replace the compartment .csv files of an earlier munge.
+    :param write_munged: Boolean value specifying if the munged compartments are written to .csv files as well.
+    :param inventory: cytominer_database.inventory.Inventory of the directory. If None, the directory is listed.
+    :param schemas: dictionary of the pyarrow schemas of the table kinds (see
+     cytominer_database.tableSchema.get_parse_schemas()). The .csv file of a table kind with a schema
+     is parsed with the column types of the schema, and is not type-converted afterwards.
+    """
+    # ....................... get input .csv file paths ......................
+    # every file is read once: validation, checksum and parsing share the same buffer
+    compartments, image, scans = cytominer_database.utils.read_csv_set(
+        config, directory, cache, inventory
+    )
+
+    identifier, _ = scans[image]
+    object_csv, munged = None, {}
+    if munge:
+        object_csv, munged = cytominer_database.munge.read_compartments(
+            config, directory, write_munged, inventory
+        )
+        munged_names = [name.capitalize() for name in munged]
+        compartments = [
+            compartment
+            for compartment in compartments
+            if cytominer_database.utils.get_name(compartment) not in munged_names
+        ]
+    csv_reader = config["ingestion_engine"]["csv_reader"]
+    # Parquet output parsed by Arrow stays in Arrow end to end
+    arrow_native = (
+        config["ingestion_engine"]["engine"] == "Parquet" and csv_reader == "arrow"
+    )
+    tables = []
+    for input_path in [image] + compartments:
+        table_name = cytominer_database.utils.get_name(input_path)
+        schema = schemas.get(table_name) if schemas else None
+        _, buffer = scans[input_path]
+        if buffer is None:
+            chunks = functools.partial(
+                load_chunks, input_path, identifier, skip_image_prefix, config
+            )
+            tables += [(table_name, chunks)]
+        elif arrow_native:
+            table = cytominer_database.load.get_and_modify_table(
+                input_path, identifier, skip_image_prefix, buffer=buffer, schema=schema
+            )
+            if schema is None:
+                with cytominer_database.instrumentation.stage(
+                    "type_convert", table_name, input_path, rows=table.num_rows
+                ):
+                    table = cytominer_database.utils.type_convert_table(table, config)
+            tables += [(table_name, table)]
+        else:
             dataframe = cytominer_database.load.get_and_modify_df(
-                input_path, identifier, skip_image_prefix
+                input_path,
+                identifier,
+                skip_image_prefix,
+                buffer=buffer,
+                csv_reader=csv_reader,
+                schema=schema,
+            )
+            # SQLite tables are not cast to the schema (see cytominer_database.write.write_to_disk())
+            if schema is None or config["ingestion_engine"]["engine"] == "SQLite":
+                with cytominer_database.instrumentation.stage(
+                    "type_convert", table_name, input_path, rows=dataframe.shape[0]
+                ):
+                    dataframe = cytominer_database.utils.type_convert_dataframe(
+                        dataframe, config
+                    )
+            tables += [(table_name, dataframe)]
+    # the compartments of the object .csv file never pass through a .csv file
+    for compartment_name, dataframe in munged.items():
+        if callable(dataframe):
+            chunks = functools.partial(
+                load_munged_chunks, dataframe, identifier, config
             )
-            cytominer_database.utils.type_convert_dataframe(dataframe, config)
-            cytominer_database.write.write_to_disk(
-                dataframe, table_name, output_path, engine, writers_dict
+            tables += [(compartment_name.capitalize(), chunks)]
+        else:
+            cytominer_database.load.add_tableNumber(dataframe, identifier)
+            with cytominer_database.instrumentation.stage(
+                "type_convert", compartment_name.capitalize(), rows=dataframe.shape[0]
+            ):
+                dataframe = cytominer_database.utils.type_convert_dataframe(
+                    dataframe, config
+                )
+            tables += [(compartment_name.capitalize(), dataframe)]
+    filenames = [image] + compartments + ([object_csv] if object_csv else [])
+    entry = cytominer_database.manifest.directory_entry(
+        directory, identifier, filenames, inventory
+    )
+    return tables, entry
+
+
+def load_chunks(input_path, identifier, skip_image_prefix, config):
+    """
+    Lazily yields the type-converted pandas dataframes of a .csv file, in chunks of
+    [ingestion_engine] chunk_rows rows, so that only one chunk is held in memory at a time.
+    Chunks are always parsed by pandas, whatever the csv_reader.
+    :param input_path: .csv file
+    :param identifier: TableNumber of the directory
+    :param skip_image_prefix: Boolean value specifying if the column headers of
+     the image.csv files should be prefixed with the table name ("Image").
+    :param config: parsed configuration data (output from cytominer_database.utils.read_config(config_path))
+    """
+    for dataframe in cytominer_database.load.get_and_modify_chunks(
+        input_path,
+        identifier,
+        skip_image_prefix,
+        int(config["ingestion_engine"]["chunk_rows"]),
+    ):
+        with cytominer_database.instrumentation.stage(
+            "type_convert",
+            cytominer_database.utils.get_name(input_path),
+            input_path,
+            rows=dataframe.shape[0],
+        ):
+            dataframe = cytominer_database.utils.type_convert_dataframe(
+                dataframe, config
             )
-    # --------------------------------------- close writers ---------------------------------------------
-    close_writers(writers_dict, engine)
+        yield dataframe
+
+
+def load_munged_chunks(chunks, identifier, config):
+    """
+    Lazily yields the type-converted chunks of a compartment that is split from a large
+    object .csv file (see cytominer_database.munge.read_compartments()).
+    :param chunks: callable that returns an iterator over the dataframes of the compartment
+    :param identifier: TableNumber of the directory
+    :param config: parsed configuration data (output from cytominer_database.utils.read_config(config_path))
+    """
+    for dataframe in chunks():
+        cytominer_database.load.add_tableNumber(dataframe, identifier)
+        with cytominer_database.instrumentation.stage(
+            "type_convert", rows=dataframe.shape[0]
+        ):
+            dataframe = cytominer_database.utils.type_convert_dataframe(
+                dataframe, config
+            )
+        yield dataframe
+
+
+def _try_load_directory(
+    directory,
+    config,
+    skip_image_prefix,
+    cache=None,
+    munge=False,
+    write_munged=False,
+    inventory=None,
+    schemas=None,
+):
+    """
+    Calls load_directory() and returns a (result, error message) tuple instead of
+    raising IOError, so that a single invalid directory does not abort the worker pool.
+    """
+    try:
+        result = load_directory(
+            directory,
+            config,
+            skip_image_prefix,
+            cache,
+            munge,
+            write_munged,
+            inventory,
+            schemas,
+        )
+        return result, None
+    except IOError as e:
+        return None, str(e)
+
+
+def map_directories(
+    directories,
+    config,
+    skip_image_prefix=True,
+    workers=1,
+    cache=None,
+    munge=False,
+    write_munged=False,
+    inventory=None,
+    schemas=None,
+):
+    """
+    Lazily yields the ((tables, manifest entry), error message) tuple of every directory, in the order of ``directories``.
+    With more than one worker, the directories are loaded by a process pool. At most
+    2 * workers directories are loaded ahead of the consumer, which bounds the memory
+    held by finished but not yet written tables.
+    :param directories: list of directories containing .csv files
+    :param config: parsed configuration data (output from cytominer_database.utils.read_config(config_path))
+    :param skip_image_prefix: Boolean value specifying if the column headers of
+     the image.csv files should be prefixed with the table name ("Image").
+    :param workers: number of worker processes
+    :param cache: cytominer_database.utils.ChecksumCache of the image CSV checksums. Worker
+     processes do not share it: the checksums they compute are added to it by this process.
+    :param munge: split object .csv files in memory (see load_directory())
+    :param write_munged: write the munged compartments to .csv files as well
+    :param inventory: cytominer_database.inventory.Inventory of the directories. Worker processes
+     receive the inventory of their directory only.
+    :param schemas: pyarrow schemas applied by the parser, keyed by table kind (see load_directory())
+    """
+    load = functools.partial(
+        _try_load_directory,
+        config=config,
+        skip_image_prefix=skip_image_prefix,
+        munge=munge,
+        write_munged=write_munged,
+        schemas=schemas,
+    )
+    if workers <= 1:
+        for directory in directories:
+            yield load(directory, cache=cache, inventory=inventory)
+        return
+
+    # the stages run by the workers are recorded there and sent back with their result
+    load = cytominer_database.instrumentation.remote(load)
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = collections.deque()
+        for directory in directories:
+            pending.append(
+                executor.submit(
+                    load,
+                    directory,
+                    inventory=(
+                        inventory.subset([directory]) if inventory is not None else None
+                    ),
+                )
+            )
+            if len(pending) >= 2 * workers:
+                yield _cache_checksum(_receive(pending.popleft()), config, cache)
+        while pending:
+            yield _cache_checksum(_receive(pending.popleft()), config, cache)
+
+
+def _receive(future):
+    """
+    Returns the result of a directory loaded by a worker process, and records the stages it ran
+    (see cytominer_database.instrumentation.remote()).
+    """
+    return cytominer_database.instrumentation.receive(future.result())
+
+
+def _cache_checksum(loaded, config, cache):
+    """
+    Adds the checksum of the image CSV of a directory loaded by a worker process to the cache,
+    unless the file has changed since (its size differs from the manifest entry).
+    Returns ``loaded`` unchanged.
+    """
+    result, _ = loaded
+    if cache is not None and result is not None:
+        _, entry = result
+        filename = config["filenames"]["image"]
+        image = os.path.join(entry["directory"], filename)
+        if os.path.getsize(image) == entry["files"][filename]:
+            cache.put(image, entry["table_number"])
+    return loaded
 
 
 # --------------------------------------------- end ---------------------------------------------------
 
 
+def open_connection(output_path, engine, config):
+    """
+    Creates the database engine and opens the connection that is used for all writes.
+    Returns (None, None) for the Parquet engine.
+    :param output_path: connection string for the database
+    :param engine: "Parquet" or "SQLite"
+    :param config: parsed configuration data (output from cytominer_database.utils.read_config(config_path))
+    """
+    if engine != "SQLite":
+        return None, None
+    db_engine = cytominer_database.write.create_database_engine(output_path, config)
+    return db_engine, db_engine.connect()
+
+
+def close_connection(db_engine, con):
+    """
+    Closes the connection and disposes of the database engine opened by open_connection().
+    :param db_engine: database engine, or None
+    :param con: database connection, or None
+    """
+    if con is not None:
+        con.close()
+    if db_engine is not None:
+        db_engine.dispose()
+
+
+def checkpoint(writers_dict, part):
+    """
+    Closes the part files of every table kind (see cytominer_database.write.CheckpointedParquetWriter).
+    :param writers_dict: dictionary containing the references to the writers of every table kind
+    :param part: number of the next part files
+    """
+    for name in writers_dict.keys():
+        writers_dict[name]["writer"].checkpoint(part)
+
+
+def record_checkpoint(writers_dict, part, pending, output_path, source):
+    """
+    Closes the current part files, then records the directories written to them in the manifest.
+    Returns the number of the next part files.
+    :param writers_dict: dictionary containing the references to the writers of every table kind
+    :param part: number of the current part files
+    :param pending: manifest entries of the directories written to the current part files; emptied
+    :param output_path: Parquet output directory
+    :param source: directory containing the site directories
+    """
+    checkpoint(writers_dict, part + 1)
+    for entry in pending:
+        cytominer_database.manifest.record_file_entry(output_path, source, entry)
+    del pending[:]
+    return part + 1
+
+
 def close_writers(writers_dict, engine):
     """
     Close the Parquet writers
@@ -128,15 +608,8 @@ def close_writers(writers_dict, engine):
 
 def checksum(pathname, buffer_size=65536):
     """
-    Generate a 32-bit unique identifier for a file.
+    Generate a 32-bit unique identifier for a file (see cytominer_database.utils.checksum()).
     :param pathname: input file
-    :param buffer_size: buffer size
-    """
-    with open(pathname, "rb") as stream:
-        result = zlib.crc32(bytes(0))
-        while True:
-            buffer = stream.read(buffer_size)
-            if not buffer:
-                break
-            result = zlib.crc32(buffer, result)
-    return result & 0xFFFFFFFF
+    :param buffer_size: unused, kept for backward compatibility
+    """
+    return cytominer_database.utils.checksum(pathname)
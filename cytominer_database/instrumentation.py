@@ -0,0 +1,307 @@
+"""
+Per-stage timing of an ingest.
+
+The hot path of an ingest is divided into stages (reading, validating and checksumming a file, parsing it,
+type conversion, conversion to Arrow, writing, ...). Each stage is wrapped in ``stage``:
+
+Example::
+
+    with cytominer_database.instrumentation.stage("parse", table="Cells", filename=path) as timer:
+        dataframe = pd.read_csv(path)
+        timer.count(rows=dataframe.shape[0])
+
+Recording is disabled by default, and ``stage`` then returns a shared no-op context manager, so that an
+instrumented ingest costs only a function call per stage and file. Recording is enabled by ``recording``,
+which writes, when it ends,
+
+- ``ingest_summary.json``: total duration, row and byte counts of every stage, by table kind and by file, and
+- ``ingest_trace.json``: a timeline of every stage in the Chrome trace event format, which can be opened with
+  ``chrome://tracing`` or https://ui.perfetto.dev.
+
+Stages run in worker processes are recorded if the function sent to the worker is wrapped with ``remote``
+and its result is passed to ``receive``.
+"""
+
+import collections
+import contextlib
+import json
+import os
+import threading
+import time
+
+SUMMARY_FILENAME = "ingest_summary.json"
+TRACE_FILENAME = "ingest_trace.json"
+
+# the recorder of this process, None if recording is disabled
+_recorder = None
+
+
+class NullStage(object):
+    """
+    Stage that records nothing, returned by ``stage`` if recording is disabled.
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def count(self, rows=None, bytes=None):
+        pass
+
+
+NULL_STAGE = NullStage()
+
+
+class Stage(object):
+    """
+    Stage being recorded. Its duration is measured between ``__enter__`` and ``__exit__``.
+
+    :param recorder: ``Recorder`` of the event.
+    :param name: stage name.
+    :param args: table kind ("table"), file ("filename"), and row and byte counts of the stage.
+    """
+
+    def __init__(self, recorder, name, args):
+        self.recorder = recorder
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.recorder.add(
+            {
+                "name": self.name,
+                "start": self.start,
+                "duration": time.perf_counter_ns() - self.start,
+                "pid": os.getpid(),
+                "tid": threading.get_ident(),
+                "args": self.args,
+            }
+        )
+        return False
+
+    def count(self, rows=None, bytes=None):
+        """
+        Set the number of rows or bytes processed by the stage.
+        """
+        if rows is not None:
+            self.args["rows"] = int(rows)
+        if bytes is not None:
+            self.args["bytes"] = int(bytes)
+
+
+class Recorder(object):
+    """
+    Collects the events of the recorded stages. Times are ``time.perf_counter_ns`` values, which share
+    their origin across the processes of a machine on Linux and macOS.
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter_ns()
+        self.events = []
+
+    def add(self, event):
+        # list.append is atomic, so threads can share a recorder
+        self.events.append(event)
+
+
+def is_enabled():
+    """
+    Check whether stages are recorded in this process.
+    """
+    return _recorder is not None
+
+
+def stage(name, table=None, filename=None, rows=None, bytes=None):
+    """
+    Context manager recording the duration of a stage, if recording is enabled.
+
+    :param name: stage name, e.g. "parse".
+    :param table: table kind, e.g. "Cells".
+    :param filename: file processed by the stage.
+    :param rows: number of rows processed, if known beforehand (see ``Stage.count``).
+    :param bytes: number of bytes processed, if known beforehand.
+    """
+    if _recorder is None:
+        return NULL_STAGE
+
+    args = {}
+
+    if table is not None:
+        args["table"] = table
+    if filename is not None:
+        args["filename"] = filename
+
+    timer = Stage(_recorder, name, args)
+    timer.count(rows, bytes)
+
+    return timer
+
+
+@contextlib.contextmanager
+def recording(directory):
+    """
+    Record the stages run in this context, then write the summary and the trace to ``directory``.
+    The files are written even if an exception is raised, e.g. when an ingest is interrupted.
+
+    :param directory: output directory of the summary and the trace. It is created if necessary.
+     If None, nothing is recorded.
+    """
+    global _recorder
+
+    if directory is None:
+        yield None
+        return
+
+    recorder = _recorder = Recorder()
+
+    try:
+        yield recorder
+    finally:
+        _recorder = None
+        write(recorder, directory)
+
+
+RecordedResult = collections.namedtuple("RecordedResult", ["result", "events"])
+
+
+def remote(function):
+    """
+    Wrap a function that is run in a worker process, so that the stages it runs are recorded there
+    and sent back with its result (see ``receive``). If recording is disabled, ``function`` is returned.
+
+    :param function: picklable function.
+    """
+    if _recorder is None:
+        return function
+
+    return RemoteFunction(function)
+
+
+class RemoteFunction(object):
+    """
+    Picklable wrapper returned by ``remote``.
+    """
+
+    def __init__(self, function):
+        self.function = function
+
+    def __call__(self, *args, **kwargs):
+        global _recorder
+
+        previous, _recorder = _recorder, Recorder()
+
+        try:
+            result = self.function(*args, **kwargs)
+        finally:
+            events, _recorder = _recorder.events, previous
+
+        return RecordedResult(result, events)
+
+
+def receive(result):
+    """
+    Unwrap the result of a function wrapped by ``remote``, and add the events of the worker process
+    to the recorder of this process.
+
+    :param result: result returned by the worker process.
+
+    :return: the result of the function.
+    """
+    if not isinstance(result, RecordedResult):
+        return result
+
+    if _recorder is not None:
+        _recorder.events.extend(result.events)
+
+    return result.result
+
+
+def summarize(events):
+    """
+    Aggregate events by stage, by table kind and stage, and by file and stage.
+
+    :param events: list of recorded events.
+
+    :return: dictionary with keys "stages", "tables" and "files". Every aggregate holds the number of
+     events ("count"), their total duration in seconds ("seconds"), and their row and byte counts.
+    """
+
+    def aggregate():
+        return {"count": 0, "seconds": 0.0, "rows": 0, "bytes": 0}
+
+    summary = {
+        "stages": collections.defaultdict(aggregate),
+        "tables": collections.defaultdict(lambda: collections.defaultdict(aggregate)),
+        "files": collections.defaultdict(lambda: collections.defaultdict(aggregate)),
+    }
+
+    for event in events:
+        args = event["args"]
+
+        targets = [summary["stages"][event["name"]]]
+
+        if "table" in args:
+            targets += [summary["tables"][args["table"]][event["name"]]]
+        if "filename" in args:
+            targets += [summary["files"][args["filename"]][event["name"]]]
+
+        for target in targets:
+            target["count"] += 1
+            target["seconds"] += event["duration"] / 1e9
+            target["rows"] += args.get("rows", 0)
+            target["bytes"] += args.get("bytes", 0)
+
+    return json.loads(json.dumps(summary))
+
+
+def trace_events(events, origin):
+    """
+    Convert events to the Chrome trace event format ("complete" events, in microseconds).
+
+    :param events: list of recorded events.
+    :param origin: ``time.perf_counter_ns`` value of the start of the trace.
+    """
+    return [
+        {
+            "name": event["name"],
+            "cat": event["args"].get("table", "ingest"),
+            "ph": "X",
+            "ts": (event["start"] - origin) / 1e3,
+            "dur": event["duration"] / 1e3,
+            "pid": event["pid"],
+            "tid": event["tid"],
+            "args": event["args"],
+        }
+        for event in events
+    ]
+
+
+def write(recorder, directory):
+    """
+    Write the summary and the trace of the recorded events.
+
+    :param recorder: ``Recorder``.
+    :param directory: output directory. It is created if necessary.
+    """
+    os.makedirs(directory, exist_ok=True)
+
+    summary = summarize(recorder.events)
+    summary["seconds"] = (time.perf_counter_ns() - recorder.start) / 1e9
+
+    with open(os.path.join(directory, SUMMARY_FILENAME), "w") as fd:
+        json.dump(summary, fd, indent=2, sort_keys=True)
+
+    with open(os.path.join(directory, TRACE_FILENAME), "w") as fd:
+        json.dump(
+            {
+                "traceEvents": trace_events(recorder.events, recorder.start),
+                "displayTimeUnit": "ms",
+            },
+            fd,
+        )
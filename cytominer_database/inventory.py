@@ -0,0 +1,257 @@
+"""
+An index of the CSV files of the site directories of a plate.
+
+Every stage of an ingest (directory discovery, reference sampling, schema inference, validation and the
+manifest) needs the list of CSV files of every site directory and their sizes. Instead of listing and
+stat-ing every directory once per stage, ``scan`` lists each directory once with ``os.scandir`` and keeps
+the path, size, modification time and table kind of every CSV file in memory.
+
+On high-latency file systems (Lustre, NFS), the directories can be listed by several threads, set by
+``[inventory] threads``. With ``[inventory] recursive = true``, the site directories are searched at
+any depth below the source directory: every directory that contains a CSV file is a site directory.
+Otherwise, the site directories are the subdirectories of the source directory.
+"""
+
+import collections
+import concurrent.futures
+import os
+
+import cytominer_database.utils
+
+FileEntry = collections.namedtuple("FileEntry", ["path", "size", "mtime_ns", "name"])
+FileEntry.__doc__ = """
+A CSV file of the inventory.
+
+:param path: path of the file.
+:param size: size of the file in bytes.
+:param mtime_ns: modification time of the file in nanoseconds.
+:param name: table kind, i.e. the capitalized basename without extension (e.g. "Cells").
+"""
+
+
+def is_csv(filename):
+    """
+    Check whether a file is a CSV file, i.e. a file that ``glob.glob("*.csv")`` would match.
+
+    :param filename: basename of the file.
+    """
+    return filename.endswith(".csv") and not filename.startswith(".")
+
+
+def scan_directory(directory):
+    """
+    List a directory once.
+
+    :param directory: directory to list.
+
+    :return: a tuple (sorted list of subdirectories, dictionary of ``FileEntry`` of the CSV files keyed by basename).
+    """
+    subdirectories, files = [], {}
+
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.is_dir():
+                subdirectories.append(entry.path)
+            elif is_csv(entry.name) and entry.is_file():
+                stat = entry.stat()
+                files[entry.name] = FileEntry(
+                    os.path.join(directory, entry.name),
+                    stat.st_size,
+                    stat.st_mtime_ns,
+                    cytominer_database.utils.get_name(entry.name),
+                )
+
+    return sorted(subdirectories), files
+
+
+def map_threads(function, iterable, threads=1):
+    """
+    Map ``function`` over ``iterable``, using a pool of threads if ``threads`` is larger than 1.
+
+    :return: list of the results, in the order of ``iterable``.
+    """
+    if threads <= 1:
+        return [function(item) for item in iterable]
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=threads) as executor:
+        return list(executor.map(function, iterable))
+
+
+class Inventory(object):
+    """
+    Index of the CSV files of a set of site directories.
+
+    Directories that are not in the inventory are listed when they are first looked up,
+    so that the inventory can be used for any directory.
+
+    :param files: dictionary of the ``FileEntry`` of every directory, keyed by directory and basename.
+    """
+
+    def __init__(self, files):
+        self.files = files
+
+    @property
+    def directories(self):
+        """
+        Sorted list of the site directories.
+        """
+        return sorted(self.files)
+
+    def entries(self, directory):
+        """
+        List the CSV files of a directory.
+
+        :param directory: site directory.
+
+        :return: list of ``FileEntry``, sorted by path.
+        """
+        if directory not in self.files:
+            try:
+                _, self.files[directory] = scan_directory(directory)
+            except OSError:
+                return []
+
+        return [self.files[directory][name] for name in sorted(self.files[directory])]
+
+    def entry(self, pathname):
+        """
+        Look up a CSV file.
+
+        :param pathname: path of the file.
+
+        :return: its ``FileEntry``, or None if the file does not exist.
+        """
+        directory, filename = os.path.split(pathname)
+
+        self.entries(directory)
+
+        return self.files.get(directory, {}).get(filename)
+
+    def isfile(self, pathname):
+        """
+        Check whether a CSV file exists.
+
+        :param pathname: path of the file.
+        """
+        return self.entry(pathname) is not None
+
+    def getsize(self, pathname):
+        """
+        Size of a CSV file in bytes.
+
+        :param pathname: path of the file.
+
+        Raises OSError if the file does not exist.
+        """
+        entry = self.entry(pathname)
+
+        if entry is None:
+            raise OSError("{} not found.".format(pathname))
+
+        return entry.size
+
+    def csvs(self, directory):
+        """
+        List the CSV files of a directory.
+
+        :param directory: site directory.
+
+        :return: sorted list of paths.
+        """
+        return [entry.path for entry in self.entries(directory)]
+
+    def table_paths(self, directories=None):
+        """
+        Group the CSV files of the site directories by table kind.
+
+        :param directories: site directories. If None, all directories of the inventory.
+
+        :return: dictionary with the table kind (e.g. "Cells") as key and the list of paths of its files as value.
+        """
+        table_paths = collections.OrderedDict()
+
+        for directory in self.directories if directories is None else directories:
+            for entry in self.entries(directory):
+                table_paths.setdefault(entry.name, []).append(entry.path)
+
+        return table_paths
+
+    def subset(self, directories):
+        """
+        Inventory of some of the directories only, e.g. to be sent to a worker process.
+
+        :param directories: site directories.
+        """
+        return Inventory(
+            {
+                directory: self.files[directory]
+                for directory in directories
+                if directory in self.files
+            }
+        )
+
+
+def scan(source, recursive=False, threads=1):
+    """
+    List the site directories of a source directory and their CSV files.
+
+    :param source: directory containing the site directories.
+    :param recursive: True if the site directories are searched at any depth below ``source``.
+     Only the directories that contain CSV files are then site directories.
+    :param threads: number of threads listing directories concurrently.
+
+    :return: an ``Inventory``.
+    """
+    subdirectories, _ = scan_directory(source)
+
+    files = {}
+
+    # breadth-first: the directories of a level are listed concurrently
+    while subdirectories:
+        scanned = map_threads(scan_directory, subdirectories, threads)
+
+        pending = []
+
+        for directory, (children, entries) in zip(subdirectories, scanned):
+            if entries or not recursive:
+                files[directory] = entries
+            if recursive:
+                pending += children
+
+        subdirectories = pending
+
+    return Inventory(files)
+
+
+def scan_directories(directories, threads=1):
+    """
+    List the CSV files of a given list of site directories.
+
+    :param directories: site directories.
+    :param threads: number of threads listing directories concurrently.
+
+    :return: an ``Inventory``.
+    """
+    scanned = map_threads(scan_directory, directories, threads)
+
+    return Inventory(
+        {directory: entries for directory, (_, entries) in zip(directories, scanned)}
+    )
+
+
+def open_inventory(config, source, directories=None):
+    """
+    Scan the site directories as configured in the ``[inventory]`` section.
+
+    :param config: parsed configuration (output of ``cytominer_database.utils.read_config``).
+    :param source: directory containing the site directories.
+    :param directories: site directories. If given, only these directories are listed.
+
+    :return: an ``Inventory``.
+    """
+    threads = int(config["inventory"]["threads"])
+
+    if directories:
+        return scan_directories(directories, threads)
+
+    return scan(source, config.getboolean("inventory", "recursive"), threads)
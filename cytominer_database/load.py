@@ -1,5 +1,6 @@
 import csv
 import click
+import io
 import warnings
 import zlib
 import pandas as pd
@@ -13,10 +14,46 @@ import numpy as np
 import collections
 import numpy as np
 import cytominer_database
+import cytominer_database.instrumentation
 import cytominer_database.utils
 
+# Block size of the Arrow CSV reader. Each block is parsed by a separate thread.
+# A CellProfiler feature table has about 600 columns, i.e. rows of several kilobytes:
+# the block must be large enough to hold many rows, small enough to split large files.
+ARROW_BLOCK_SIZE = 1 << 22
 
-def get_and_modify_df(input, identifier, skip_image_prefix):
+# Strings read as missing values by pandas.read_csv() (its default na_values).
+ARROW_NULL_VALUES = [
+    "",
+    "#N/A",
+    "#N/A N/A",
+    "#NA",
+    "-1.#IND",
+    "-1.#QNAN",
+    "-NaN",
+    "-nan",
+    "1.#IND",
+    "1.#QNAN",
+    "<NA>",
+    "N/A",
+    "NA",
+    "NULL",
+    "NaN",
+    "None",
+    "n/a",
+    "nan",
+    "null",
+]
+
+
+def get_and_modify_df(
+    input,
+    identifier,
+    skip_image_prefix,
+    buffer=None,
+    csv_reader="pandas",
+    schema=None,
+):
     """
     Loads .csv as Pandas dataframe and returns modified pandas dataframe.
 
@@ -25,37 +62,328 @@ def get_and_modify_df(input, identifier, skip_image_prefix):
     :param identifier: TableNumber that is added as column before writing the table.
     :skip_image_prefix: Boolean value specifying if the column headers of
      the image.csv files should be prefixed with the table name ("Image").
+    :buffer: content of the input file, if it has been read and validated already
+     (see cytominer_database.utils.read_csv_set()).
+    :csv_reader: parser backend, "pandas" or "arrow" (see load_df()).
+    :schema: pyarrow schema of the table kind. If given, its column types are applied
+     by the parser (see parse_types()).
     """
-    # get dataframe
-    dataframe = load_df(input)
     # get table name
     name = cytominer_database.utils.get_name(input)
+    prefixed = (not skip_image_prefix) and name in ["Image", "Object"]
+    column_types = parse_types(schema, name if prefixed else None)
+    # get dataframe
+    with cytominer_database.instrumentation.stage("parse", name, input) as timer:
+        dataframe = load_df(input, buffer, csv_reader, column_types)
+        if dataframe is not None:
+            timer.count(rows=dataframe.shape[0])
     # add prefix to column names unless marked for skipping
-    if (not skip_image_prefix) and name in ["Image", "Object"]:
+    if prefixed:
         add_prefix(name, dataframe)
     # add identifier as an additional column called tableNumber
     add_tableNumber(dataframe, identifier)
     return dataframe
 
 
-def load_df(input):
+def get_and_modify_chunks(input, identifier, skip_image_prefix, chunk_rows):
+    """
+    Loads .csv as a sequence of Pandas dataframes of at most ``chunk_rows`` rows each, and
+    yields them modified as in get_and_modify_df(). Only one chunk is held in memory at a time.
+    The file must have been validated already (see cytominer_database.utils.read_csv_set()).
+    Every chunk has the column types of the whole file (see read_csv_chunks()).
+
+    :param input: input file path.
+    :param identifier: TableNumber that is added as column before writing the table.
+    :skip_image_prefix: Boolean value specifying if the column headers of
+     the image.csv files should be prefixed with the table name ("Image").
+    :chunk_rows: number of rows per chunk.
+    """
+    # get table name
+    name = cytominer_database.utils.get_name(input)
+    reader = read_csv_chunks(input, chunk_rows)
+    while True:
+        with cytominer_database.instrumentation.stage("parse", name, input) as timer:
+            dataframe = next(reader, None)
+            if dataframe is not None:
+                timer.count(rows=dataframe.shape[0])
+        if dataframe is None:
+            break
+        # add prefix to column names unless marked for skipping
+        if (not skip_image_prefix) and name in ["Image", "Object"]:
+            add_prefix(name, dataframe)
+        # add identifier as an additional column called tableNumber
+        add_tableNumber(dataframe, identifier)
+        yield dataframe
+
+
+def read_csv_chunks(input, chunk_rows, header=0):
+    """
+    Lazily yields the Pandas dataframes of a .csv file, in chunks of at most ``chunk_rows`` rows.
+    pandas infers the column types per chunk, so a column that holds integers in one chunk may
+    hold floats in the next. The integer columns that hold other values somewhere in the file
+    are therefore converted to float in every chunk (see scan_integer_columns()), and every chunk
+    has the column types pandas infers from the whole file, whatever the size of the file.
+    :param input: input file path.
+    :param chunk_rows: number of rows per chunk.
+    :param header: row number(s) of the header, e.g. [0, 1] for an object .csv file.
+    """
+    integers = scan_integer_columns(input, chunk_rows, header)
+    with pd.read_csv(input, header=header, chunksize=chunk_rows) as reader:
+        for dataframe in reader:
+            yield cytominer_database.utils.convert_chunk_types(dataframe, integers)
+
+
+def scan_integer_columns(input, chunk_rows, header=0):
+    """
+    Returns the labels of the columns of a .csv file that hold integers in every row. The header
+    and the first chunk of the file are sampled first; only the columns that hold integers there
+    are then read entirely, one chunk at a time.
+    :param input: input file path.
+    :param chunk_rows: number of rows per chunk.
+    :param header: row number(s) of the header, e.g. [0, 1] for an object .csv file.
+    """
+    sample = pd.read_csv(input, header=header, nrows=chunk_rows)
+    positions = [
+        position
+        for position in range(sample.shape[1])
+        if pd.api.types.is_integer_dtype(sample.dtypes.iloc[position])
+    ]
+    if not positions:
+        return set()
+    integers = set(positions)
+    # pandas cannot select columns under a header of several rows: the header is skipped
+    header_rows = len(header) if isinstance(header, list) else header + 1
+    with pd.read_csv(
+        input,
+        header=None,
+        skiprows=header_rows,
+        usecols=positions,
+        chunksize=chunk_rows,
+    ) as reader:
+        for dataframe in reader:
+            # the columns of a chunk are in the order of the file, as the positions
+            integers &= {
+                position
+                for position, dtype in zip(positions, dataframe.dtypes)
+                if pd.api.types.is_integer_dtype(dtype)
+            }
+    return {sample.columns[position] for position in integers}
+
+
+def get_and_modify_table(
+    input, identifier, skip_image_prefix, buffer=None, schema=None
+):
+    """
+    Loads .csv as pyarrow table and returns modified pyarrow table.
+    Same as get_and_modify_df(), but the data never passes through pandas.
+
+    :param input: input file path.
+    :param identifier: TableNumber that is added as column before writing the table.
+    :skip_image_prefix: Boolean value specifying if the column headers of
+     the image.csv files should be prefixed with the table name ("Image").
+    :buffer: content of the input file, if it has been read and validated already
+     (see cytominer_database.utils.read_csv_set()).
+    :schema: pyarrow schema of the table kind. If given, its column types are applied
+     by the parser (see parse_types()).
+    """
+    # get table name
+    name = cytominer_database.utils.get_name(input)
+    prefixed = (not skip_image_prefix) and name in ["Image", "Object"]
+    if buffer is None:
+        # exit for files which are not valid (redundant check)
+        if not cytominer_database.utils.validate_csv(input):
+            warnings.warn(
+                "CSV could not be validated in get_and_modify_table() for {}".format(
+                    input
+                ),
+                UserWarning,
+            )
+            return
+    with cytominer_database.instrumentation.stage("parse", name, input) as timer:
+        table = read_csv_typed(
+            read_csv_arrow,
+            input if buffer is None else buffer,
+            parse_types(schema, name if prefixed else None),
+        )
+        timer.count(rows=table.num_rows)
+    # add prefix to column names unless marked for skipping
+    if prefixed:
+        table = table.rename_columns(
+            get_prefixed_column_labels(name, table.column_names)
+        )
+    # add identifier as an additional column called tableNumber
+    table = table.add_column(
+        0,
+        "TableNumber",
+        pyarrow.array(np.full(table.num_rows, identifier, dtype=np.int64)),
+    )
+    return table
+
+
+def load_df(input, buffer=None, csv_reader="pandas", column_types=None):
     """
     Reads .csv as Pandas dataframe directly.
     Does not use a temporary directory. Returns modified dataframe.
 
     :param input: input file path. 
+    :param buffer: content of the input file. If given, it is parsed instead of
+     reading (and validating) the file again.
+    :param csv_reader: parser backend. "pandas" uses pandas.read_csv(),
+     "arrow" uses the multithreaded pyarrow.csv.read_csv().
+    :param column_types: dictionary of pyarrow types keyed by column name (see parse_types()).
+     The parser reads these columns with these types instead of inferring them. If a column
+     does not fit its type, the file is parsed again with inferred types.
     """
-    # exit for files which are not valid (redundant check)
-    if not cytominer_database.utils.validate_csv(input):
-        warnings.warn(
-            "CSV could not be validated in get_df() for {}".format(input), UserWarning
-        )
-        return
+    if buffer is None:
+        # exit for files which are not valid (redundant check)
+        if not cytominer_database.utils.validate_csv(input):
+            warnings.warn(
+                "CSV could not be validated in get_df() for {}".format(input),
+                UserWarning,
+            )
+            return
+        source = input
+    else:
+        source = buffer
+
     # read into DF
-    dataframe = pd.read_csv(input)  # do not use index_col=0 !
+    if csv_reader == "pandas":
+        dataframe = read_csv_typed(read_csv_pandas, source, column_types)
+    elif csv_reader == "arrow":
+        dataframe = read_csv_typed(read_csv_arrow, source, column_types).to_pandas()
+    else:
+        raise ValueError(
+            "Incorrect 'csv_reader' specification in your configuration file. Please set the value to 'pandas' or 'arrow', as documented in the README. "
+        )
     return dataframe
 
 
+def parse_types(schema, prefix=None):
+    """
+    Returns the column types of a table schema as a dictionary of pyarrow types keyed by the
+    column names of the .csv files, to be applied by the parser (see load_df()). The TableNumber
+    column is added after parsing, and is not included. Integer and floating point columns are
+    parsed as 64-bit types: the parsers wrap integers, and round floats to infinity, silently if
+    a value does not fit a narrower type ([schema] precision = single), which is checked when the
+    table is cast to the schema instead (see cytominer_database.write.conform_table()).
+    :param schema: pyarrow schema of the table kind, or None.
+    :param prefix: table name prefixed to the column headers of the table (see add_prefix()),
+     which is removed from the names. None if the headers are not prefixed.
+    """
+    if schema is None:
+        return None
+    no_prefix = ["ImageNumber", "ObjectNumber", "TableNumber"]
+    column_types = {}
+    for field in schema:
+        name = field.name
+        if name == "TableNumber":
+            continue
+        if prefix is not None and name not in no_prefix:
+            if not name.startswith(prefix + "_"):
+                continue
+            name = name[len(prefix) + 1 :]
+        column_type = field.type
+        # dictionary columns are parsed as their values and encoded when cast to the schema
+        if pyarrow.types.is_dictionary(column_type):
+            column_type = column_type.value_type
+        if pyarrow.types.is_integer(column_type):
+            column_type = pyarrow.int64()
+        elif pyarrow.types.is_floating(column_type):
+            column_type = pyarrow.float64()
+        column_types[name] = column_type
+    return column_types
+
+
+def read_csv_typed(read, source, column_types=None):
+    """
+    Parses .csv with a given parser, applying the given column types. If a value does not
+    fit the type of its column (e.g. a float in an integer column, or a missing value in an
+    integer or boolean column), the file is parsed again with inferred types, so that the
+    column can be converted, or rejected, as any other (see
+    cytominer_database.write.conform_table()).
+    :param read: parser, read_csv_pandas() or read_csv_arrow()
+    :param source: input file path, or content of the file (bytes)
+    :param column_types: dictionary of pyarrow types keyed by column name, or None.
+    """
+
+    def open_source():
+        return io.BytesIO(source) if isinstance(source, bytes) else source
+
+    if column_types:
+        try:
+            with warnings.catch_warnings():
+                # pandas warns about the invalid cast before it raises
+                warnings.simplefilter("ignore", category=RuntimeWarning)
+                return read(open_source(), column_types)
+        except (ValueError, TypeError, pyarrow.ArrowInvalid):
+            pass
+    return read(open_source())
+
+
+def read_csv_pandas(source, column_types=None):
+    """
+    Reads .csv as pandas dataframe.
+    :param source: input file path or file-like object.
+    :param column_types: dictionary of pyarrow types keyed by column name, applied
+     as the corresponding numpy types.
+    """
+    if not column_types:
+        return pd.read_csv(source)  # do not use index_col=0 !
+    return pd.read_csv(
+        source,
+        dtype={
+            name: column_type.to_pandas_dtype()
+            for name, column_type in column_types.items()
+        },
+    )
+
+
+def read_csv_arrow(source, column_types=None):
+    """
+    Reads .csv as pyarrow table, parsing blocks of the file in parallel.
+    Column names and types are made consistent with pandas.read_csv(): duplicate
+    column names get a numbered suffix, the missing values of pandas (see ARROW_NULL_VALUES)
+    are read as nulls in string columns as well, empty columns are read as float and dates
+    are kept as strings. Floats are parsed by the correctly rounded parser of Arrow, so they
+    are identical to those of pandas (float_precision="high"); Arrow has no other option.
+
+    :param source: input file path or file-like object.
+    :param column_types: dictionary of pyarrow types keyed by column name, or None.
+     These columns are read with these types instead of inferring them.
+    """
+    table = pyarrow.csv.read_csv(
+        source,
+        read_options=pyarrow.csv.ReadOptions(
+            use_threads=True, block_size=ARROW_BLOCK_SIZE
+        ),
+        convert_options=pyarrow.csv.ConvertOptions(
+            column_types=column_types or {},
+            null_values=ARROW_NULL_VALUES,
+            strings_can_be_null=True,
+        ),
+    )
+    # mangle duplicate column names as "X", "X.1", "X.2", ...
+    column_names = []
+    column_names_seen = set()
+    for name in table.column_names:
+        mangled_name, count = name, 0
+        while mangled_name in column_names_seen:
+            count += 1
+            mangled_name = "{}.{}".format(name, count)
+        column_names_seen.add(mangled_name)
+        column_names += [mangled_name]
+    table = table.rename_columns(column_names)
+
+    fields = []
+    for field in table.schema:
+        if pyarrow.types.is_null(field.type):
+            field = field.with_type(pyarrow.float64())
+        elif pyarrow.types.is_temporal(field.type):
+            field = field.with_type(pyarrow.string())
+        fields += [field]
+    return table.cast(pyarrow.schema(fields))
+
+
 def add_prefix(prefix, dataframe):
     """
     Modifies dataframe by adding a header prefix to existing columns (adds "name" prefix to column headers)
@@ -63,15 +391,25 @@ def add_prefix(prefix, dataframe):
     :param prefix: table name to be prefixed
     :param dataframe: dataframe to be modified
     """
+    dataframe.columns = get_prefixed_column_labels(prefix, dataframe.columns)
+    return dataframe
+
+
+def get_prefixed_column_labels(prefix, columns):
+    """
+    Returns the column labels with a header prefix added, except for the key columns.
+
+    :param prefix: table name to be prefixed
+    :param columns: column labels
+    """
     no_prefix = ["ImageNumber", "ObjectNumber", "TableNumber"]  # exception columns
     prefixed_column_labels = []
-    for col in dataframe.columns:
+    for col in columns:
         if col in no_prefix:
             prefixed_column_labels += [col]
         else:
             prefixed_column_labels += ["{}_{}".format(prefix, col)]
-        dataframe.columns = prefixed_column_labels
-    return dataframe
+    return prefixed_column_labels
 
 
 def add_tableNumber(dataframe, identifier):
@@ -0,0 +1,612 @@
+"""
+A manifest of the site directories that have been ingested completely.
+
+Both ``cytominer_database.ingest.seed`` and ``cytominer_database.ingest_variable_engine.seed`` can record
+every completed directory, together with the TableNumber (checksum of the image CSV) and the size of
+each CSV file. If an ingest is interrupted, it can be resumed: directories that have been ingested and
+have not changed since are skipped, and rows of incomplete or changed directories are removed.
+
+The manifest is stored
+
+- in the table ``_ingest_manifest`` of the target database (SQLite engine), or
+- in the file ``_ingest_manifest.jsonl`` of the output directory (Parquet engine). The leading
+  underscore keeps Arrow dataset readers from mistaking it for data.
+
+The manifests are only written by an ingest with ``resume`` (or with ``[parquet] checkpoint_directories``),
+so a first ingest that may have to be resumed later should be run with ``resume`` as well. An ingest
+without ``resume`` removes the manifest of a previous ingest from its target.
+
+Parquet files can only be resumed if they were closed properly, i.e. if the previous ingest ended with
+an exception (including KeyboardInterrupt) rather than being killed. Otherwise, the ingest starts over.
+With ``[parquet] checkpoint_directories = N``, every table kind is written to numbered part files that
+are closed every N directories, and each directory is recorded with the number of its part files
+(``"checkpoint"``), so an ingest that was killed can be resumed from its last checkpoint.
+"""
+
+import contextlib
+import glob
+import json
+import os
+import re
+import warnings
+
+import pandas as pd
+import pyarrow
+import pyarrow.compute
+import pyarrow.parquet as pq
+import sqlalchemy
+
+import cytominer_database.munge
+import cytominer_database.tableSchema
+import cytominer_database.utils
+import cytominer_database.write
+
+MANIFEST_TABLE = "_ingest_manifest"
+MANIFEST_FILENAME = "_ingest_manifest.jsonl"
+
+
+def directory_entry(directory, table_number, filenames, inventory=None):
+    """
+    Create the manifest entry of a site directory.
+
+    :param directory: directory containing the CSV files.
+    :param table_number: TableNumber of the directory (checksum of the image CSV).
+    :param filenames: CSV files of the directory that were ingested.
+    :param inventory: ``cytominer_database.inventory.Inventory`` holding the sizes of the files.
+
+    :return: a dictionary with keys "directory", "table_number" and "files" (basename: size in bytes).
+    """
+    return {
+        "directory": directory,
+        "table_number": int(table_number),
+        "files": {
+            os.path.basename(filename): getsize(filename, inventory)
+            for filename in filenames
+        },
+    }
+
+
+def getsize(filename, inventory=None):
+    """
+    Size of a file in bytes, as recorded in ``inventory`` if given.
+
+    :param filename: file.
+    :param inventory: ``cytominer_database.inventory.Inventory`` of the directory of the file.
+    """
+    if inventory is not None:
+        return inventory.getsize(filename)
+
+    return os.path.getsize(filename)
+
+
+def directory_key(source, directory):
+    """
+    Key of a directory in the manifest: its path relative to ``source``.
+
+    :param source: directory containing the site directories.
+    :param directory: site directory.
+    """
+    return os.path.relpath(directory, source)
+
+
+def is_unchanged(source, entry, config, cache=None, inventory=None):
+    """
+    Check that a site directory still contains the files recorded in its manifest entry,
+    with the same sizes, and that the checksum of its image CSV is still the same.
+
+    :param source: directory containing the site directories.
+    :param entry: manifest entry of the directory.
+    :param config: parsed configuration (output of ``cytominer_database.utils.read_config``).
+    :param cache: ``cytominer_database.utils.ChecksumCache`` of the image CSV checksums.
+    :param inventory: ``cytominer_database.inventory.Inventory`` of the site directories. If None,
+     the directory is listed.
+
+    :return: True if the directory is unchanged, False otherwise.
+    """
+    directory = os.path.join(source, entry["directory"])
+    image = os.path.join(directory, config["filenames"]["image"])
+
+    if inventory is not None:
+        exists = inventory.isfile(image)
+    else:
+        exists = os.path.isfile(image)
+
+    if not exists:
+        return False
+
+    filenames = cytominer_database.utils.collect_csvs(config, directory, inventory)
+    filenames += [image]
+
+    # the object CSV is recorded if it was split into compartments in memory
+    if config.has_option("filenames", "object"):
+        if config["filenames"]["object"] in entry["files"]:
+            filenames += [os.path.join(directory, config["filenames"]["object"])]
+
+    try:
+        sizes = {
+            os.path.basename(filename): getsize(filename, inventory)
+            for filename in filenames
+        }
+    except OSError:
+        return False
+
+    if sizes != entry["files"]:
+        return False
+
+    return cytominer_database.utils.checksum(image, cache) == entry["table_number"]
+
+
+def split_entries(source, entries, config, cache=None, inventory=None):
+    """
+    Split manifest entries into those of unchanged and of changed (or missing) directories.
+
+    :param source: directory containing the site directories.
+    :param entries: dictionary of manifest entries, keyed by directory.
+    :param config: parsed configuration (output of ``cytominer_database.utils.read_config``).
+    :param cache: ``cytominer_database.utils.ChecksumCache`` of the image CSV checksums.
+    :param inventory: ``cytominer_database.inventory.Inventory`` of the site directories.
+
+    :return: a tuple of two dictionaries: unchanged entries, changed entries.
+    """
+    unchanged, changed = {}, {}
+
+    for key, entry in entries.items():
+        if is_unchanged(source, entry, config, cache, inventory):
+            unchanged[key] = entry
+        else:
+            changed[key] = entry
+
+    return unchanged, changed
+
+
+def table_names(config_file, directories, munge=False, inventory=None):
+    """
+    Names of the tables that the CSV files of a list of directories are ingested into:
+    the image table and the table of every compartment.
+
+    :param config_file: Parsed configuration (output of ``cytominer_database.utils.read_config``).
+    :param directories: Subdirectories that contain CSV files.
+    :param munge: True if object CSV files are split into compartments in memory (see ``cytominer_database.ingest.seed``).
+    :param inventory: ``cytominer_database.inventory.Inventory`` of the directories. If None, they are listed.
+
+    :return: set of table names.
+    """
+    names = {cytominer_database.utils.get_name(config_file["filenames"]["image"])}
+
+    for directory in directories:
+        names.update(
+            cytominer_database.utils.get_name(filename)
+            for filename in cytominer_database.utils.collect_csvs(
+                config_file, directory, inventory
+            )
+        )
+
+        if not munge or not config_file.has_option("filenames", "object"):
+            continue
+
+        object_csv = os.path.join(directory, config_file["filenames"]["object"])
+
+        if inventory is not None:
+            exists = inventory.isfile(object_csv)
+        else:
+            exists = os.path.isfile(object_csv)
+
+        if not exists:
+            continue
+
+        # invalid object CSV files are skipped by the ingest
+        try:
+            header = pd.read_csv(object_csv, header=[0, 1], nrows=0)
+            plan = cytominer_database.munge.compartment_plan(tuple(header.columns))
+        except ValueError:
+            continue
+
+        names.update(compartment_name.capitalize() for compartment_name in plan)
+
+    return names
+
+
+# ---------------------------------------- manifest table (SQLite) ----------------------------------------
+
+
+def manifest_table():
+    """
+    Definition of the manifest table.
+    """
+    return sqlalchemy.Table(
+        MANIFEST_TABLE,
+        sqlalchemy.MetaData(),
+        sqlalchemy.Column("directory", sqlalchemy.String(767), primary_key=True),
+        sqlalchemy.Column("table_number", sqlalchemy.BigInteger),
+        sqlalchemy.Column("files", sqlalchemy.Text),
+    )
+
+
+@contextlib.contextmanager
+def transaction(con):
+    """
+    Run statements in the current transaction of ``con``, or in a new one that is committed at the end.
+
+    :param con: open database connection.
+    """
+    if con.in_transaction():
+        yield
+    else:
+        with con.begin():
+            yield
+
+
+def open_table_manifest(
+    con, source, config, resume=False, cache=None, inventory=None, tables=()
+):
+    """
+    Create the manifest table if the ingest is resumed, or remove the manifest table of a previous
+    ingest otherwise. If resuming, remove the entries of changed directories and all rows whose
+    TableNumber is not in the manifest (i.e. the rows of incomplete or changed directories) from the
+    tables of the ingest.
+
+    :param con: open database connection.
+    :param source: directory containing the site directories.
+    :param config: parsed configuration (output of ``cytominer_database.utils.read_config``).
+    :param resume: True if the ingest is resumed.
+    :param cache: ``cytominer_database.utils.ChecksumCache`` of the image CSV checksums.
+    :param inventory: ``cytominer_database.inventory.Inventory`` of the site directories.
+    :param tables: names of the tables of the ingest (the image table and the compartment tables).
+     Other tables of the database are left untouched.
+
+    :return: set of the keys of the directories that can be skipped.
+    """
+    table = manifest_table()
+
+    with transaction(con):
+        exists = sqlalchemy.inspect(con).has_table(MANIFEST_TABLE)
+
+        if not resume:
+            # the manifest would not record the directories of this ingest
+            if exists:
+                warnings.warn(
+                    "Removing the manifest of a previous ingest from the target database. "
+                    "Use --resume to keep it.",
+                    UserWarning,
+                )
+                table.drop(con)
+            return set()
+
+        table.create(con, checkfirst=True)
+
+        if not exists:
+            warnings.warn(
+                "No manifest found in the target database. Ingesting all directories.",
+                UserWarning,
+            )
+            return set()
+
+        entries = {
+            row.directory: {
+                "directory": row.directory,
+                "table_number": row.table_number,
+                "files": json.loads(row.files),
+            }
+            for row in con.execute(table.select())
+        }
+
+        unchanged, changed = split_entries(source, entries, config, cache, inventory)
+
+        if changed:
+            con.execute(table.delete().where(table.c.directory.in_(list(changed))))
+
+        table_numbers = sqlalchemy.select(table.c.table_number)
+
+        inspector = sqlalchemy.inspect(con)
+        existing = set(inspector.get_table_names())
+
+        for name in tables:
+            if name not in existing:
+                continue
+
+            columns = [column["name"] for column in inspector.get_columns(name)]
+
+            if "TableNumber" not in columns:
+                continue
+
+            data = sqlalchemy.table(name, sqlalchemy.column("TableNumber"))
+
+            con.execute(data.delete().where(data.c.TableNumber.not_in(table_numbers)))
+
+    return set(unchanged)
+
+
+def record_table_entry(con, source, entry):
+    """
+    Record a completed directory in the manifest table.
+
+    :param con: open database connection.
+    :param source: directory containing the site directories.
+    :param entry: manifest entry of the directory (see ``directory_entry``).
+    """
+    table = manifest_table()
+    key = directory_key(source, entry["directory"])
+
+    with transaction(con):
+        con.execute(table.delete().where(table.c.directory == key))
+        con.execute(
+            table.insert().values(
+                directory=key,
+                table_number=entry["table_number"],
+                files=json.dumps(entry["files"], sort_keys=True),
+            )
+        )
+
+
+# ---------------------------------------- manifest file (Parquet) ----------------------------------------
+
+
+def read_file_manifest(output_path):
+    """
+    Read the manifest file of a Parquet output directory. A truncated last line is ignored.
+
+    :param output_path: Parquet output directory.
+
+    :return: dictionary of manifest entries, keyed by directory.
+    """
+    entries = {}
+    path = os.path.join(output_path, MANIFEST_FILENAME)
+
+    if not os.path.isfile(path):
+        return entries
+
+    with open(path, "r") as fd:
+        for line in fd:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            entries[entry["directory"]] = entry
+
+    return entries
+
+
+def write_file_manifest(output_path, entries):
+    """
+    Replace the manifest file of a Parquet output directory.
+
+    :param output_path: Parquet output directory.
+    :param entries: dictionary of manifest entries, keyed by directory.
+    """
+    with open(os.path.join(output_path, MANIFEST_FILENAME), "w") as fd:
+        for entry in entries.values():
+            fd.write(json.dumps(entry, sort_keys=True) + "\n")
+
+
+def record_file_entry(output_path, source, entry):
+    """
+    Record a completed directory in the manifest file of a Parquet output directory.
+
+    :param output_path: Parquet output directory.
+    :param source: directory containing the site directories.
+    :param entry: manifest entry of the directory (see ``directory_entry``).
+    """
+    entry = dict(entry, directory=directory_key(source, entry["directory"]))
+
+    with open(os.path.join(output_path, MANIFEST_FILENAME), "a") as fd:
+        fd.write(json.dumps(entry, sort_keys=True) + "\n")
+        fd.flush()
+
+
+def open_file_manifest(
+    output_path, source, config, resume=False, cache=None, inventory=None
+):
+    """
+    Start the manifest file of a Parquet output directory if the ingest is resumed, or remove the
+    manifest file of a previous ingest otherwise. If resuming, keep the entries of unchanged
+    directories, and move the existing Parquet files aside so that their rows can be copied into the
+    new files with ``copy_previous_tables``. If any existing Parquet file cannot be read, the previous
+    ingest did not end properly and the ingest starts over.
+
+    :param output_path: Parquet output directory.
+    :param source: directory containing the site directories.
+    :param config: parsed configuration (output of ``cytominer_database.utils.read_config``).
+    :param resume: True if the ingest is resumed.
+    :param cache: ``cytominer_database.utils.ChecksumCache`` of the image CSV checksums.
+    :param inventory: ``cytominer_database.inventory.Inventory`` of the site directories.
+
+    :return: a tuple (set of the keys of the directories that can be skipped,
+     dictionary of previous Parquet files keyed by table name, set of their valid TableNumbers).
+    """
+    if not resume:
+        # the manifest would not record the directories of this ingest
+        if os.path.isfile(os.path.join(output_path, MANIFEST_FILENAME)):
+            os.remove(os.path.join(output_path, MANIFEST_FILENAME))
+        return set(), {}, set()
+
+    entries = read_file_manifest(output_path)
+
+    if not entries:
+        warnings.warn(
+            "No manifest found in {}. Ingesting all directories.".format(output_path),
+            UserWarning,
+        )
+
+    previous = {}
+
+    if entries:
+        for filename in sorted(os.listdir(output_path)):
+            name, extension = os.path.splitext(filename)
+            if extension == ".parquet":
+                previous[name] = os.path.join(output_path, filename)
+
+        try:
+            for path in previous.values():
+                pq.ParquetFile(path)
+        except (IOError, pyarrow.ArrowInvalid):
+            warnings.warn(
+                "Parquet files in {} were not closed properly and cannot be resumed. Ingesting all directories. "
+                "Set [parquet] checkpoint_directories to resume killed ingests.".format(
+                    output_path
+                ),
+                UserWarning,
+            )
+            entries, previous = {}, {}
+
+    unchanged, _ = split_entries(source, entries, config, cache, inventory)
+
+    for name, path in previous.items():
+        os.replace(path, path + ".previous")
+        previous[name] = path + ".previous"
+
+    write_file_manifest(output_path, unchanged)
+
+    table_numbers = set(entry["table_number"] for entry in unchanged.values())
+
+    return set(unchanged), previous, table_numbers
+
+
+def copy_previous_tables(previous, table_numbers, writers_dict):
+    """
+    Copy the rows of unchanged directories from the previous Parquet files into the new writers,
+    then remove the previous files.
+
+    :param previous: dictionary of previous Parquet files, keyed by table name.
+    :param table_numbers: TableNumbers of the unchanged directories.
+    :param writers_dict: dictionary referencing the writers and schemas of every table kind.
+    """
+    value_set = pyarrow.array(sorted(table_numbers), type=pyarrow.int64())
+
+    for name, path in previous.items():
+        if name not in writers_dict:
+            warnings.warn(
+                "No writer for the previous table {}; its rows are not kept.".format(
+                    name
+                ),
+                UserWarning,
+            )
+        else:
+            writer = writers_dict[name]["writer"]
+            schema = writers_dict[name]["schema"]
+
+            for batch in pq.ParquetFile(path).iter_batches():
+                table = pyarrow.Table.from_batches([batch])
+                mask = pyarrow.compute.is_in(
+                    table.column("TableNumber").cast(pyarrow.int64()),
+                    value_set=value_set,
+                )
+                table = table.filter(mask)
+                if table.num_rows:
+                    writer.write_table(
+                        cytominer_database.write.conform_table(table, schema)
+                    )
+
+        os.remove(path)
+
+
+def list_part_files(output_path):
+    """
+    List the part files of the table kinds of a Parquet output directory
+    (see ``cytominer_database.write.CheckpointedParquetWriter``).
+
+    :param output_path: Parquet output directory.
+
+    :return: dictionary of the paths of the part files, keyed by part number.
+    """
+    parts = {}
+    pattern = re.compile(r"^part-(\d+)\.parquet$")
+
+    for path in sorted(glob.glob(os.path.join(output_path, "*", "part-*.parquet"))):
+        match = pattern.match(os.path.basename(path))
+        if match:
+            parts.setdefault(int(match.group(1)), []).append(path)
+
+    return parts
+
+
+def filter_part_file(path, table_numbers, config):
+    """
+    Remove the rows whose TableNumber is not in ``table_numbers`` from a part file. The part file is
+    replaced only if rows are removed, and deleted if no rows are left.
+
+    :param path: part file.
+    :param table_numbers: TableNumbers of the rows to keep.
+    :param config: parsed configuration (output of ``cytominer_database.utils.read_config``).
+    """
+    value_set = pyarrow.array(sorted(table_numbers), type=pyarrow.int64())
+    column = pq.read_table(path, columns=["TableNumber"]).column("TableNumber")
+    mask = pyarrow.compute.is_in(column.cast(pyarrow.int64()), value_set=value_set)
+    kept = pyarrow.compute.sum(mask).as_py() or 0
+
+    if kept == len(column):
+        return
+
+    if kept == 0:
+        os.remove(path)
+        return
+
+    table = pq.read_table(path).filter(mask)
+
+    writer = cytominer_database.tableSchema.open_parquet_file(
+        path + ".tmp", table.schema, config
+    )
+    writer.write_table(table)
+    writer.close()
+
+    os.replace(path + ".tmp", path)
+
+
+def open_checkpoint_manifest(
+    output_path, source, config, resume=False, cache=None, inventory=None
+):
+    """
+    Start the manifest file of a Parquet output directory whose table kinds are written to part files
+    (``[parquet] checkpoint_directories``). If resuming, keep the entries of unchanged directories that
+    were recorded at a checkpoint, delete the part files written after the last checkpoint, and remove
+    the rows of changed directories from the other part files.
+
+    :param output_path: Parquet output directory.
+    :param source: directory containing the site directories.
+    :param config: parsed configuration (output of ``cytominer_database.utils.read_config``).
+    :param resume: True if the ingest is resumed.
+    :param cache: ``cytominer_database.utils.ChecksumCache`` of the image CSV checksums.
+    :param inventory: ``cytominer_database.inventory.Inventory`` of the site directories.
+
+    :return: a tuple (set of the keys of the directories that can be skipped, number of the next part file).
+    """
+    parts = list_part_files(output_path)
+
+    if not resume and parts:
+        raise ValueError(
+            "{} already contains Parquet part files. Remove them, or resume the ingest.".format(
+                output_path
+            )
+        )
+
+    entries = read_file_manifest(output_path) if resume else {}
+    entries = {key: entry for key, entry in entries.items() if "checkpoint" in entry}
+
+    if resume and not entries:
+        warnings.warn(
+            "No manifest found in {}. Ingesting all directories.".format(output_path),
+            UserWarning,
+        )
+
+    unchanged, _ = split_entries(source, entries, config, cache, inventory)
+
+    for part, paths in parts.items():
+        table_numbers = set(
+            entry["table_number"]
+            for entry in unchanged.values()
+            if entry["checkpoint"] == part
+        )
+
+        for path in paths:
+            if table_numbers:
+                filter_part_file(path, table_numbers, config)
+            else:
+                os.remove(path)
+
+    write_file_manifest(output_path, unchanged)
+
+    next_part = (
+        max(list(parts) + [entry["checkpoint"] for entry in entries.values()] + [-1])
+        + 1
+    )
+
+    return set(unchanged), next_part
@@ -1,14 +1,20 @@
+import concurrent.futures
+import functools
+import io
 import logging
 import os
 import click
 import pandas as pd
 
+import cytominer_database.instrumentation
+import cytominer_database.inventory
+import cytominer_database.load
 import cytominer_database.utils
 
 logger = logging.getLogger(__name__)
 
 
-def munge(config_path, source, target=None):
+def munge(config_path, source, target=None, workers=1, force=False):
     """
     Searches ``source`` for directories containing a CSV file corresponding to
     per-object measurements, then splits the CSV file into one CSV file per compartment.
@@ -17,12 +23,19 @@ def munge(config_path, source, target=None):
     Cytoplasm, and Nuclei. ``munge`` will split this CSV file into 3 CSV files:
     Cells.csv, Cytoplasm.csv, and Nuclei.csv.
 
+    Directories whose compartment CSV files are all newer than their object CSV file
+    have been munged already and are skipped.
+
     :param config_path: Path to configuration file.
 
     :param source: Directory containing subdirectories that contain an object CSV file.
 
     :param target: Output directory. If not specified, then it is same as ``source``.
 
+    :param workers: Number of worker processes that munge directories in parallel.
+
+    :param force: True if directories that have been munged already should be munged again.
+
     :return: list of subdirectories that have an object CSV file.
 
     Example::
@@ -37,7 +50,9 @@ def munge(config_path, source, target=None):
     if not target:
         target = source
 
-    directories = sorted(list(cytominer_database.utils.find_directories(source)))
+    directories = cytominer_database.inventory.open_inventory(
+        config, source
+    ).directories
 
     valid_directories = []  # list of subdirectories that have an object CSV file.
 
@@ -46,46 +61,316 @@ def munge(config_path, source, target=None):
 
         return valid_directories
 
-    for directory in directories:
-        try:
-            obj = pd.read_csv(
-                os.path.join(directory, config["filenames"]["object"]), header=[0, 1]
-            )
-
-        except IOError as e:
-            click.echo(e)
+    tasks = [
+        (
+            os.path.join(directory, config["filenames"]["object"]),
+            directory.replace(source, target),
+            force,
+        )
+        for directory in directories
+    ]
+
+    if workers > 1:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            errors = list(executor.map(_try_munge_directory, *zip(*tasks)))
+    else:
+        errors = [_try_munge_directory(*task) for task in tasks]
+
+    for directory, error in zip(directories, errors):
+        if error:
+            click.echo(error)
 
             continue
 
         valid_directories.append(directory)
 
-        target_directory = directory.replace(source, target)
+    return valid_directories
+
+
+def munge_directory(object_csv, target_directory, force=False):
+    """
+    Split an object CSV file into one CSV file per compartment, unless the compartment
+    CSV files are all newer than the object CSV file.
+
+    :param object_csv: object CSV file.
+    :param target_directory: Output directory.
+    :param force: True if the object CSV file should be split even if it has been already.
+
+    :return: True if the object CSV file was split, False if it was skipped.
+    """
+    if not force and is_munged(object_csv, target_directory):
+        return False
+
+    write_compartments(
+        split_compartments(read_object_csv(object_csv)), target_directory
+    )
+
+    return True
+
+
+def _try_munge_directory(object_csv, target_directory, force=False):
+    """
+    Calls ``munge_directory`` and returns the error message instead of raising IOError,
+    so that a single invalid directory does not abort the worker pool.
+
+    :return: None, or the error message.
+    """
+    try:
+        munge_directory(object_csv, target_directory, force)
+    except IOError as e:
+        return str(e)
+
+    return None
+
+
+def is_munged(object_csv, target_directory):
+    """
+    Check whether the compartment CSV files of an object CSV file exist and are all newer than it.
+    Only the header of the object CSV file is read.
+
+    :param object_csv: object CSV file.
+    :param target_directory: directory of the compartment CSV files.
+
+    :return: True if the compartment CSV files are up to date, False otherwise.
+    """
+    header = pd.read_csv(object_csv, header=[0, 1], nrows=0)
+
+    object_mtime = os.stat(object_csv).st_mtime_ns
+
+    for compartment_name in compartment_plan(tuple(header.columns)):
+        try:
+            mtime = os.stat(
+                os.path.join(target_directory, compartment_name + ".csv")
+            ).st_mtime_ns
+        except OSError:
+            return False
+
+        if mtime < object_mtime:
+            return False
+
+    return True
+
+
+def read_object_csv(source, chunk_rows=None):
+    """
+    Read an object CSV file, whose two-row header gives the compartment and the name of each column.
+
+    :param source: object CSV file, or file-like object.
+    :param chunk_rows: If given, an iterator over chunks of ``chunk_rows`` rows is returned
+     instead of a single dataframe.
+
+    :return: dataframe with a two-level column index (compartment, column).
+    """
+    return pd.read_csv(source, header=[0, 1], chunksize=chunk_rows)
+
+
+def split_compartments(obj):
+    """
+    Split the measurements of an object CSV file into one dataframe per compartment.
+    Every dataframe holds the Image columns (ImageNumber), an ObjectNumber column and the
+    columns of its compartment, as in the CSV files written by ``munge``.
+
+    :param obj: dataframe read by ``read_object_csv``.
+
+    :return: dictionary of dataframes, keyed by compartment name (e.g. "Cells"), in alphabetical order.
+    """
+    compartments = {}
+
+    for compartment_name, (positions, names) in compartment_plan(
+        tuple(obj.columns)
+    ).items():
+        compartment = obj.iloc[:, positions]
+
+        compartment.columns = names
 
-        if not os.path.exists(target_directory):
-            os.makedirs(target_directory)
+        compartments[compartment_name] = compartment
 
-        for compartment_name in set(obj.columns.get_level_values(0).tolist()) - {
-            "Image"
-        }:
+    return compartments
 
-            # select columns of the compartment
-            compartment = pd.concat([obj["Image"], obj[compartment_name]], axis=1)
 
-            # Create a new column
-            compartment["ObjectNumber"] = compartment["Number_Object_Number"]
+@functools.lru_cache(maxsize=16)
+def compartment_plan(columns):
+    """
+    Compute how an object CSV file is split into compartments: for every compartment, the positions
+    of its columns in the object CSV file and their names. The Image columns come first, then the
+    columns of the compartment. ObjectNumber (a copy of Number_Object_Number) is moved to the front,
+    after ImageNumber.
+
+    All object CSV files of a plate share the same header, so the plan is computed once per header.
+
+    :param columns: tuple of the (compartment, column) labels of the object CSV file.
+
+    :return: dictionary of (positions, names) tuples, keyed by compartment name, in alphabetical order.
+    """
+    compartments = {}
+
+    for position, (compartment_name, name) in enumerate(columns):
+        compartments.setdefault(compartment_name, []).append((position, name))
+
+    image = compartments.pop("Image", [])
+
+    plan = {}
+
+    for compartment_name in sorted(compartments):
+        cols = image + compartments[compartment_name]
+
+        names = [name for _, name in cols]
+
+        # Create a new column
+        number = cols[names.index("Number_Object_Number")]
+
+        if "ObjectNumber" in names:
+            cols[names.index("ObjectNumber")] = (number[0], "ObjectNumber")
+        else:
+            cols.append((number[0], "ObjectNumber"))
+
+        names = [name for _, name in cols]
+
+        # Move ImageNumber and ObjectNumber to the front
+
+        cols.insert(0, cols.pop(names.index("ObjectNumber")))
+
+        names = [name for _, name in cols]
+
+        cols.insert(0, cols.pop(names.index("ImageNumber")))
+
+        plan[compartment_name] = (
+            [position for position, _ in cols],
+            [name for _, name in cols],
+        )
+
+    return plan
+
+
+def write_compartments(compartments, target_directory):
+    """
+    Write one CSV file per compartment.
+
+    :param compartments: dictionary of dataframes, keyed by compartment name (output of ``split_compartments``).
+    :param target_directory: Output directory.
+    """
+    if not os.path.exists(target_directory):
+        os.makedirs(target_directory)
 
-            cols = compartment.columns.tolist()
+    for compartment_name, compartment in compartments.items():
+        compartment.to_csv(
+            os.path.join(target_directory, compartment_name + ".csv"), index=False
+        )
 
-            # Move ImageNumber and ObjectNumber to the front
 
-            cols.insert(0, cols.pop(cols.index("ObjectNumber")))
+def read_compartments(config, directory, write_munged=False, inventory=None):
+    """
+    Read the object CSV file of a directory and split it into one dataframe per compartment in memory,
+    so that the compartments can be ingested without writing and parsing intermediate CSV files.
 
-            cols.insert(0, cols.pop(cols.index("ImageNumber")))
+    :param config: parsed configuration (output of ``cytominer_database.utils.read_config``).
+    :param directory: directory containing the object CSV file.
+    :param write_munged: True if the CSV file of every compartment should be written to ``directory``
+     as well, as ``munge`` does (unless they are newer than the object CSV file).
+    :param inventory: ``cytominer_database.inventory.Inventory`` of the directory. If None, the directory is listed.
 
-            compartment = compartment.loc[:, cols]
+    :return: a tuple (object CSV file, dictionary of compartments keyed by name). Every compartment is a
+     dataframe or, if the object CSV file is read in chunks (see ``cytominer_database.utils.is_streamed``),
+     a callable that returns an iterator over dataframes. If no object CSV file is configured or present,
+     (None, {}) is returned.
 
-            compartment.to_csv(
-                os.path.join(target_directory, compartment_name + ".csv"), index=False
+    Raises IOError if the object CSV file is invalid.
+    """
+    if not config.has_option("filenames", "object"):
+        return None, {}
+
+    object_csv = os.path.join(directory, config["filenames"]["object"])
+
+    if inventory is not None:
+        exists = inventory.isfile(object_csv)
+    else:
+        exists = os.path.isfile(object_csv)
+
+    if not exists:
+        return None, {}
+
+    streamed = cytominer_database.utils.is_streamed(config, object_csv, inventory)
+
+    if streamed:
+        with cytominer_database.instrumentation.stage(
+            "validate", cytominer_database.utils.get_name(object_csv), object_csv
+        ):
+            valid = cytominer_database.utils.validate_csv_file(object_csv)
+    else:
+        valid, _, buffer = cytominer_database.utils.scan_csv(
+            object_csv, compute_checksum=False
+        )
+
+    if not valid:
+        raise IOError(
+            "Some files were invalid: {}. Skipping {}.".format(
+                os.path.basename(object_csv), directory
             )
+        )
 
-    return valid_directories
+    if not streamed:
+        with cytominer_database.instrumentation.stage(
+            "parse", cytominer_database.utils.get_name(object_csv), object_csv
+        ) as timer:
+            obj = read_object_csv(io.BytesIO(buffer))
+            timer.count(rows=obj.shape[0], bytes=len(buffer))
+
+        with cytominer_database.instrumentation.stage(
+            "munge", cytominer_database.utils.get_name(object_csv), object_csv
+        ):
+            compartments = split_compartments(obj)
+
+        if write_munged and not is_munged(object_csv, directory):
+            write_compartments(compartments, directory)
+
+        return object_csv, compartments
+
+    chunk_rows = int(config["ingestion_engine"]["chunk_rows"])
+
+    if write_munged and not is_munged(object_csv, directory):
+        write_compartment_chunks(object_csv, directory, chunk_rows)
+
+    header = pd.read_csv(object_csv, header=[0, 1], nrows=0)
+
+    compartments = {
+        compartment_name: functools.partial(
+            iter_compartment_chunks, object_csv, compartment_name, chunk_rows
+        )
+        for compartment_name in compartment_plan(tuple(header.columns))
+    }
+
+    return object_csv, compartments
+
+
+def iter_compartment_chunks(object_csv, compartment_name, chunk_rows):
+    """
+    Lazily yields the dataframes of a compartment, read from an object CSV file in chunks of ``chunk_rows`` rows.
+
+    :param object_csv: object CSV file.
+    :param compartment_name: compartment, e.g. "Cells".
+    :param chunk_rows: number of rows per chunk.
+    """
+    # every chunk has the column types of the whole file
+    for obj in cytominer_database.load.read_csv_chunks(
+        object_csv, chunk_rows, header=[0, 1]
+    ):
+        yield split_compartments(obj)[compartment_name]
+
+
+def write_compartment_chunks(object_csv, target_directory, chunk_rows):
+    """
+    Same as ``write_compartments``, but the object CSV file is read and written in chunks of ``chunk_rows`` rows.
+
+    :param object_csv: object CSV file.
+    :param target_directory: Output directory.
+    :param chunk_rows: number of rows per chunk.
+    """
+    with read_object_csv(object_csv, chunk_rows=chunk_rows) as reader:
+        for index, obj in enumerate(reader):
+            for compartment_name, compartment in split_compartments(obj).items():
+                compartment.to_csv(
+                    os.path.join(target_directory, compartment_name + ".csv"),
+                    index=False,
+                    mode="w" if index == 0 else "a",
+                    header=index == 0,
+                )
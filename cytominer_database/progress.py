@@ -0,0 +1,255 @@
+"""
+Progress of an ingest.
+
+A ``Progress`` counts the directories ingested and the rows and bytes written to every table. Every
+``interval`` seconds, it reports the progress as a line such as
+
+    [ingest] 120/384 directories (31.2%), 2,345,678 rows, 1,234.5 MB, 10,234 rows/s, 5.4 MB/s, ETA 0:42:10
+
+and, if given a metrics file, rewrites that file in the Prometheus text format, so that it can be scraped
+by the textfile collector of a node exporter. The rates are those since the previous report, and those
+of the whole ingest in the final report (see ``Progress.close``). The ETA
+assumes that the remaining directories are ingested at the mean rate of the directories done so far.
+
+Bytes are the in-memory size of the tables written (see ``table_bytes``), not the size of the CSV files.
+"""
+
+import collections
+import datetime
+import os
+import tempfile
+import time
+
+import click
+import pyarrow
+
+METRIC_PREFIX = "cytominer_database_ingest"
+
+
+def table_bytes(table):
+    """
+    Size of a table in memory, without the objects referenced by its columns (e.g. strings).
+
+    :param table: pandas dataframe or pyarrow table.
+    """
+    if isinstance(table, pyarrow.Table):
+        return table.nbytes
+
+    return int(table.memory_usage(index=False, deep=False).sum())
+
+
+def format_duration(seconds):
+    """
+    Format a duration as H:MM:SS.
+
+    :param seconds: duration in seconds, or None if unknown.
+    """
+    if seconds is None:
+        return "unknown"
+
+    return str(datetime.timedelta(seconds=int(round(seconds))))
+
+
+def echo_stderr(line):
+    """
+    Print a line to the standard error, which batch schedulers log along with the standard output.
+    """
+    click.echo(line, err=True)
+
+
+class Progress(object):
+    """
+    Progress of an ingest.
+
+    :param interval: minimum number of seconds between two reports. If 0, every directory is reported.
+     If None, the progress is counted, but never reported.
+    :param metrics_file: file that is (re)written in the Prometheus text format at every report, or None.
+    :param echo: function that prints a line of the report. Default: ``echo_stderr``.
+    """
+
+    def __init__(self, interval=60.0, metrics_file=None, echo=None):
+        self.interval = interval
+        self.metrics_file = metrics_file
+        self.echo = echo if echo is not None else echo_stderr
+
+        self.total = 0
+        self.directories = 0
+        self.rows = collections.Counter()
+        self.bytes = collections.Counter()
+
+        self.start_time = self.report_time = time.monotonic()
+        self.report_rows = self.report_bytes = 0
+        self.rows_per_second = self.bytes_per_second = 0.0
+
+    def start(self, total):
+        """
+        Start counting.
+
+        :param total: number of directories to ingest.
+        """
+        self.total = total
+        self.start_time = self.report_time = time.monotonic()
+
+    def add(self, table_name, rows, nbytes=0):
+        """
+        Count rows written to a table.
+
+        :param table_name: table name, e.g. "Cells".
+        :param rows: number of rows.
+        :param nbytes: size of the rows in bytes.
+        """
+        self.rows[table_name] += rows
+        self.bytes[table_name] += nbytes
+
+    def add_table(self, table_name, table):
+        """
+        Count the rows of a table that has been written.
+
+        :param table_name: table name, e.g. "Cells".
+        :param table: pandas dataframe or pyarrow table.
+        """
+        self.add(table_name, len(table), table_bytes(table))
+
+    def end_directory(self, count=1):
+        """
+        Count ingested (or skipped) directories, and report the progress if ``interval`` seconds have passed since
+        the last report.
+
+        :param count: number of directories.
+        """
+        self.directories += count
+
+        if self.interval is None:
+            return
+
+        if time.monotonic() - self.report_time >= self.interval:
+            self.report()
+
+    def eta(self):
+        """
+        Estimated number of seconds until all directories are ingested, or None if no directory is done yet.
+        """
+        if self.directories == 0:
+            return None
+
+        elapsed = time.monotonic() - self.start_time
+
+        return elapsed / self.directories * max(self.total - self.directories, 0)
+
+    def report(self, final=False):
+        """
+        Report the progress: print a line, and write the metrics file if any.
+
+        :param final: if True, the rates are those of the whole ingest rather than since the previous report.
+        """
+        now = time.monotonic()
+
+        rows, nbytes = sum(self.rows.values()), sum(self.bytes.values())
+
+        if final:
+            self.report_time = self.start_time
+            self.report_rows = self.report_bytes = 0
+
+        if now > self.report_time:
+            self.rows_per_second = (rows - self.report_rows) / (now - self.report_time)
+            self.bytes_per_second = (nbytes - self.report_bytes) / (
+                now - self.report_time
+            )
+
+        self.report_time, self.report_rows, self.report_bytes = now, rows, nbytes
+
+        eta = self.eta()
+
+        self.echo(
+            "[ingest] {}/{} directories ({:.1f}%), {:,} rows, {:,.1f} MB, {:,.0f} rows/s, {:,.1f} MB/s, ETA {}".format(
+                self.directories,
+                self.total,
+                100.0 * self.directories / self.total if self.total else 100.0,
+                rows,
+                nbytes / 1e6,
+                self.rows_per_second,
+                self.bytes_per_second / 1e6,
+                format_duration(eta),
+            )
+        )
+
+        if self.metrics_file:
+            self.write_metrics(now, eta)
+
+    def metrics(self, now, eta):
+        """
+        Lines of the metrics file, in the Prometheus text format.
+
+        :param now: ``time.monotonic`` value of the report.
+        :param eta: estimated number of seconds until the end, or None.
+        """
+        gauges = [
+            ("directories_total", "Number of directories to ingest.", self.total),
+            ("directories_done", "Number of directories ingested.", self.directories),
+            (
+                "elapsed_seconds",
+                "Seconds since the ingest started.",
+                now - self.start_time,
+            ),
+            (
+                "rows_per_second",
+                "Rows written per second since the previous report (over the whole ingest in the final report).",
+                self.rows_per_second,
+            ),
+            (
+                "bytes_per_second",
+                "Bytes written per second since the previous report (over the whole ingest in the final report).",
+                self.bytes_per_second,
+            ),
+            (
+                "eta_seconds",
+                "Estimated seconds until the ingest ends (NaN if unknown).",
+                float("nan") if eta is None else eta,
+            ),
+        ]
+
+        lines = []
+
+        for name, description, value in gauges:
+            lines += [
+                "# HELP {}_{} {}".format(METRIC_PREFIX, name, description),
+                "# TYPE {}_{} gauge".format(METRIC_PREFIX, name),
+                "{}_{} {}".format(METRIC_PREFIX, name, float(value)),
+            ]
+
+        for name, description, counts in [
+            ("rows_total", "Rows written, by table.", self.rows),
+            ("bytes_total", "Bytes written, by table.", self.bytes),
+        ]:
+            lines += [
+                "# HELP {}_{} {}".format(METRIC_PREFIX, name, description),
+                "# TYPE {}_{} counter".format(METRIC_PREFIX, name),
+            ]
+            lines += [
+                '{}_{}{{table="{}"}} {}'.format(METRIC_PREFIX, name, table, count)
+                for table, count in sorted(counts.items())
+            ]
+
+        return lines
+
+    def write_metrics(self, now, eta):
+        """
+        Write the metrics file. The file is replaced atomically, so that a scraper never reads a partial file.
+        """
+        directory = os.path.dirname(os.path.abspath(self.metrics_file))
+
+        with tempfile.NamedTemporaryFile(
+            "w", dir=directory, suffix=".tmp", delete=False
+        ) as fd:
+            fd.write("\n".join(self.metrics(now, eta)) + "\n")
+
+        # temporary files are created readable by their owner only, and the scraper may run as another user
+        os.chmod(fd.name, 0o644)
+        os.replace(fd.name, self.metrics_file)
+
+    def close(self):
+        """
+        Report the final progress, with the rates of the whole ingest (unless ``interval`` is None).
+        """
+        if self.interval is not None:
+            self.report(final=True)
@@ -1,5 +1,7 @@
 import os.path
 import csv
+import functools
+import inspect
 import click
 import warnings
 import zlib
@@ -12,10 +14,14 @@ import pyarrow.parquet as pq
 import pyarrow.csv
 import numpy as np
 import collections
+import concurrent.futures
 import numpy as np
 import cytominer_database
+import cytominer_database.inventory
 import cytominer_database.utils
 import cytominer_database.load
+import cytominer_database.munge
+import cytominer_database.write
 
 ################################################################################
 # Contains "open_writers()"" to generate the dictionary containing the
@@ -28,7 +34,15 @@ import cytominer_database.load
 ################################################################################
 
 
-def open_writers(source, target, config_file, skip_image_prefix=True):
+def open_writers(
+    source,
+    target,
+    config_file,
+    skip_image_prefix=True,
+    munge=False,
+    workers=1,
+    inventory=None,
+):
     """
     Determines, loads reference tables and openes them as ParquetWriters.
     Returns a dictionary referencing the writers.
@@ -37,19 +51,58 @@ def open_writers(source, target, config_file, skip_image_prefix=True):
     :config_file: parsed configuration data (output from cytominer_database.utils.read_config(config_path))
     :skip_image_prefix: Boolean value specifying if the column headers of
      the image.csv files should be prefixed with the table name ("Image").
+    :munge: Boolean value specifying if the object .csv files are split into compartments
+     in memory (see cytominer_database.munge.read_compartments()). The reference tables of the
+     compartments are then split from the reference object .csv file.
+    :workers: number of worker processes that validate the sampled reference tables.
+    :inventory: cytominer_database.inventory.Inventory of the site directories. If None, source is scanned.
     :writers_dict: dictionary referencing the writers (return argument)
     """
+    if inventory is None:
+        inventory = cytominer_database.inventory.open_inventory(config_file, source)
+    partitions = None
+    if config_file["ingestion_engine"]["engine"] == "Parquet":
+        partitions = get_partition_index(config_file)
+    if config_file["schema"]["reference_option"] == "infer":
+        # the schema of every table kind is inferred from samples of all files
+        schemas = infer_schemas(
+            source, config_file, skip_image_prefix, munge, inventory
+        )
+        if config_file["ingestion_engine"]["engine"] == "SQLite":
+            # no writers, the tables are created from the schemas (see cytominer_database.write.create_tables())
+            return {
+                name: {"writer": None, "schema": schema}
+                for name, schema in schemas.items()
+            }
+        return {
+            name: open_schema_writer(name, schema, target, config_file, partitions)
+            for name, schema in schemas.items()
+        }
     if (
         config_file["ingestion_engine"]["engine"] == "SQLite"
     ):  # no reference table needed
         return None
 
     reference_directories = get_path_dictionary(
-        config_file, source
+        config_file, source, workers, inventory
     )  # includes different steps, depending on config_file
     writers_dict = {}
     refIdentifier = 999 & 0xFFFFFFFF
     # arbitrary identifier, will not be stored but used only as type template. (uint32 as in checksum())
+    # the object .csv file is split into compartments instead of being a table of its own
+    compartments = {}
+    if munge and config_file.has_option("filenames", "object"):
+        object_name = cytominer_database.utils.get_name(
+            config_file["filenames"]["object"]
+        )
+        if object_name in reference_directories:
+            object_path = reference_directories.pop(object_name)[0]
+            _, compartments = cytominer_database.munge.read_compartments(
+                config_file, os.path.dirname(object_path), inventory=inventory
+            )
+        # compartment .csv files written by an earlier munge are not ingested
+        for compartment_name in compartments:
+            reference_directories.pop(compartment_name.capitalize(), None)
     # Iterate over all table kinds:
     for (
         name,
@@ -60,30 +113,545 @@ def open_writers(source, target, config_file, skip_image_prefix=True):
         # unpack path from [path] # if isinstance(path, list):
         path = path[0]
         # load dataframe. Attention: Unpack from list return argument
-        ref_df = cytominer_database.load.get_and_modify_df(
-            path, refIdentifier, skip_image_prefix
+        if cytominer_database.utils.is_streamed(config_file, path):
+            # large reference file: the schema is inferred from its first chunk
+            ref_df = next(
+                cytominer_database.load.get_and_modify_chunks(
+                    path,
+                    refIdentifier,
+                    skip_image_prefix,
+                    int(config_file["ingestion_engine"]["chunk_rows"]),
+                )
+            )
+        else:
+            ref_df = cytominer_database.load.get_and_modify_df(
+                path,
+                refIdentifier,
+                skip_image_prefix,
+                csv_reader=config_file["ingestion_engine"]["csv_reader"],
+            )
+        writers_dict[name] = open_writer(name, ref_df, target, config_file, partitions)
+    for compartment_name, ref_df in compartments.items():
+        if callable(ref_df):
+            # large object .csv file: the schema is inferred from its first chunk
+            ref_df = next(ref_df())
+        cytominer_database.load.add_tableNumber(ref_df, refIdentifier)
+        name = compartment_name.capitalize()
+        writers_dict[name] = open_writer(name, ref_df, target, config_file, partitions)
+    return writers_dict
+
+
+def open_writer(name, ref_df, target, config_file, partitions=None):
+    """
+    Opens the ParquetWriter of a table kind. Its schema is the one of the reference dataframe
+    after type conversion.
+    Returns a dictionary holding the writer ("writer") and its schema ("schema").
+    :param name: table name, e.g. "Cells"
+    :param ref_df: reference dataframe (with TableNumber column)
+    :param target: output directory
+    :param config_file: parsed configuration data (output from cytominer_database.utils.read_config(config_path))
+    :param partitions: cytominer_database.write.PartitionIndex of a partitioned layout, or None (see get_partition_index())
+    """
+    #  is also used in ingest.seed()
+    ref_df = cytominer_database.utils.type_convert_dataframe(ref_df, config_file)
+    ref_table = pyarrow.Table.from_pandas(ref_df)
+    ref_schema = ref_table.schema
+    return open_schema_writer(name, ref_schema, target, config_file, partitions)
+
+
+def open_schema_writer(name, schema, target, config_file, partitions=None):
+    """
+    Opens the ParquetWriter of a table kind with a given schema. The string columns set in
+    [parquet] dictionary_columns are dictionary-encoded (see dictionary_schema()).
+    With [parquet] layout = partitioned, the writer writes a partitioned dataset in the directory
+    of the table kind, which must not hold the dataset of a previous ingest
+    (see cytominer_database.write.PartitionedParquetWriter). With [parquet] checkpoint_directories,
+    the writer writes numbered part files in the directory of the table kind
+    (see cytominer_database.write.CheckpointedParquetWriter).
+    Returns a dictionary holding the writer ("writer") and its schema ("schema").
+    :param name: table name, e.g. "Cells"
+    :param schema: pyarrow schema of the table
+    :param target: output directory
+    :param config_file: parsed configuration data (output from cytominer_database.utils.read_config(config_path))
+    :param partitions: cytominer_database.write.PartitionIndex of a partitioned layout, or None (see get_partition_index())
+    """
+    schema = dictionary_schema(schema, config_file)
+    if partitions is None and get_checkpoint_directories(config_file):
+        writer = cytominer_database.write.CheckpointedParquetWriter(
+            os.path.join(target, name),
+            schema,
+            functools.partial(open_parquet_file, config_file=config_file),
         )
-        #  is also used in ingest.seed()
-        cytominer_database.utils.type_convert_dataframe(ref_df, config_file)
-        ref_table = pyarrow.Table.from_pandas(ref_df)
-        ref_schema = ref_table.schema
+    elif partitions is None:
         destination = os.path.join(target, name + ".parquet")
-        writers_dict[name] = {}
-        writers_dict[name]["writer"] = pq.ParquetWriter(
-            destination, ref_schema, flavor={"spark"}
+        writer = open_parquet_file(destination, schema, config_file)
+    else:
+        directory = os.path.join(target, name)
+        if os.path.isdir(directory) and os.listdir(directory):
+            raise ValueError(
+                "{} is not empty. Remove the dataset of the previous ingest, or write to another directory.".format(
+                    directory
+                )
+            )
+        writer = cytominer_database.write.PartitionedParquetWriter(
+            directory,
+            schema,
+            partitions,
+            functools.partial(open_parquet_file, config_file=config_file),
+            max_open_files=int(config_file["parquet"]["max_open_files"]),
+            image=name
+            == cytominer_database.utils.get_name(config_file["filenames"]["image"]),
         )
-        writers_dict[name]["schema"] = ref_schema
-        writers_dict[name]["pandas_dataframe"] = ref_df
-    return writers_dict
+    return {"writer": writer, "schema": schema}
 
 
-def get_path_dictionary(config_file, source):
+def open_parquet_file(destination, schema, config_file):
+    """
+    Opens a Parquet file for writing, with the codec, encodings and statistics set in
+    the [parquet] section (see get_parquet_options()).
+    Returns a cytominer_database.write.BufferedParquetWriter.
+    :param destination: path of the Parquet file
+    :param schema: pyarrow schema of the file
+    :param config_file: parsed configuration data (output from cytominer_database.utils.read_config(config_path))
+    """
+    # coalesce the tables of many small .csv files into large row groups
+    return cytominer_database.write.BufferedParquetWriter(
+        pq.ParquetWriter(
+            destination,
+            schema,
+            flavor={"spark"},
+            **get_parquet_options(schema, config_file)
+        ),
+        row_group_rows=int(config_file["parquet"]["row_group_rows"]),
+        row_group_bytes=int(config_file["parquet"]["row_group_bytes"]),
+    )
+
+
+def parse_columns(value, schema):
+    """
+    Parses a [parquet] option that applies to all columns ("true"), to no column ("false" or empty),
+    or to a comma-separated list of columns. Returns the names of the columns of the schema it applies to.
+    :param value: value of the option
+    :param schema: pyarrow schema of the Parquet file
+    """
+    if value.strip().lower() in ["true", "false"]:
+        return schema.names if value.strip().lower() == "true" else []
+    names = [column.strip() for column in value.split(",")]
+    # the columns differ between table kinds
+    return [name for name in schema.names if name in names]
+
+
+def get_parquet_options(schema, config_file):
+    """
+    Returns the keyword arguments of pyarrow.parquet.ParquetWriter set in the [parquet] section:
+    the codec (compression, compression_level), the columns that are dictionary-encoded
+    (use_dictionary), delta-encoded (delta_columns) or have statistics (write_statistics),
+    the data page size and version, and the columns with a Bloom filter (bloom_filter_columns).
+    Options that are not set are left to the defaults of pyarrow.
+    :param schema: pyarrow schema of the Parquet file
+    :param config_file: parsed configuration data (output from cytominer_database.utils.read_config(config_path))
+    """
+    section = config_file["parquet"]
+    compression = section["compression"].strip().lower()
+    if compression not in PARQUET_CODECS:
+        raise ValueError(
+            "Incorrect 'compression' specification in your configuration file. Please set the value to one of {}, as documented in the README. ".format(
+                ", ".join(PARQUET_CODECS)
+            )
+        )
+    if section["data_page_version"] not in ["1.0", "2.0"]:
+        raise ValueError(
+            "Incorrect 'data_page_version' specification in your configuration file. Please set the value to '1.0' or '2.0', as documented in the README. "
+        )
+    # delta encoding suits the sorted integer keys, and excludes dictionary encoding
+    delta_columns = [
+        field.name
+        for field in schema
+        if field.name in parse_columns(section["delta_columns"], schema)
+        and pyarrow.types.is_integer(field.type)
+    ]
+    options = {
+        "compression": compression,
+        "use_dictionary": [
+            name
+            for name in parse_columns(section["use_dictionary"], schema)
+            if name not in delta_columns
+        ],
+        "data_page_version": section["data_page_version"],
+        "write_statistics": parse_columns(section["write_statistics"], schema),
+    }
+    if delta_columns:
+        options["column_encoding"] = {
+            name: "DELTA_BINARY_PACKED" for name in delta_columns
+        }
+    if section["compression_level"].strip():
+        options["compression_level"] = int(section["compression_level"])
+    if section["data_page_size"].strip():
+        options["data_page_size"] = int(section["data_page_size"])
+    bloom_filter_columns = parse_columns(section["bloom_filter_columns"], schema)
+    if bloom_filter_columns:
+        if "bloom_filter_options" not in inspect.signature(pq.ParquetWriter).parameters:
+            raise ValueError(
+                "[parquet] bloom_filter_columns needs a pyarrow release that writes Bloom filters; pyarrow {} does not. Please upgrade pyarrow, or leave the value empty.".format(
+                    pyarrow.__version__
+                )
+            )
+        options["bloom_filter_options"] = {name: True for name in bloom_filter_columns}
+    return options
+
+
+def get_checkpoint_directories(config_file):
+    """
+    Returns the number of directories after which the Parquet part files are closed and the
+    directories recorded in the manifest ([parquet] checkpoint_directories), or 0 if every
+    table kind is written to a single Parquet file that is closed at the end of the ingest.
+    :param config_file: parsed configuration data (output from cytominer_database.utils.read_config(config_path))
+    """
+    checkpoint_directories = int(config_file["parquet"]["checkpoint_directories"])
+    if checkpoint_directories < 0:
+        raise ValueError(
+            "Incorrect 'checkpoint_directories' specification in your configuration file. Please set the value to 0 or a positive number, as documented in the README. "
+        )
+    if checkpoint_directories and config_file["parquet"]["layout"] == "partitioned":
+        raise ValueError(
+            "[parquet] checkpoint_directories cannot be used with layout = partitioned. Please set it to 0, as documented in the README. "
+        )
+    return checkpoint_directories
+
+
+def get_partition_index(config_file):
+    """
+    Returns the cytominer_database.write.PartitionIndex shared by the writers of all table kinds
+    if [parquet] layout = partitioned, with a BufferBudget of [parquet] max_buffer_bytes, or None if every table kind is written to a single
+    Parquet file ([parquet] layout = file).
+    :param config_file: parsed configuration data (output from cytominer_database.utils.read_config(config_path))
+    """
+    layout = config_file["parquet"]["layout"]
+    if layout not in cytominer_database.write.PARQUET_LAYOUTS:
+        raise ValueError(
+            "Incorrect 'layout' specification in your configuration file. Please set the value to one of {}, as documented in the README. ".format(
+                ", ".join(cytominer_database.write.PARQUET_LAYOUTS)
+            )
+        )
+    if layout == "file":
+        return None
+    columns = [
+        column.strip()
+        for column in config_file["parquet"]["partition_columns"].split(",")
+        if column.strip()
+    ]
+    if not columns:
+        raise ValueError(
+            "No [parquet] partition_columns in your configuration file. Please list the image metadata columns that partition the dataset, e.g. Metadata_Plate, Metadata_Well."
+        )
+    budget = cytominer_database.write.BufferBudget(
+        int(config_file["parquet"]["max_buffer_bytes"])
+    )
+    return cytominer_database.write.PartitionIndex(columns, budget)
+
+
+def get_parse_schemas(writers_dict, config_file):
+    """
+    Returns the schemas whose column types are applied when the .csv files are parsed
+    (see cytominer_database.load.parse_types()), keyed by table kind, or None.
+    Parsing with the reference types replaces type inference and type conversion, and
+    files whose columns would be inferred differently (e.g. int in one site, float in
+    another) are parsed to the same types. With type_conversion = all2string, the values
+    keep the string representation of pandas, so the files are parsed as before.
+    :param writers_dict: dictionary returned by open_writers(), or None.
+    :param config_file: parsed configuration data (output from cytominer_database.utils.read_config(config_path))
+    """
+    if not writers_dict:
+        return None
+    if (
+        config_file["schema"]["reference_option"] != "infer"
+        and config_file["schema"]["type_conversion"] == "all2string"
+    ):
+        return None
+    return {name: entry["schema"] for name, entry in writers_dict.items()}
+
+
+# Allowed values of [parquet] compression
+PARQUET_CODECS = ["none", "snappy", "gzip", "brotli", "lz4", "zstd"]
+
+# name parts of the CellProfiler columns that hold the same few values in many rows
+# (plate, well, site, channel file names and paths)
+DICTIONARY_NAMES = ["Metadata_", "FileName_", "PathName_", "URL_"]
+
+
+def get_dictionary_columns(schema, config_file):
+    """
+    Returns the names of the string columns of a schema that are dictionary-encoded, as set in
+    [parquet] dictionary_columns: "auto" for the metadata, file name and path columns
+    (see DICTIONARY_NAMES), "none", or a comma-separated list of column names.
+    :param schema: pyarrow schema of the table kind
+    :param config_file: parsed configuration data (output from cytominer_database.utils.read_config(config_path))
+    """
+    option = config_file["parquet"]["dictionary_columns"].strip()
+    if option == "none":
+        return []
+    strings = [
+        field.name
+        for field in schema
+        if pyarrow.types.is_string(field.type)
+        or pyarrow.types.is_large_string(field.type)
+    ]
+    if option == "auto":
+        return [
+            name for name in strings if any(part in name for part in DICTIONARY_NAMES)
+        ]
+    names = [name.strip() for name in option.split(",")]
+    return [name for name in strings if name in names]
+
+
+def dictionary_schema(schema, config_file):
+    """
+    Returns the schema with the columns of get_dictionary_columns() typed as dictionaries.
+    Their values are then stored once per column chunk of the Parquet file, and read back as
+    dictionary arrays (pandas categoricals) without decoding every row.
+    :param schema: pyarrow schema of the table kind
+    :param config_file: parsed configuration data (output from cytominer_database.utils.read_config(config_path))
+    """
+    names = get_dictionary_columns(schema, config_file)
+    if not names:
+        return schema
+    return pyarrow.schema(
+        [
+            (
+                field.with_type(pyarrow.dictionary(pyarrow.int32(), field.type))
+                if field.name in names
+                else field
+            )
+            for field in schema
+        ],
+        metadata=schema.metadata,
+    )
+
+
+def infer_schemas(
+    source, config_file, skip_image_prefix=True, munge=False, inventory=None
+):
+    """
+    Infers the schema of every table kind from all .csv files instead of a single reference file.
+    The header and the first [schema] infer_rows rows of every file are read; the schema of a table
+    kind holds every column found in any of its files (in order of appearance), and the type of a
+    column is the narrowest type all of its samples can be promoted to (see promote_type()).
+    Columns that are empty in every sample are typed float64. If a file has more rows than were
+    sampled, its columns that were sampled as integers (except the key columns, see
+    cytominer_database.utils.KEEP_INT) are then read entirely, so that a float (or a missing value)
+    after the sampled rows promotes them as well. With [schema] precision = single, the types are
+    then narrowed to 32 bits (see cytominer_database.utils.narrow_schema()).
+    Returns a dictionary with key: table name, value: pyarrow schema.
+    :param source: path to directory containing all parent folders of .csv files
+    :param config_file: parsed configuration data (output from cytominer_database.utils.read_config(config_path))
+    :param skip_image_prefix: Boolean value specifying if the column headers of
+     the image.csv files should be prefixed with the table name ("Image").
+    :param munge: Boolean value specifying if the object .csv files are split into compartments
+     in memory. The compartments are then sampled instead of the object .csv files and of
+     compartment .csv files written by an earlier munge.
+    :param inventory: cytominer_database.inventory.Inventory of the site directories. If None, source is scanned.
+    """
+    if inventory is None:
+        inventory = cytominer_database.inventory.open_inventory(config_file, source)
+    infer_rows = int(config_file["schema"]["infer_rows"])
+    # 0: the files are read entirely
+    nrows = infer_rows if infer_rows > 0 else None
+    fields = collections.OrderedDict()
+    # directories with a file that has more rows than were sampled, and the table kinds of these files
+    partial = collections.OrderedDict()
+    for directory in inventory.directories:
+        for name, sample in sample_directory(
+            directory, config_file, skip_image_prefix, munge, nrows, inventory
+        ):
+            promote_fields(fields.setdefault(name, collections.OrderedDict()), sample)
+            if nrows is not None and len(sample) >= nrows:
+                partial.setdefault(directory, set()).add(name)
+    for directory, names in partial.items():
+        columns = {
+            name: [
+                column
+                for column, type in fields[name].items()
+                if pyarrow.types.is_integer(type)
+                and column not in cytominer_database.utils.KEEP_INT
+            ]
+            for name in names
+        }
+        columns = {name: integers for name, integers in columns.items() if integers}
+        if not columns:
+            continue
+        # the integer columns are read entirely
+        for name, sample in sample_directory(
+            directory,
+            config_file,
+            skip_image_prefix,
+            munge,
+            None,
+            inventory,
+            columns,
+        ):
+            promote_fields(
+                fields[name],
+                sample[
+                    [column for column in sample.columns if column in columns[name]]
+                ],
+            )
+    return {
+        name: cytominer_database.utils.narrow_schema(
+            pyarrow.schema(
+                [
+                    (column, pyarrow.float64() if pyarrow.types.is_null(type) else type)
+                    for column, type in table_fields.items()
+                ]
+            ),
+            config_file,
+        )
+        for name, table_fields in fields.items()
+    }
+
+
+def promote_fields(table_fields, sample):
+    """
+    Promotes the types of the columns of a table kind with the types of a sample (see promote_type()).
+    Columns that are not in table_fields yet are added.
+    :param table_fields: ordered dictionary of pyarrow types keyed by column name, updated in place
+    :param sample: pandas dataframe
+    """
+    for column in sample.columns:
+        table_fields[column] = promote_type(
+            table_fields.get(column, pyarrow.null()),
+            sample_type(sample[column]),
+        )
+
+
+def is_sampled_column(columns, prefix, column):
+    """
+    Returns True if a column of a .csv file is one of the columns to read.
+    :param columns: set of column names, with the table name prefixed if prefix is given
+    :param prefix: table name prefixed to the column names (see cytominer_database.load.add_prefix()), or None
+    :param column: column name in the .csv file
+    """
+    if prefix is not None:
+        column = cytominer_database.load.get_prefixed_column_labels(prefix, [column])[0]
+    return column in columns
+
+
+def sample_directory(
+    directory, config_file, skip_image_prefix, munge, nrows, inventory, columns=None
+):
+    """
+    Reads the header and the first rows of every .csv file of a directory.
+    Returns a list of (table_name, dataframe) tuples. The dataframes are modified as in
+    cytominer_database.load.get_and_modify_df(). Files that cannot be parsed are left out.
+    :param directory: directory containing the .csv files of one site
+    :param config_file: parsed configuration data (output from cytominer_database.utils.read_config(config_path))
+    :param skip_image_prefix: Boolean value specifying if the column headers of
+     the image.csv files should be prefixed with the table name ("Image").
+    :param munge: Boolean value specifying if the object .csv file is split into compartments.
+    :param nrows: number of rows read from every file (None: all rows).
+    :param inventory: cytominer_database.inventory.Inventory of the directory.
+    :param columns: lists of column names (as in the returned dataframes) keyed by table name, or None.
+     If given, only these tables are read, and only these columns of the .csv files of the tables
+     (the object .csv file split into compartments is read entirely).
+    """
+    samples = []
+    compartments = {}
+    image_name = cytominer_database.utils.get_name(config_file["filenames"]["image"])
+    if (
+        munge
+        and config_file.has_option("filenames", "object")
+        and (columns is None or set(columns) - {image_name})
+    ):
+        object_csv = os.path.join(directory, config_file["filenames"]["object"])
+        if inventory.isfile(object_csv):
+            try:
+                obj = pd.read_csv(object_csv, header=[0, 1], nrows=nrows)
+                compartments = cytominer_database.munge.split_compartments(obj)
+            except (pd.errors.EmptyDataError, pd.errors.ParserError, ValueError):
+                compartments = {}
+    compartment_names = [name.capitalize() for name in compartments]
+    filenames = [
+        os.path.join(directory, config_file["filenames"]["image"])
+    ] + cytominer_database.utils.collect_csvs(config_file, directory, inventory)
+    for filename in filenames:
+        name = cytominer_database.utils.get_name(filename)
+        if name in compartment_names or not inventory.isfile(filename):
+            continue
+        if columns is not None and name not in columns:
+            continue
+        prefixed = (not skip_image_prefix) and name in ["Image", "Object"]
+        usecols = None
+        if columns is not None:
+            # the columns of the .csv file are selected by their name once prefixed
+            usecols = functools.partial(
+                is_sampled_column, set(columns[name]), name if prefixed else None
+            )
+        try:
+            sample = pd.read_csv(filename, nrows=nrows, usecols=usecols)
+        except (pd.errors.EmptyDataError, pd.errors.ParserError):
+            continue
+        if prefixed:
+            cytominer_database.load.add_prefix(name, sample)
+        samples += [(name, sample)]
+    for compartment_name, sample in compartments.items():
+        name = compartment_name.capitalize()
+        if columns is not None and name not in columns:
+            continue
+        samples += [(name, sample)]
+    for _, sample in samples:
+        # arbitrary identifier, only its type (int64) is used
+        cytominer_database.load.add_tableNumber(sample, 0)
+    return samples
+
+
+# Types a column may be inferred as, from narrowest to widest. Every type can be cast to the
+# types that follow it; any other type is promoted to string.
+PROMOTION_ORDER = [
+    pyarrow.null(),
+    pyarrow.bool_(),
+    pyarrow.int64(),
+    pyarrow.float64(),
+    pyarrow.string(),
+]
+
+
+def sample_type(column):
+    """
+    Returns the pyarrow type of a sampled pandas column: null if all sampled values are missing.
+    :param column: pandas series
+    """
+    if column.isna().all():
+        return pyarrow.null()
+    try:
+        return pyarrow.Array.from_pandas(column).type
+    except (pyarrow.ArrowInvalid, pyarrow.ArrowTypeError):
+        # mixed Python objects
+        return pyarrow.string()
+
+
+def promote_type(left, right):
+    """
+    Returns the narrowest type both pyarrow types can be cast to, e.g. float64 for int64 and float64.
+    Types that are not in PROMOTION_ORDER are promoted to string.
+    :param left: pyarrow type
+    :param right: pyarrow type
+    """
+    if left == right:
+        return left
+    if left not in PROMOTION_ORDER or right not in PROMOTION_ORDER:
+        return pyarrow.string()
+    return max(left, right, key=PROMOTION_ORDER.index)
+
+
+def get_path_dictionary(config_file, source, workers=1, inventory=None):
     """
     Determines a single reference directory for every table kind and 
     returns a dictionary with key: 'Capitalized_table_kind', value = 'full/path/to/reference_table.csv'
 
     :param config_file: parsed configuration data (output from cytominer_database.utils.read_config(config_path))
     :param source: path to directory containing all parent folders of .csv files
+    :param workers: number of worker processes that validate the sampled reference tables
+    :param inventory: cytominer_database.inventory.Inventory of the site directories. If given, the
+     directories are not listed again (only .csv files are then considered).
     """
     reference = config_file["schema"]["reference_option"]
 
@@ -94,7 +662,10 @@ def get_path_dictionary(config_file, source):
             #'reference' is a path to the folder containing all reference tables (no sampling)
             # get_dict_of_paths() returns values as single string in a dict
             directory = [os.path.join(source, reference)]  #  note: input is a list
-            path_dictionary = directory_list_to_path_dictionary(directory)
+            if inventory is not None:
+                path_dictionary = inventory.table_paths(directory)
+            else:
+                path_dictionary = directory_list_to_path_dictionary(directory)
         else:
             warnings.warn(
                 "{} is not a valid path for a reference file directory. The reference tables are sampled instead. Fix this by adjunsting config_file['schema']['reference_option']".format(
@@ -109,12 +680,23 @@ def get_path_dictionary(config_file, source):
 
         # Get sample size (as fraction of all available files) from config file
         ref_fraction = float(config_file["schema"]["ref_fraction"])
-        # Get directories list
-        directories = sorted(list(cytominer_database.utils.find_directories(source)))
         # get all full paths stored as lists in a dictionary
-        full_paths = directory_list_to_path_dictionary(directories)
+        if inventory is not None:
+            full_paths = inventory.table_paths()
+        else:
+            directories = sorted(
+                list(cytominer_database.utils.find_directories(source))
+            )
+            full_paths = directory_list_to_path_dictionary(directories)
         # sample from all paths, determine reference paths, store in dictionary
-        path_dictionary = sample_reference_paths(ref_fraction, full_paths)
+        # an empty seed samples differently on every run
+        random_seed = config_file["schema"]["random_seed"]
+        path_dictionary = sample_reference_paths(
+            ref_fraction,
+            full_paths,
+            int(random_seed) if random_seed else None,
+            workers,
+        )
     return path_dictionary
 
 
@@ -158,58 +740,79 @@ def directory_list_to_path_dictionary(directories):
     return table_paths
 
 
-def sample_reference_paths(ref_fraction, full_paths):
+def sample_reference_paths(ref_fraction, full_paths, random_seed=None, workers=1):
     """
     Samples a subset of all existing full paths and determines the reference table among them.
     Returns a dictionary with key: name (table kind), value = full path to reference table.
+    The widths of the sampled tables are compared on their header line only. Only the widest
+    table is validated (if it is invalid, the next widest is, and so on); all other files are
+    validated when they are ingested.
     :param ref_fraction: fraction of all paths to be compared (relative sample set size).
-    :param source:
-    
-    :full_paths: dictionary containing a list of all full table paths for each table kind
-    Example: {Image: [path/plate_a/set_1/image.csv, path/plate_a/set_2/image.csv,... ], Cells: [path/plate_a/set_1/Cells.csv, ...], ...}
+    :param full_paths: dictionary containing a list of all full table paths for each table kind
+     Example: {Image: [path/plate_a/set_1/image.csv, path/plate_a/set_2/image.csv,... ], Cells: [path/plate_a/set_1/Cells.csv, ...], ...}
+    :param random_seed: seed of the random sample (None: a different sample on every call).
+    :param workers: number of worker processes that validate the reference tables of the table kinds.
     """
     # Note: returns full paths (not parent directories)
     # -------------------------------------------------
     #  - samples only among directories in which that table kind exists.
     #  - sample by taking the first n elements after permuting the list elements at random
     # -------------------------------------------------
+    random_state = np.random.RandomState(random_seed)
+    candidates = {}
+    for filename, filepath in sorted(full_paths.items()):  # iterate over table types
+        # Permute the table list at random (sorted first, so that a seed gives the same sample)
+        filepath = sorted(filepath)
+        filepath = [filepath[i] for i in random_state.permutation(len(filepath))]
+        # get first n items corresponding to fraction of files to be tested (among the number of all tables present for that table kind)
+        sample_size = int(np.ceil(ref_fraction * len(filepath)))
+        # widest table first, the first sampled one among tables of equal width.
+        # The other paths substitute invalid sampled files.
+        sample = sorted(
+            filepath[:sample_size], key=lambda path: -get_header_width(path)
+        )
+        candidates[filename] = sample + filepath[sample_size:]
+
+    if workers > 1:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            references = list(executor.map(first_valid_path, candidates.values()))
+    else:
+        references = [first_valid_path(paths) for paths in candidates.values()]
 
-    # 0. initialize return dictionary
     sampled_path_dictionary = {}
-    # 1. iterate over table types
-    for filename, filepath in full_paths.items():  # iterate over table types
-        # 2. Permute the table list at random
-        np.random.shuffle(filepath)
-        # 3. get first n items corresponding to fraction of files to be tested (among the number of all tables present for that table kind)
-        # --------------------------- constants ----------------------------------
-        sample_size = int(np.ceil(ref_fraction * len(filepath)))
-        # --------------------------- variables ----------------------------------
-        max_width = 0
-        # ------------------------------------------------------------------------
-        for path in filepath[
-            :sample_size
-        ]:  # iterate over random selection of tables of that type
-            # read first row of dataframe
-            # check if path leads to a valid, non-empty file
-            # if cytominer_database.utils.validate_csv(path) == "No errors.": ---> does not work
-            if cytominer_database.utils.validate_csv(path):
-                df_row = pd.read_csv(path, nrows=1)
-                # check if it beats current best (widest table)
-                if df_row.shape[1] > max_width:  # note: .shape returns [length, width]
-                    # update
-                    max_width = df_row.shape[1]
-                    sampled_path_dictionary[filename] = [
-                        path
-                    ]  # Note: Need list as dictionary value (to unify next steps)
-            elif sample_size < len(
-                filepath
-            ):  #  invalid file, but not all files were sampled yet
-                sample_size += 1  # get a substitute sample file
-            else:
-                warnings.warn(
-                    " Not enough valid .csv files to compare the fraction={} of all .csv files (reference file sampling).".format(
-                        ref_fraction
-                    ),
-                    UserWarning,
-                )
+    for filename, path in zip(candidates, references):
+        if path is None:
+            warnings.warn(
+                " Not enough valid .csv files to compare the fraction={} of all .csv files (reference file sampling).".format(
+                    ref_fraction
+                ),
+                UserWarning,
+            )
+        else:
+            # Note: Need list as dictionary value (to unify next steps)
+            sampled_path_dictionary[filename] = [path]
     return sampled_path_dictionary
+
+
+def get_header_width(path):
+    """
+    Returns the number of columns in the header line of a .csv file, without reading the rest
+    of the file. Returns 0 if the file cannot be read or is empty.
+    :param path: .csv file
+    """
+    try:
+        with open(path, "r", newline="") as fd:
+            return len(next(csv.reader(fd), []))
+    except (OSError, UnicodeDecodeError, csv.Error):
+        return 0
+
+
+def first_valid_path(paths):
+    """
+    Returns the first valid .csv file of a list, or None if no file is valid.
+    :param paths: list of .csv files
+    """
+    for path in paths:
+        if cytominer_database.utils.validate_csv(path):
+            return path
+    return None
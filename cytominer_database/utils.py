@@ -1,20 +1,29 @@
+import codecs
 import csv
 import glob
+import io
+import json
 import logging
+import mmap
 import os
 import pkg_resources
 import tempfile
 import warnings
+import zlib
 
 import configparser
-import csvkit.utilities.csvclean
+import numpy as np
+import pandas as pd
+import pyarrow
+import pyarrow.compute
 
-# csvkit (or a dependency of csvkit) mucks with warning levels.
-# reset warnings to default after importing csvkit.
-warnings.resetwarnings()
+import cytominer_database.instrumentation
 
 logger = logging.getLogger(__name__)
 
+# Strict int-type columns: these key columns are never converted from int to float.
+KEEP_INT = ["ImageNumber", "ObjectNumber", "TableNumber"]
+
 
 def find_directories(directory):
     """
@@ -40,39 +49,377 @@ def validate_csv(csvfile):
     The CSV file typically corresponds to either a measurement made on a compartment, e.g. Cells.csv, or on an image,
     e.g. Image.csv. The validation performed is generic - it simply checks for malformed CSV files.
 
-    This uses csvclean to check for validity of a CSV file.
-
     :param csvfile: CSV file to validate
 
     :return: True if valid, False otherwise.
 
     """
-    if os.stat(csvfile).st_size == 0:
+    return validate_csv_file(csvfile)
+
+
+def validate_csv_buffer(buffer):
+    """
+    Validate the content of a CSV file.
+
+    A CSV file is valid if it has a header and at least one row, and if every row has
+    as many fields as the header (no ragged or blank rows).
+
+    :param buffer: content of the CSV file (bytes)
+
+    :return: True if valid, False otherwise.
+
+    """
+    if len(buffer) == 0:
         return False
 
-    with open(csvfile, "r") as csvfd:
-        reader = csv.reader(csvfd)
+    if b'"' not in buffer and buffer.count(b"\r") == buffer.count(b"\r\n"):
+        # no quoted fields: every row is a line, whose fields are counted in place
+        return is_utf8(buffer) and validate_csv_lines(buffer)
 
-        nrows = sum(1 for _ in reader) - 1  # exclude header
+    # the buffer is decoded block by block as it is read: it is neither copied nor decoded as a whole
+    stream = io.TextIOWrapper(io.BytesIO(buffer), encoding="utf-8", newline="")
 
-    if nrows < 1:
+    try:
+        return validate_csv_rows(csv.reader(stream))
+    except UnicodeDecodeError:
         return False
 
-    with tempfile.TemporaryFile(mode="w+") as tmpfile:
-        csvclean = csvkit.utilities.csvclean.CSVClean(
-            args=["-n", csvfile], output_file=tmpfile
-        )
 
-        csvclean.run()
+def is_utf8(buffer, block_size=1 << 20):
+    """
+    Check that the content of a CSV file is valid UTF-8, without decoding it as a whole.
+
+    :param buffer: content of the CSV file (bytes)
+
+    :return: True if valid, False otherwise.
+
+    """
+    if buffer.isascii():
+        return True
+
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    view = memoryview(buffer)
+
+    try:
+        for start in range(0, len(buffer), block_size):
+            decoder.decode(view[start : start + block_size])
+
+        decoder.decode(b"", final=True)
+    except UnicodeDecodeError:
+        return False
+
+    return True
+
+
+def validate_csv_lines(buffer):
+    """
+    Validate the content of a CSV file without quoted fields (see ``validate_csv_buffer``).
+
+    Every row is a line (ending with "\\n" or "\\r\\n"), and its fields are counted by counting
+    the delimiters between two line breaks, in place: the content is neither copied nor split.
+
+    :param buffer: content of the CSV file (bytes)
+
+    :return: True if valid, False otherwise.
+
+    """
+    size = len(buffer)
+    end = buffer.find(b"\n")
+
+    # no header, or no row
+    if end < 0 or buffer[:1] in [b"\n", b"\r"]:
+        return False
+
+    delimiters = buffer.count(b",", 0, end)
+    nrows = 0
+    start = end + 1
+
+    while start < size:
+        end = buffer.find(b"\n", start)
+
+        if end < 0:
+            end = size
+
+        # blank rows are invalid
+        if buffer[start : start + 1] in [b"\n", b"\r"]:
+            return False
+
+        if buffer.count(b",", start, end) != delimiters:
+            return False
+
+        nrows += 1
+        start = end + 1
+
+    return nrows >= 1
+
+
+def validate_csv_file(csvfile):
+    """
+    Validate a CSV file without reading it into memory.
+
+    Same as ``validate_csv_buffer``, but the file is read row by row, so that the memory used does not
+    depend on the size of the file.
+
+    :param csvfile: CSV file
+
+    :return: True if valid, False otherwise.
+
+    """
+    try:
+        with open(csvfile, "r", encoding="utf-8", newline="") as stream:
+            return validate_csv_rows(csv.reader(stream))
+    except UnicodeDecodeError:
+        return False
+
+
+def validate_csv_rows(reader):
+    """
+    Validate the rows of a CSV file (see ``validate_csv_buffer``).
+
+    :param reader: ``csv.reader`` over the content of the CSV file
+
+    :return: True if valid, False otherwise.
+
+    """
+    try:
+        ncols = len(next(reader))
+    except StopIteration:
+        return False
+
+    nrows = 0
+
+    for row in reader:
+        if len(row) != ncols:
+            return False
+
+        nrows += 1
+
+    return nrows >= 1
+
+
+def scan_csv(csvfile, compute_checksum=True, cache=None):
+    """
+    Read a CSV file once, validate it and compute its checksum.
+
+    The content is returned so that it can be parsed without reading the file again.
+
+    :param csvfile: CSV file
+    :param compute_checksum: False if the checksum is not needed.
+    :param cache: ``ChecksumCache``. If the file is unchanged since its checksum was cached,
+     the cached checksum is returned; otherwise the checksum is added to the cache.
+
+    :return: a tuple (valid, checksum, buffer), where ``valid`` is the result of ``validate_csv_buffer``,
+     ``checksum`` is the 32-bit CRC of the file (None if not computed) and ``buffer`` is its content (bytes).
+
+    """
+    name = get_name(csvfile)
+
+    with cytominer_database.instrumentation.stage("read", name, csvfile) as timer:
+        with open(csvfile, "rb") as stream:
+            stat = os.fstat(stream.fileno())
+            buffer = stream.read()
+
+        timer.count(bytes=len(buffer))
+
+    crc = None
+
+    if compute_checksum:
+        if cache is not None:
+            crc = cache.get(csvfile, stat)
+
+        if crc is None:
+            with cytominer_database.instrumentation.stage(
+                "checksum", name, csvfile, bytes=len(buffer)
+            ):
+                crc = zlib.crc32(buffer) & 0xFFFFFFFF
+
+            if cache is not None:
+                cache.put(csvfile, crc, stat)
+
+    with cytominer_database.instrumentation.stage(
+        "validate", name, csvfile, bytes=len(buffer)
+    ):
+        valid = validate_csv_buffer(buffer)
+
+    return valid, crc, buffer
+
+
+def checksum(pathname, cache=None):
+    """
+    Generate a 32-bit unique identifier for a file: the CRC32 of its content.
+
+    The file is memory-mapped, so that it is hashed in a single pass without copying it.
+
+    :param pathname: input file
+    :param cache: ``ChecksumCache``. If the file is unchanged since its checksum was cached,
+     the file is not read at all.
+
+    :return: the checksum (int)
+    """
+    with open(pathname, "rb") as stream:
+        stat = os.fstat(stream.fileno())
+
+        if cache is not None:
+            crc = cache.get(pathname, stat)
+
+            if crc is not None:
+                return crc
+
+        if stat.st_size == 0:
+            crc = zlib.crc32(bytes(0))
+        else:
+            with mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                crc = zlib.crc32(buffer)
+
+    crc &= 0xFFFFFFFF
+
+    if cache is not None:
+        cache.put(pathname, crc, stat)
+
+    return crc
+
+
+class ChecksumCache(object):
+    """
+    Persistent cache of file checksums.
+
+    Entries are keyed on the absolute path, size, modification time (ns) and inode of a file,
+    so that a file whose checksum has been computed once is never hashed again unless it changes.
+    The cache is a JSON file that is read when the cache is created and updated by ``save``.
+
+    :param path: path of the cache file. If None, the cache is kept in memory only.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.entries = self._read() if path else {}
+        self.updated = {}
+
+    def _read(self):
+        try:
+            with open(self.path, "r") as fd:
+                entries = json.load(fd)
+        except (IOError, ValueError):
+            return {}
+
+        return entries if isinstance(entries, dict) else {}
+
+    @staticmethod
+    def _key(stat):
+        return [stat.st_size, stat.st_mtime_ns, stat.st_ino]
+
+    def get(self, pathname, stat=None):
+        """
+        Look up the checksum of a file.
+
+        :param pathname: file
+        :param stat: ``os.stat_result`` of the file, if already known.
+
+        :return: the cached checksum, or None if the file is not cached or has changed.
+        """
+        try:
+            stat = stat or os.stat(pathname)
+        except OSError:
+            return None
+
+        entry = self.entries.get(os.path.abspath(pathname))
+
+        if isinstance(entry, list) and entry[:3] == self._key(stat):
+            return entry[3]
+
+        return None
+
+    def put(self, pathname, crc, stat=None):
+        """
+        Add the checksum of a file to the cache.
+
+        :param pathname: file
+        :param crc: checksum of the file
+        :param stat: ``os.stat_result`` of the file when it was read. Pass it whenever possible:
+         a file that changes between the read and a later ``os.stat`` would be cached with a wrong checksum.
+        """
+        try:
+            stat = stat or os.stat(pathname)
+        except OSError:
+            return
+
+        entry = self._key(stat) + [int(crc)]
+        pathname = os.path.abspath(pathname)
+
+        self.entries[pathname] = entry
+        self.updated[pathname] = entry
+
+    def save(self):
+        """
+        Write the new entries to the cache file. The file is re-read first, so that entries
+        saved concurrently by other processes are kept. Errors are reported as warnings:
+        a cache that cannot be written only costs time.
+        """
+        if not self.path or not self.updated:
+            return
+
+        entries = self._read()
+        entries.update(self.updated)
+
+        try:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+
+            fd, temporary = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            with os.fdopen(fd, "w") as stream:
+                json.dump(entries, stream)
+            os.replace(temporary, self.path)
+        except (IOError, OSError) as e:
+            warnings.warn(
+                "Unable to write the checksum cache {}: {}".format(self.path, e),
+                UserWarning,
+            )
+            return
+
+        self.entries = entries
+        self.updated = {}
+
+
+def open_checksum_cache(config):
+    """
+    Open the checksum cache configured in ``[ingestion_engine] checksum_cache``.
+
+    :param config: parsed configuration (output of ``read_config``).
 
-        tmpfile.seek(0)
+    :return: a ``ChecksumCache``. If no cache file is configured (the default), the cache is kept in memory only.
+    """
+    path = config["ingestion_engine"]["checksum_cache"].strip()
+
+    return ChecksumCache(os.path.expanduser(path) if path else None)
+
+
+def is_streamed(config, filename, inventory=None):
+    """
+    Check whether a CSV file is too large to be read into memory at once, i.e. larger than
+    ``[ingestion_engine] max_memory`` bytes. Such files are read in chunks of
+    ``[ingestion_engine] chunk_rows`` rows. A ``max_memory`` of 0 disables chunked reading.
+
+    :param config: parsed configuration (output of ``read_config``).
+    :param filename: CSV file
+    :param inventory: ``cytominer_database.inventory.Inventory`` holding the size of the file.
+
+    :return: True if the file is read in chunks, False otherwise.
+
+    """
+    max_memory = int(config["ingestion_engine"]["max_memory"])
+
+    if max_memory <= 0:
+        return False
 
-        csvcheck = tmpfile.read().strip()
+    if inventory is not None:
+        size = inventory.getsize(filename)
+    else:
+        size = os.path.getsize(filename)
 
-    return csvcheck == "No errors."
+    return size > max_memory
 
 
-def validate_csv_set(config, directory):
+def validate_csv_set(config, directory, inventory=None):
     """
     Validate a set of CSV files.
 
@@ -82,15 +429,47 @@ def validate_csv_set(config, directory):
 
     :param config: configuration file - this contains the set of CSV files to validate.
     :param directory: directory containing the CSV files.
+    :param inventory: ``cytominer_database.inventory.Inventory`` of the directory. If None, the directory is listed.
 
     :return: a tuple where the first element is the list of compartment CSV files, the second is the image CSV file.
 
+    """
+    compartment_csvs, image_csv, _ = read_csv_set(
+        config, directory, inventory=inventory
+    )
+
+    return compartment_csvs, image_csv
+
+
+def read_csv_set(config, directory, cache=None, inventory=None):
+    """
+    Read and validate a set of CSV files.
+
+    Same as ``validate_csv_set``, but every file is read only once: its content is kept, together with
+    the checksum of the image CSV, so that the files need not be read again to compute the TableNumber
+    or to parse them. Files larger than ``[ingestion_engine] max_memory`` bytes (see ``is_streamed``)
+    are validated row by row instead, and their content is not kept.
+
+    :param config: configuration file - this contains the set of CSV files to validate.
+    :param directory: directory containing the CSV files.
+    :param cache: ``ChecksumCache`` used for the checksum of the image CSV.
+    :param inventory: ``cytominer_database.inventory.Inventory`` of the directory. If None, the directory is listed.
+
+    :return: a tuple where the first element is the list of compartment CSV files, the second is the image CSV file,
+     and the third is a dictionary mapping each CSV file to a (checksum, buffer) tuple. Only the image CSV
+     has a checksum; it is None for the compartment CSVs. The buffer is None for files that are read in chunks.
+
     """
 
     # get the image CSV
     image_csv = os.path.join(directory, config["filenames"]["image"])
 
-    if not os.path.isfile(image_csv):
+    if inventory is not None:
+        exists = inventory.isfile(image_csv)
+    else:
+        exists = os.path.isfile(image_csv)
+
+    if not exists:
         raise IOError(
             "{} not found in {}. Skipping.".format(
                 config["filenames"]["image"], directory
@@ -98,12 +477,37 @@ def validate_csv_set(config, directory):
         )
 
     # get the CSV file for each compartment
-    compartment_csvs = collect_csvs(config, directory)
+    compartment_csvs = collect_csvs(config, directory, inventory)
 
     filenames = compartment_csvs + [image_csv]
 
-    # validate all the CSVs
-    file_checks = dict({(filename, validate_csv(filename)) for filename in filenames})
+    # read and validate all the CSVs
+    file_checks = {}
+    scans = {}
+
+    for filename in filenames:
+        if is_streamed(config, filename, inventory):
+            with cytominer_database.instrumentation.stage(
+                "validate", get_name(filename), filename
+            ):
+                valid = validate_csv_file(filename)
+
+            crc = None
+
+            if filename == image_csv:
+                with cytominer_database.instrumentation.stage(
+                    "checksum", get_name(filename), filename
+                ):
+                    crc = checksum(filename, cache)
+
+            buffer = None
+        elif filename == image_csv:
+            valid, crc, buffer = scan_csv(filename, cache=cache)
+        else:
+            valid, crc, buffer = scan_csv(filename, compute_checksum=False)
+
+        file_checks[filename] = valid
+        scans[filename] = (crc, buffer)
 
     # if any CSV is invalid, throw an error
     if not all(file_checks.values()):
@@ -118,10 +522,10 @@ def validate_csv_set(config, directory):
             "Some files were invalid: {}. Skipping {}.".format(invalid_files, directory)
         )
 
-    return compartment_csvs, image_csv
+    return compartment_csvs, image_csv, scans
 
 
-def collect_csvs(config, directory):
+def collect_csvs(config, directory, inventory=None):
     """
     Collect CSV files from a directory.
 
@@ -131,6 +535,7 @@ def collect_csvs(config, directory):
 
     :param config: configuration file.
     :param directory: directory containing the CSV files.
+    :param inventory: ``cytominer_database.inventory.Inventory`` of the directory. If None, the directory is listed.
 
     :return: a list of CSV files.
 
@@ -143,7 +548,10 @@ def collect_csvs(config, directory):
                 os.path.join(directory, config["filenames"][filename_option])
             )
 
-    filenames = glob.glob(os.path.join(directory, "*.csv"))
+    if inventory is not None:
+        filenames = inventory.csvs(directory)
+    else:
+        filenames = glob.glob(os.path.join(directory, "*.csv"))
 
     return [filename for filename in filenames if filename not in config_filenames]
 
@@ -179,81 +587,325 @@ def read_config(filename):
 def type_convert_dataframe(dataframe, config_file):
     """
     Type casting of entire pandas dataframe.
-    Calls conversion function based on specifications in configuration file.
+    Calls conversion function based on specifications in configuration file,
+    then narrows the column types if [schema] precision = single (see narrow_dataframe()).
+    Returns the converted dataframe, a new dataframe whose converted columns are assembled in a
+    single batch (see cast_columns()); the dataframe passed in is not modified, so callers must use
+    the return value.
     :param dataframe: input file
     :param config_file: parsed configuration data (output from cytominer_database.utils.read_config(config_path))
     """
     engine = config_file["ingestion_engine"]["engine"]
-    if engine == "Parquet":  # convert. (Else: do nothing.)
+    # with an inferred schema, the schema sets the type of every column.
+    # SQLite: no conversion.
+    if config_file["schema"]["reference_option"] != "infer" and engine == "Parquet":
         type_conversion = config_file["schema"]["type_conversion"]
         if type_conversion == "int2float":
-            convert_cols_int2float(dataframe)
+            dataframe = convert_cols_int2float(dataframe)
         elif type_conversion == "all2string":
-            convert_cols_2string(dataframe)
+            dataframe = convert_cols_2string(dataframe)
         else:
             raise ValueError(
                 "Incorrect 'type_conversion' specification in your configuration file. Please set the value to 'int2float' or 'all2string', as documented in the README. "
             )
+    return narrow_dataframe(dataframe, config_file)
+
+
+def is_single_precision(config_file):
+    """
+    Returns True if the columns are narrowed to 32 bits ([schema] precision = single),
+    False if they are kept at 64 bits ([schema] precision = double). Only Parquet files
+    are narrowed: SQLite stores every float as an 8-byte REAL, so narrowing would lose
+    precision without saving space (see check_precision()).
+    :param config_file: parsed configuration data (output from cytominer_database.utils.read_config(config_path))
+    """
+    precision = config_file["schema"]["precision"]
+    if precision not in ["double", "single"]:
+        raise ValueError(
+            "Incorrect 'precision' specification in your configuration file. Please set the value to 'double' or 'single', as documented in the README. "
+        )
+    return (
+        precision == "single"
+        and config_file["ingestion_engine"].get("engine") == "Parquet"
+    )
+
+
+def check_precision(config_file):
+    """
+    Warns if [schema] precision = single is set for a database target, where it is ignored
+    (see is_single_precision()).
+    :param config_file: parsed configuration data (output from cytominer_database.utils.read_config(config_path))
+    """
+    if config_file["schema"]["precision"] == "single" and not is_single_precision(
+        config_file
+    ):
+        warnings.warn(
+            "[schema] precision = single only applies to Parquet files. The database columns are kept at 64 bits.",
+            UserWarning,
+        )
+
+
+def narrow_type(name, column_type):
+    """
+    Returns the 32-bit type a column is stored as with [schema] precision = single:
+    float32 for floating point columns, uint32 for the TableNumber (a CRC32, see checksum())
+    and int32 for other integer columns. Other types are unchanged.
+    :param name: column name
+    :param column_type: pyarrow type of the column
+    """
+    if pyarrow.types.is_floating(column_type):
+        return pyarrow.float32()
+    if pyarrow.types.is_integer(column_type):
+        return pyarrow.uint32() if name == "TableNumber" else pyarrow.int32()
+    return column_type
+
+
+def narrow_schema(schema, config_file):
+    """
+    Returns the schema with the column types narrowed as configured in [schema] precision
+    (see narrow_type()).
+    :param schema: pyarrow schema
+    :param config_file: parsed configuration data (output from cytominer_database.utils.read_config(config_path))
+    """
+    if not is_single_precision(config_file):
+        return schema
+    return pyarrow.schema(
+        [field.with_type(narrow_type(field.name, field.type)) for field in schema],
+        metadata=schema.metadata,
+    )
+
+
+def check_range(dataframe, names, dtype):
+    """
+    Raises ValueError if a column holds values out of the range of a narrower type,
+    e.g. an integer larger than 2**31 - 1 for int32, or a finite float larger than
+    the largest float32. Missing values are ignored.
+    :param dataframe: Pandas dataframe
+    :param names: names of the columns to check
+    :param dtype: numpy type the columns are narrowed to
+    """
+    if not names:
+        return
+    values = dataframe[names].to_numpy(dtype=np.float64)
+    if np.issubdtype(dtype, np.integer):
+        info = np.iinfo(dtype)
+        out_of_range = (values < info.min) | (values > info.max)
+    else:
+        out_of_range = np.isfinite(values) & (np.abs(values) > np.finfo(dtype).max)
+    columns = out_of_range.any(axis=0)
+    if columns.any():
+        raise ValueError(
+            "Column {} holds values out of the range of {}. Set [schema] precision = double.".format(
+                ", ".join(name for name, bad in zip(names, columns) if bad),
+                np.dtype(dtype).name,
+            )
+        )
+
+
+def narrow_table(table, config_file):
+    """
+    Same as narrow_dataframe(), for a pyarrow table.
+    :param table: pyarrow table
+    :param config_file: parsed configuration data (output from cytominer_database.utils.read_config(config_path))
+    """
+    schema = narrow_schema(table.schema, config_file)
+    if schema.equals(table.schema):
+        return table
+    columns = []
+    for field, column in zip(schema, table.columns):
+        try:
+            columns += [cast_column(field.name, column, field.type)]
+        except ValueError as error:
+            raise ValueError("{}. Set [schema] precision = double.".format(error))
+    return pyarrow.Table.from_arrays(columns, schema=schema)
+
+
+def cast_column(name, column, column_type):
+    """
+    Casts a pyarrow column to a type. Raises ValueError if a value does not fit the type:
+    an integer out of range, or a finite float that becomes infinite when cast to float32
+    (which pyarrow does silently).
+    :param name: column name
+    :param column: pyarrow array or chunked array
+    :param column_type: pyarrow type
+    """
+    if column.type == column_type:
+        return column
+    try:
+        cast = column.cast(column_type)
+    except pyarrow.ArrowInvalid as error:
+        raise ValueError(
+            "Column {} cannot be cast to the type {}: {}".format(
+                name, column_type, error
+            )
+        )
+    if (
+        pyarrow.types.is_floating(column.type)
+        and pyarrow.types.is_floating(column_type)
+        and column_type.bit_width < column.type.bit_width
+    ):
+        if count_infinite(cast) > count_infinite(column):
+            raise ValueError(
+                "Column {} holds values out of the range of {}".format(
+                    name, column_type
+                )
+            )
+    return cast
+
+
+def count_infinite(column):
+    """
+    Number of infinite values of a floating point pyarrow column.
+    :param column: pyarrow array or chunked array
+    """
+    infinite = pyarrow.compute.is_inf(column).cast(pyarrow.int64())
+    # the sum of an empty column is null
+    return pyarrow.compute.sum(infinite).as_py() or 0
+
+
+def narrow_dataframe(dataframe, config_file):
+    """
+    Narrows the column types of a Pandas dataframe to 32 bits if [schema] precision = single
+    (see narrow_type()), and returns the converted dataframe. Raises ValueError if a value does
+    not fit its narrowed type (see check_range()).
+    :param dataframe: Pandas dataframe
+    :param config_file: parsed configuration data (output from cytominer_database.utils.read_config(config_path))
+    """
+    if not is_single_precision(config_file):
+        return dataframe
+    floats, ints, table_numbers = [], [], []
+    for name, dtype in dataframe.dtypes.items():
+        if dtype == np.float64:
+            floats += [name]
+        elif pd.api.types.is_integer_dtype(dtype) and dtype.itemsize > 4:
+            if name == "TableNumber":
+                table_numbers += [name]
+            else:
+                ints += [name]
+    for names, dtype in [
+        (floats, np.float32),
+        (ints, np.int32),
+        (table_numbers, np.uint32),
+    ]:
+        check_range(dataframe, names, dtype)
+        dataframe = cast_columns(dataframe, names, dtype)
+    return dataframe
+
+
+def type_convert_table(table, config_file):
+    """
+    Type casting of entire pyarrow table. Same as type_convert_dataframe(), but the
+    columns are cast on the Arrow schema, without passing through pandas.
+    :param table: pyarrow table
+    :param config_file: parsed configuration data (output from cytominer_database.utils.read_config(config_path))
+    """
+    engine = config_file["ingestion_engine"]["engine"]
+    if engine == "Parquet" and config_file["schema"]["reference_option"] != "infer":
+        type_conversion = config_file["schema"]["type_conversion"]
+        if type_conversion == "int2float":
+            fields = []
+            for field in table.schema:
+                if pyarrow.types.is_integer(field.type) and field.name not in KEEP_INT:
+                    field = field.with_type(pyarrow.float64())
+                fields += [field]
+            table = table.cast(pyarrow.schema(fields))
+        elif type_conversion == "all2string":
+            # keep the string representation of pandas
+            dataframe = convert_cols_2string(table.to_pandas())
+            table = pyarrow.Table.from_pandas(dataframe, preserve_index=False)
+        else:
+            raise ValueError(
+                "Incorrect 'type_conversion' specification in your configuration file. Please set the value to 'int2float' or 'all2string', as documented in the README. "
+            )
+    return narrow_table(table, config_file)
+
+
+def integer_columns(dataframe):
+    """
+    Names of the integer columns of a Pandas dataframe, except the key columns (see ``KEEP_INT``).
+    :param dataframe: Pandas dataframe
+    """
+    return [
+        name
+        for name, dtype in dataframe.dtypes.items()
+        if pd.api.types.is_integer_dtype(dtype) and name not in KEEP_INT
+    ]
+
+
+def cast_columns(dataframe, names, dtype):
+    """
+    Casts some columns of a Pandas dataframe to a single type, and returns the converted dataframe.
+    The columns are converted as one 2D array and a new dataframe is assembled once, so that the
+    converted columns are held in a single block. Assigning them back one by one (in place) would
+    leave one block per column, and pandas warns that such a dataframe is highly fragmented.
+    :param dataframe: Pandas dataframe
+    :param names: names of the columns to convert
+    :param dtype: numpy type of the converted columns
+    """
+    if not names:
+        return dataframe
+
+    if not dataframe.columns.is_unique:
+        return dataframe.astype({name: dtype for name in names})
+
+    converted = pd.DataFrame(
+        dataframe[names].to_numpy(dtype=dtype), columns=names, index=dataframe.index
+    )
+
+    return pd.concat(
+        [dataframe.drop(columns=names), converted], axis=1, copy=False
+    ).reindex(columns=dataframe.columns, copy=False)
 
 
 def convert_cols_int2float(pandas_df):
     """
-    Converts all columns with type 'int' to 'float'.
+    Converts all columns with type 'int' to 'float', except the key columns (see ``KEEP_INT``).
+    Returns the converted dataframe (see cast_columns()); the dataframe passed in is not modified.
     :param pandas_df: Pandas dataframe
     """
-    # Strict int-type columns: Do not convert these columns from int to float.
-    KEEP_INT = ["ImageNumber", "ObjectNumber", "TableNumber"]
-    conversion_flag = True
-
-    for i in range(len(pandas_df.columns)):
-        if pandas_df.dtypes[i] == "int":
-            name = pandas_df.columns[i]  # column headers
-            if name in KEEP_INT:
-                continue
-            elif conversion_flag:
-                conversion_flag = False
-            try:
-                pandas_df[name] = pandas_df[name].astype("float")
-            except ValueError:
-                print(
-                    "Column '{}' (type: {}) could not be converted to 'float'. ".format(
-                        name, pandas_df.dtypes[i]
-                    )
-                )
-                continue
-    if conversion_flag:
+    names = integer_columns(pandas_df)
+
+    if not names:
         warnings.warn(
             UserWarning("No values were type-converted (no int-valued columns found).")
         )
 
+    return cast_columns(pandas_df, names, np.float64)
+
+
+def convert_chunk_types(dataframe, integers):
+    """
+    Converts the integer columns of a chunk of a large CSV file to float, except the columns that
+    hold integers in every chunk of the file (see cytominer_database.load.scan_integer_columns()).
+    Column types are inferred per chunk, and a column that only holds integers in the first chunk
+    may hold floats in the next ones; a SQLite table created from the first chunk would then declare
+    it INTEGER. Returns the converted dataframe.
+    :param dataframe: Pandas dataframe
+    :param integers: labels of the columns that hold integers in every chunk
+    """
+    names = [
+        name
+        for name, dtype in dataframe.dtypes.items()
+        if pd.api.types.is_integer_dtype(dtype) and name not in integers
+    ]
+    return cast_columns(dataframe, names, np.float64)
+
 
 def convert_cols_2string(dataframe):
     """
-    Iterates over the columns of a Pandas dataframe
-    and converts all values to type 'string'
+    Converts all values of a Pandas dataframe to type 'string', and returns the converted dataframe.
+    The dataframe passed in is not modified.
 
     :param dataframe: Pandas dataframe
     """
-    # iterates over the columns of the input Pandas dataframe
-    # and converts all values to type string
-    conversion_flag = True
-    for i, col_name in enumerate(dataframe.columns):
-        try:
-            dataframe[col_name] = dataframe[col_name].astype("str")
-            if conversion_flag:
-                conversion_flag = False
-        except ValueError:
-            print(
-                "Column '{}' (type: {}) could not be converted to 'string'. ".format(
-                    col_name, dataframe[col_name].dtypes[i]
-                )
-            )
-            continue
-    if conversion_flag:
+    if dataframe.shape[1] == 0:
         warnings.warn(
             UserWarning("No values were type-converted (no int-valued columns found).")
         )
 
+    # a single conversion of the whole dataframe
+    return dataframe.astype("str")
+
 
 def get_name(file_path):
     """
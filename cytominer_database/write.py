@@ -1,11 +1,16 @@
 import csv
 import click
+import functools
+import os
+import urllib.parse
 import warnings
 import zlib
 import pandas as pd
 import tempfile
+import sqlalchemy
 import sqlalchemy.exc
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.pool import NullPool
 import pyarrow
 import pyarrow.parquet as pq
 import pyarrow.csv
@@ -14,48 +19,646 @@ import collections
 import numpy as np
 import cytominer_database
 import cytominer_database.utils
+import cytominer_database.instrumentation
 import cytominer_database.load
 
+# Allowed values of the [sqlite] pragmas in the configuration file
+SQLITE_JOURNAL_MODES = ["DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL", "OFF"]
+SQLITE_SYNCHRONOUS = ["OFF", "NORMAL", "FULL", "EXTRA"]
 
-def write_to_disk(dataframe, table_name, output_path, engine, writers_dict):
+
+def write_to_disk(
+    dataframe,
+    table_name,
+    output_path,
+    engine,
+    writers_dict,
+    con=None,
+    bulk_insert=False,
+):
     """
-    Writes Pandas dataframes to SQLite or Parquet format.
+    Writes Pandas dataframes or pyarrow tables to SQLite or Parquet format.
 
-    :param dataframe: pandas dataframe file in memory
+    :param dataframe: pandas dataframe or pyarrow table in memory
     :param table_name: table name of dataframe/file
     :param output_path: location of SQLite/Parquet file
     :param engine: 'SQLite' or 'Parquet'
     :param writers_dict: dictionary storing references to the opened Parquet writer and schema
+    :param con: open database connection (SQLite), shared by all files of an ingest.
+     If None, a connection is opened (and closed) for this file only.
+    :param bulk_insert: True if the rows should be written with prepared executemany
+     inserts (see insert_rows()) instead of DataFrame.to_sql() (SQLite, requires con).
     """
 
+    rows = len(dataframe)
+
     if engine == "SQLite":
-        with warnings.catch_warnings():
-            warnings.simplefilter("ignore", category=DeprecationWarning)
-            engine = create_engine(output_path)
-            con = engine.connect()
-            dataframe.to_sql(name=table_name, con=con, if_exists="append", index=False)
+        if isinstance(dataframe, pyarrow.Table):
+            with cytominer_database.instrumentation.stage(
+                "to_pandas", table_name, rows=rows
+            ):
+                dataframe = dataframe.to_pandas()
+        if writers_dict and table_name in writers_dict:
+            # inferred schema: the table has all columns of its kind (see create_tables())
+            with cytominer_database.instrumentation.stage(
+                "align", table_name, rows=rows
+            ):
+                dataframe = dataframe.reindex(
+                    columns=writers_dict[table_name]["schema"].names
+                )
+        with cytominer_database.instrumentation.stage("write", table_name, rows=rows):
+            if bulk_insert and con is not None:
+                insert_rows(dataframe, table_name, con)
+                return
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", category=DeprecationWarning)
+                if con is None:
+                    db_engine = create_engine(output_path, poolclass=NullPool)
+                    with db_engine.connect() as con:
+                        dataframe.to_sql(
+                            name=table_name, con=con, if_exists="append", index=False
+                        )
+                    db_engine.dispose()
+                else:
+                    dataframe.to_sql(
+                        name=table_name, con=con, if_exists="append", index=False
+                    )
     elif engine == "Parquet":
-        ref_dataframe = writers_dict[table_name]["pandas_dataframe"]
-        dataframe, _ = dataframe.align(ref_dataframe, join="right", axis=1)
-        # read into pyarrow table format
-        table = pyarrow.Table.from_pandas(dataframe)
+        if isinstance(dataframe, pyarrow.Table):
+            table = dataframe
+        else:
+            # read into pyarrow table format
+            with cytominer_database.instrumentation.stage(
+                "from_pandas", table_name, rows=rows
+            ):
+                table = pyarrow.Table.from_pandas(dataframe, preserve_index=False)
+        with cytominer_database.instrumentation.stage("align", table_name, rows=rows):
+            table = conform_table(table, writers_dict[table_name]["schema"])
         # connect to writer and add current table
         writer = writers_dict[table_name]["writer"]
-        writer.write_table(table)
+        with cytominer_database.instrumentation.stage(
+            "write", table_name, rows=rows, bytes=table.nbytes
+        ):
+            writer.write_table(table)
+
+
+def create_tables(writers_dict, con):
+    """
+    Creates the database tables of inferred schemas that do not exist yet, so that the column
+    types are those of the schema rather than those of the first file written to a table.
+
+    :param writers_dict: dictionary storing the schema of every table kind
+     (see cytominer_database.tableSchema.open_writers())
+    :param con: open database connection (SQLite), not in a transaction
+    """
+    with con.begin():
+        for table_name, entry in writers_dict.items():
+            if not sqlalchemy.inspect(con).has_table(table_name):
+                entry["schema"].empty_table().to_pandas().to_sql(
+                    name=table_name, con=con, if_exists="append", index=False
+                )
+
+
+def insert_rows(dataframe, table_name, con):
+    """
+    Appends a Pandas dataframe to a database table with a single prepared executemany insert,
+    bypassing the per-row overhead of DataFrame.to_sql(). The table is created by
+    DataFrame.to_sql() if it does not exist yet, so the column types are the same.
+    The tables known to exist are cached in the info dictionary of the connection,
+    so that the database is inspected once per table rather than once per file.
+
+    :param dataframe: pandas dataframe
+    :param table_name: name of the database table
+    :param con: open database connection (SQLite)
+    """
+    tables = con.info.setdefault("cytominer_database.tables", set())
+    if table_name not in tables:
+        if not sqlalchemy.inspect(con).has_table(table_name):
+            dataframe.head(0).to_sql(
+                name=table_name, con=con, if_exists="append", index=False
+            )
+        tables.add(table_name)
+    quote = con.dialect.identifier_preparer.quote
+    statement = "INSERT INTO {} ({}) VALUES ({})".format(
+        quote(table_name),
+        ", ".join(quote(column) for column in dataframe.columns),
+        ", ".join("?" for _ in dataframe.columns),
+    )
+    # tolist() converts to native Python values; NaN is stored as NULL by SQLite
+    rows = list(zip(*[dataframe[column].tolist() for column in dataframe.columns]))
+    if rows:
+        con.exec_driver_sql(statement, rows)
+
+
+def is_bulk_load(config):
+    """
+    Returns True if the SQLite bulk-load mode is enabled in the configuration.
+
+    :param config: parsed configuration data (output from cytominer_database.utils.read_config(config_path))
+    """
+    return config.getboolean("sqlite", "bulk_load")
+
+
+def get_sqlite_pragmas(config):
+    """
+    Returns the list of PRAGMA statements of the SQLite bulk-load mode, as specified
+    in the [sqlite] section of the configuration. Empty values are skipped, and the
+    list is empty if the bulk-load mode is disabled. page_size comes first, as it
+    only has an effect before the database is created.
+
+    :param config: parsed configuration data (output from cytominer_database.utils.read_config(config_path))
+    """
+    if not is_bulk_load(config):
+        return []
+    pragmas = []
+    for name, allowed in [
+        ("page_size", None),
+        ("journal_mode", SQLITE_JOURNAL_MODES),
+        ("synchronous", SQLITE_SYNCHRONOUS),
+        ("cache_size", None),
+    ]:
+        value = config["sqlite"][name].strip()
+        if not value:
+            continue
+        if allowed is None:
+            value = int(value)
+        elif value.upper() not in allowed:
+            raise ValueError(
+                "Incorrect '{}' specification in your configuration file. Please set the value to one of {}.".format(
+                    name, ", ".join(allowed)
+                )
+            )
+        pragmas += ["PRAGMA {} = {}".format(name, value)]
+    return pragmas
+
+
+def create_database_engine(output_path, config):
+    """
+    Creates the database engine used for all writes of an ingest. If the SQLite
+    bulk-load mode is enabled, the configured pragmas are set on every new connection.
+
+    :param output_path: connection string for the database
+    :param config: parsed configuration data (output from cytominer_database.utils.read_config(config_path))
+    """
+    db_engine = create_engine(output_path, poolclass=NullPool)
+    pragmas = get_sqlite_pragmas(config)
+    if pragmas and db_engine.dialect.name == "sqlite":
+        event.listen(db_engine, "connect", functools.partial(set_pragmas, pragmas=pragmas))
+    return db_engine
+
+
+def set_pragmas(dbapi_connection, connection_record, pragmas):
+    """
+    Executes PRAGMA statements on a new DBAPI connection ("connect" event listener).
+
+    :param dbapi_connection: sqlite3 connection
+    :param connection_record: connection record of the pool (unused)
+    :param pragmas: list of PRAGMA statements
+    """
+    cursor = dbapi_connection.cursor()
+    for pragma in pragmas:
+        cursor.execute(pragma)
+    cursor.close()
+
+
+class BulkTransaction(object):
+    """
+    Groups the inserts of several site directories into a single transaction
+    (SQLite bulk-load mode). The transaction is committed at the end of a directory once it
+    holds at least ``transaction_rows`` rows; with 0, every directory is a transaction.
+    A transaction that is still open when the connection is closed is rolled back.
+    """
+
+    def __init__(self, con, transaction_rows=0):
+        """
+        :param con: open database connection
+        :param transaction_rows: minimum number of rows per transaction
+        """
+        self.con = con
+        self.transaction_rows = transaction_rows
+        self.rows = 0
+        self.transaction = con.begin()
+
+    def add(self, rows):
+        """
+        Counts rows written in the current transaction.
+
+        :param rows: number of rows
+        """
+        self.rows += rows
+
+    def end_directory(self):
+        """
+        Commits the current transaction if it is large enough, and begins a new one.
+        """
+        if self.rows >= self.transaction_rows:
+            self.transaction.commit()
+            self.transaction = self.con.begin()
+            self.rows = 0
+
+    def close(self):
+        """
+        Commits the current transaction.
+        """
+        self.transaction.commit()
+
+
+class BufferedParquetWriter(object):
+    """
+    Wraps a pyarrow ParquetWriter and coalesces the tables of many small .csv files into
+    large row groups. Tables are buffered until they hold ``row_group_rows`` rows or
+    ``row_group_bytes`` bytes, and are then written as row groups of ``row_group_rows`` rows.
+    Buffered rows are written when the writer is closed.
+    """
+
+    def __init__(self, writer, row_group_rows, row_group_bytes):
+        """
+        :param writer: pyarrow.parquet.ParquetWriter
+        :param row_group_rows: number of rows per row group
+        :param row_group_bytes: maximum size of the buffered tables (bytes)
+        """
+        self.writer = writer
+        self.row_group_rows = row_group_rows
+        self.row_group_bytes = row_group_bytes
+        self.tables = []
+        self.rows = 0
+        self.nbytes = 0
+
+    @property
+    def schema(self):
+        return self.writer.schema
+
+    def write_table(self, table):
+        """
+        Buffers a table. Full row groups are written to the file.
+
+        :param table: pyarrow table with the schema of the writer
+        """
+        self.tables += [table]
+        self.rows += table.num_rows
+        self.nbytes += table.nbytes
+        if self.nbytes >= self.row_group_bytes:
+            self.flush()
+        elif self.rows >= self.row_group_rows:
+            # write all full row groups, keep the remainder
+            self.flush(self.rows - self.rows % self.row_group_rows)
+
+    def flush(self, rows=None):
+        """
+        Writes buffered rows to the file.
+
+        :param rows: number of rows to write (default: all buffered rows)
+        """
+        if not self.tables:
+            return
+        table = pyarrow.concat_tables(self.tables)
+        if rows is None:
+            rows = table.num_rows
+        self.writer.write_table(table.slice(0, rows), row_group_size=self.row_group_rows)
+        remainder = table.slice(rows)
+        self.tables = [remainder] if remainder.num_rows else []
+        self.rows = remainder.num_rows
+        self.nbytes = remainder.nbytes
+
+    def close(self):
+        """
+        Writes the buffered rows and closes the file.
+        """
+        self.flush()
+        self.writer.close()
+
+
+class CheckpointedParquetWriter(object):
+    """
+    Writes the tables of a table kind to numbered part files, e.g. ``Cells/part-00000.parquet``,
+    ``Cells/part-00001.parquet``, ..., which Arrow datasets (and pandas.read_parquet("Cells")) read
+    as a single table. A part file is closed at every checkpoint, so that it holds a complete
+    Parquet footer even if the ingest is killed afterwards (see
+    cytominer_database.manifest.open_checkpoint_manifest()).
+    """
+
+    def __init__(self, directory, schema, open_file):
+        """
+        :param directory: directory of the table kind, e.g. "output/Cells"
+        :param schema: pyarrow schema of the table kind
+        :param open_file: function that opens a BufferedParquetWriter, given a path and a schema
+        """
+        self.directory = directory
+        self.schema = schema
+        self.open_file = open_file
+        self.part = 0
+        self.writer = None
+
+    def write_table(self, table):
+        """
+        Writes a table to the current part file, which is opened by the first table of a checkpoint.
+
+        :param table: pyarrow table with the schema of the writer
+        """
+        if self.writer is None:
+            os.makedirs(self.directory, exist_ok=True)
+            self.writer = self.open_file(
+                os.path.join(self.directory, part_filename(self.part)), self.schema
+            )
+        self.writer.write_table(table)
+
+    def checkpoint(self, part):
+        """
+        Closes the current part file, if any. The next table is written to a new part file.
+
+        :param part: number of the next part file
+        """
+        self.close()
+        self.part = part
+
+    def close(self):
+        """
+        Writes the buffered rows and closes the current part file.
+        """
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+
+def part_filename(part):
+    """
+    Name of a numbered part file of a table kind, e.g. "part-00001.parquet".
+
+    :param part: number of the part file
+    """
+    return "part-{:05d}.parquet".format(part)
+
+
+# Allowed values of [parquet] layout
+PARQUET_LAYOUTS = ["file", "partitioned"]
+
+# directory name of the rows whose partition value is missing, as in Hive and Arrow datasets
+HIVE_NULL = "__HIVE_DEFAULT_PARTITION__"
+
+
+class PartitionIndex(object):
+    """
+    Partition values of every image, keyed by (TableNumber, ImageNumber). The values are
+    read from the metadata columns of the image table, and looked up for the rows of the
+    other tables, which only hold the TableNumber and the ImageNumber.
+    """
+
+    def __init__(self, columns, budget=None):
+        """
+        :param columns: names of the partition columns, e.g. ["Metadata_Plate", "Metadata_Well"]
+        :param budget: BufferBudget shared by the part files of all table kinds, or None
+        """
+        self.columns = columns
+        self.budget = budget
+        self.values = {}
+
+    def image_columns(self, names):
+        """
+        Returns the names of the partition columns in the image table, which are prefixed
+        with "Image_" unless skip_image_prefix. Raises ValueError if a column is missing.
+
+        :param names: column names of the image table
+        """
+        found = []
+        for column in self.columns:
+            for name in [column, "Image_" + column]:
+                if name in names:
+                    found += [name]
+                    break
+            else:
+                raise ValueError(
+                    "Partition column {} is not a column of the image table. Check [parquet] partition_columns.".format(
+                        column
+                    )
+                )
+        return found
+
+    def add(self, table):
+        """
+        Records the partition values of the images of an image table.
+
+        :param table: pyarrow table of the image table kind
+        """
+        keys = zip(
+            table.column("TableNumber").to_pylist(),
+            table.column("ImageNumber").to_pylist(),
+        )
+        values = zip(
+            *[
+                table.column(name).to_pylist()
+                for name in self.image_columns(table.column_names)
+            ]
+        )
+        self.values.update(zip(keys, values))
+
+    def lookup(self, table):
+        """
+        Returns the partition values of every row of a table, as a list of tuples.
+        Rows of an unknown image have missing values.
+
+        :param table: pyarrow table with TableNumber and ImageNumber columns
+        """
+        missing = (None,) * len(self.columns)
+        if "ImageNumber" not in table.column_names:
+            return [missing] * table.num_rows
+        return [
+            self.values.get(key, missing)
+            for key in zip(
+                table.column("TableNumber").to_pylist(),
+                table.column("ImageNumber").to_pylist(),
+            )
+        ]
+
+
+class BufferBudget(object):
+    """
+    Limits the bytes buffered by the open part files of a partitioned dataset, across all
+    partitions and table kinds. When the buffers hold more than ``max_bytes`` bytes, the
+    largest buffers are written to their files (as smaller row groups) until they fit.
+    """
+
+    def __init__(self, max_bytes):
+        """
+        :param max_bytes: maximum size of all buffered tables (bytes)
+        """
+        self.max_bytes = max_bytes
+        self.writers = set()
+
+    def add(self, writer):
+        """
+        Accounts for the tables buffered by a writer, and flushes the largest buffers if needed.
+
+        :param writer: BufferedParquetWriter
+        """
+        self.writers.add(writer)
+        nbytes = sum(writer.nbytes for writer in self.writers)
+        while nbytes > self.max_bytes:
+            largest = max(self.writers, key=lambda writer: writer.nbytes)
+            nbytes -= largest.nbytes
+            largest.flush()
+            nbytes += largest.nbytes
+
+    def remove(self, writer):
+        """
+        Stops accounting for a writer, e.g. when it is closed.
+
+        :param writer: BufferedParquetWriter
+        """
+        self.writers.discard(writer)
+
+
+def format_partition_value(value):
+    """
+    Formats a partition value as a directory name. Integral floats (e.g. a plate barcode
+    converted by type_conversion = int2float) are formatted as integers.
+
+    :param value: partition value, or None
+    """
+    if value is None or value != value:
+        return HIVE_NULL
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return urllib.parse.quote(str(value), safe="")
+
+
+class PartitionedParquetWriter(object):
+    """
+    Writes the tables of a table kind to a Hive-partitioned Parquet dataset,
+    e.g. ``Cells/Metadata_Plate=P1/Metadata_Well=A01/part-0.parquet``, which Arrow datasets
+    (and Spark, DuckDB, ...) read with the partition columns restored from the directory names.
+    The partition columns of the image table are stored in the directory names only.
+
+    Every partition is written by its own BufferedParquetWriter. At most ``max_open_files``
+    writers are open: the least recently used one is closed to open another, and the
+    partition continues in a new part file if it is written to again. The buffers of all
+    writers are limited by the BufferBudget of the PartitionIndex, if any.
+    """
+
+    def __init__(
+        self, directory, schema, partitions, open_file, max_open_files, image=False
+    ):
+        """
+        :param directory: directory of the table kind, e.g. "output/Cells"
+        :param schema: pyarrow schema of the table kind
+        :param partitions: PartitionIndex shared by the writers of all table kinds
+        :param open_file: function that opens a BufferedParquetWriter, given a path and a schema
+        :param max_open_files: maximum number of open part files
+        :param image: True if the table kind is the image table, whose rows set the partition values
+        """
+        self.directory = directory
+        self.schema = schema
+        self.partitions = partitions
+        self.open_file = open_file
+        self.max_open_files = max_open_files
+        self.image = image
+        self.drop = partitions.image_columns(schema.names) if image else []
+        self.file_schema = pyarrow.schema(
+            [field for field in schema if field.name not in self.drop],
+            metadata=schema.metadata,
+        )
+        self.writers = collections.OrderedDict()
+        self.parts = collections.Counter()
+
+    def write_table(self, table):
+        """
+        Splits a table into its partitions, and writes every partition to its part file.
+
+        :param table: pyarrow table with the schema of the writer
+        """
+        if self.image:
+            self.partitions.add(table)
+        rows = collections.OrderedDict()
+        for row, key in enumerate(self.partitions.lookup(table)):
+            rows.setdefault(key, []).append(row)
+        table = table.drop_columns(self.drop)
+        for key, indices in rows.items():
+            if len(indices) == table.num_rows:
+                part = table
+            else:
+                part = table.take(pyarrow.array(indices, type=pyarrow.int64()))
+            writer = self.writer(key)
+            writer.write_table(part)
+            if self.partitions.budget is not None:
+                self.partitions.budget.add(writer)
+
+    def writer(self, key):
+        """
+        Returns the open writer of a partition, opening a new part file if needed.
+
+        :param key: tuple of partition values
+        """
+        if key in self.writers:
+            self.writers.move_to_end(key)
+            return self.writers[key]
+        if len(self.writers) >= self.max_open_files:
+            _, writer = self.writers.popitem(last=False)
+            self.close_writer(writer)
+        directory = os.path.join(
+            self.directory,
+            *[
+                "{}={}".format(column, format_partition_value(value))
+                for column, value in zip(self.partitions.columns, key)
+            ]
+        )
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, "part-{}.parquet".format(self.parts[key]))
+        self.parts[key] += 1
+        self.writers[key] = self.open_file(path, self.file_schema)
+        return self.writers[key]
+
+    def close(self):
+        """
+        Writes the buffered rows and closes all part files.
+        """
+        while self.writers:
+            _, writer = self.writers.popitem(last=False)
+            self.close_writer(writer)
+
+    def close_writer(self, writer):
+        """
+        Closes the writer of a partition.
+
+        :param writer: BufferedParquetWriter
+        """
+        if self.partitions.budget is not None:
+            self.partitions.budget.remove(writer)
+        writer.close()
+
+
+def conform_table(table, schema):
+    """
+    Returns a pyarrow table with exactly the columns of the reference schema, in the same order.
+    Columns are cast to the type of the reference schema. Columns missing from the table
+    are filled with typed nulls, and columns missing from the reference schema are dropped.
+
+    :param table: pyarrow table
+    :param schema: pyarrow schema of the reference table (writers_dict[name]["schema"])
+    """
+    columns = []
+    for field in schema:
+        if field.name in table.column_names:
+            column = table.column(field.name)
+            if column.type != field.type:
+                try:
+                    column = cytominer_database.utils.cast_column(
+                        field.name, column, field.type
+                    )
+                except ValueError as error:
+                    raise ValueError(
+                        "{} (reference schema). If the schema is inferred, increase [schema] infer_rows. If the types are narrowed, set [schema] precision = double.".format(
+                            error
+                        )
+                    )
+        else:
+            column = pyarrow.nulls(table.num_rows, type=field.type)
+        columns += [column]
+    return pyarrow.Table.from_arrays(columns, schema=schema)
 
 
 """ --------- code snippets for testing code ---------
-# -------- pandas dataframe alignment ----------------	
-# (note: missing columns are added with same name and type
-#  as in ref_dataframe, but containing NaN values.)	
-dataframe, ref_dataframe_new = dataframe.align(ref_dataframe, join="right", axis=1)	
-# assert that the reference table has not been modified by the alignment.
-assert ref_dataframe_new.equals(ref_dataframe)
-# --------- identical pandas schemata-----------------	
-assert dataframe.dtypes.equals(ref_dataframe.dtypes)
 # --------- identical pyarrow schemata----------------	
 # (note: use "==" for pyarrrow schema comparisons, not "is")
-table = pyarrow.Table.from_pandas(dataframe)
+table = conform_table(pyarrow.Table.from_pandas(dataframe), writers_dict[name]["schema"])
 assert (table.schema.types == writers_dict[name]["schema"].types)	
 assert (table.schema.names == writers_dict[name]["schema"].names)
 """
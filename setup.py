@@ -32,10 +32,11 @@ setuptools.setup(
     install_requires=[
         "click>=6.7",
         "configparser>=3.5.0",
-        "csvkit>=1.0.2,<2",
-        "pandas>=0.20.3",
-        "pyarrow",
+        "pandas>=1.0",
+        "pyarrow>=14.0",
+        "sqlalchemy>=1.4",
     ],
+    python_requires=">=3.8",
     license="BSD",
     url="https://github.com/cytomining/cytominer-database",
 )
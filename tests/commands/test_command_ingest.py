@@ -237,3 +237,85 @@ def test_run_defaults(cellpainting, runner):
                     df.groupby(["TableNumber", "ImageNumber"]).size().sum()
                     == blob["nrows"]
                 )
+
+
+def test_run_trace(dataset, runner):
+    if dataset["munge"]:
+        pytest.skip("object CSV files are covered by test_run")
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        trace = os.path.join(temp_dir, "trace")
+
+        opts = [
+            "ingest",
+            dataset["data_dir"],
+            "sqlite:///{}".format(os.path.join(temp_dir, "test.db")),
+            "--no-munge",
+            "--trace",
+            trace,
+        ]
+
+        if dataset["config"]:
+            opts += [
+                "--config-file",
+                os.path.join(dataset["data_dir"], dataset["config"]),
+            ]
+
+        result = runner.invoke(cytominer_database.command.command, opts)
+
+        assert result.exit_code == 0, result.output
+
+        assert sorted(os.listdir(trace)) == ["ingest_summary.json", "ingest_trace.json"]
+
+
+def test_run_metrics_file(dataset, runner):
+    if dataset["munge"]:
+        pytest.skip("object CSV files are covered by test_run")
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        metrics_file = os.path.join(temp_dir, "ingest.prom")
+
+        opts = [
+            "ingest",
+            dataset["data_dir"],
+            "sqlite:///{}".format(os.path.join(temp_dir, "test.db")),
+            "--no-munge",
+            "--progress-interval",
+            "0",
+            "--metrics-file",
+            metrics_file,
+        ]
+
+        if dataset["config"]:
+            opts += [
+                "--config-file",
+                os.path.join(dataset["data_dir"], dataset["config"]),
+            ]
+
+        result = runner.invoke(cytominer_database.command.command, opts)
+
+        assert result.exit_code == 0, result.output
+
+        with open(metrics_file) as fd:
+            metrics = fd.read().splitlines()
+
+        directories = len(
+            [
+                name
+                for name in os.listdir(dataset["data_dir"])
+                if os.path.isdir(os.path.join(dataset["data_dir"], name))
+            ]
+        )
+
+        assert (
+            "cytominer_database_ingest_directories_done {}".format(float(directories))
+            in metrics
+        )
+
+        for blob in dataset["ingest"]:
+            assert (
+                'cytominer_database_ingest_rows_total{{table="{}"}} {}'.format(
+                    blob["table"].capitalize(), blob["nrows"]
+                )
+                in metrics
+            )
@@ -1,7 +1,11 @@
 import os.path
+import shutil
+import sqlite3
 
 import pandas as pd
+import pytest
 import tempfile
+import sqlalchemy
 from sqlalchemy import create_engine
 
 import cytominer_database.ingest
@@ -53,3 +57,249 @@ def test_seed(dataset):
                     df.groupby(["TableNumber", "ImageNumber"]).size().sum()
                     == blob["nrows"]
                 )
+
+
+def test_seed_workers(dataset):
+    data_dir = dataset["data_dir"]
+    config = dataset["config"] or "config.ini"
+    config_file = os.path.join(data_dir, config)
+
+    if dataset["munge"]:
+        cytominer_database.munge.munge(config_file, data_dir)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        targets = []
+        for workers in [1, 2]:
+            sqlite_file = os.path.join(temp_dir, "test_{}.db".format(workers))
+            target = "sqlite:///{}".format(str(sqlite_file))
+            cytominer_database.ingest.seed(
+                config_path=config_file,
+                source=data_dir,
+                target=target,
+                workers=workers,
+            )
+            targets += [target]
+
+        # the shard databases are removed after merging
+        assert sorted(os.listdir(temp_dir)) == ["test_1.db", "test_2.db"]
+
+        for blob in dataset["ingest"]:
+            table_name = blob["table"].capitalize()
+            dfs = []
+            for target in targets:
+                con = create_engine(target).connect()
+                dfs += [pd.read_sql(sql=table_name, con=con)]
+                con.close()
+
+            pd.testing.assert_frame_equal(dfs[0], dfs[1])
+
+
+def test_seed_bulk_load(dataset):
+    data_dir = dataset["data_dir"]
+    config = dataset["config"] or "config.ini"
+    config_path = os.path.join(data_dir, config)
+
+    if dataset["munge"]:
+        cytominer_database.munge.munge(config_path, data_dir)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        targets = []
+        for bulk_load in ["false", "true"]:
+            config_file = cytominer_database.utils.read_config(config_path)
+            config_file["sqlite"]["bulk_load"] = bulk_load
+            config_file["sqlite"]["transaction_rows"] = "50"
+            bulk_config_path = os.path.join(temp_dir, bulk_load + ".ini")
+            with open(bulk_config_path, "w") as fd:
+                config_file.write(fd)
+
+            sqlite_file = os.path.join(temp_dir, "test_{}.db".format(bulk_load))
+            target = "sqlite:///{}".format(str(sqlite_file))
+            cytominer_database.ingest.seed(
+                config_path=bulk_config_path, source=data_dir, target=target
+            )
+            targets += [target]
+
+        con = create_engine(targets[1]).connect()
+        assert con.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal"
+        con.close()
+
+        for blob in dataset["ingest"]:
+            table_name = blob["table"].capitalize()
+            dfs = []
+            for target in targets:
+                con = create_engine(target).connect()
+                dfs += [pd.read_sql(sql=table_name, con=con)]
+                con.close()
+
+            pd.testing.assert_frame_equal(dfs[0], dfs[1])
+
+
+def test_seed_chunked(dataset):
+    data_dir = dataset["data_dir"]
+    config = dataset["config"] or "config.ini"
+    config_path = os.path.join(data_dir, config)
+
+    if dataset["munge"]:
+        cytominer_database.munge.munge(config_path, data_dir)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        targets = []
+        # max_memory = 1 streams every file, in chunks of 7 rows
+        for max_memory in ["0", "1"]:
+            config_file = cytominer_database.utils.read_config(config_path)
+            config_file["ingestion_engine"]["max_memory"] = max_memory
+            config_file["ingestion_engine"]["chunk_rows"] = "7"
+            chunked_config_path = os.path.join(temp_dir, max_memory + ".ini")
+            with open(chunked_config_path, "w") as fd:
+                config_file.write(fd)
+
+            sqlite_file = os.path.join(temp_dir, "test_{}.db".format(max_memory))
+            target = "sqlite:///{}".format(str(sqlite_file))
+            cytominer_database.ingest.seed(
+                config_path=chunked_config_path, source=data_dir, target=target
+            )
+            targets += [target]
+
+        for blob in dataset["ingest"]:
+            table_name = blob["table"].capitalize()
+            dfs = []
+            for target in targets:
+                con = create_engine(target).connect()
+                dfs += [pd.read_sql(sql=f"SELECT * FROM {table_name}", con=con)]
+                con.close()
+
+            # chunks have the column types of the whole file
+            pd.testing.assert_frame_equal(dfs[0], dfs[1])
+
+
+def test_seed_munge(htqc):
+    config_file = os.path.join(htqc["data_dir"], "config.ini")
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        targets = []
+        # munge to .csv files, then ingest them; or split the object .csv files in memory
+        for munge in [False, True]:
+            source = os.path.join(temp_dir, "munge_{}".format(munge))
+            shutil.copytree(
+                htqc["data_dir"],
+                source,
+                ignore=shutil.ignore_patterns(
+                    "Cells.csv", "Cytoplasm.csv", "Nuclei.csv"
+                ),
+            )
+
+            if not munge:
+                cytominer_database.munge.munge(config_file, source)
+
+            target = "sqlite:///{}".format(
+                os.path.join(temp_dir, "{}.db".format(munge))
+            )
+            cytominer_database.ingest.seed(
+                config_path=config_file, source=source, target=target, munge=munge
+            )
+            targets += [target]
+
+        assert not os.path.exists(os.path.join(source, "1", "Cells.csv"))
+
+        for blob in htqc["ingest"]:
+            table_name = blob["table"].capitalize()
+            dfs = []
+            for target in targets:
+                con = create_engine(target).connect()
+                dfs += [pd.read_sql(sql=table_name, con=con)]
+                con.close()
+
+            pd.testing.assert_frame_equal(dfs[0], dfs[1])
+
+
+def test_seed_resume(cellpainting):
+    data_dir = cellpainting["data_dir"]
+    config_file = os.path.join(data_dir, cellpainting["config"])
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        targets = []
+        for name in ["complete", "resumed"]:
+            sqlite_file = os.path.join(temp_dir, "{}.db".format(name))
+            target = "sqlite:///{}".format(str(sqlite_file))
+            cytominer_database.ingest.seed(
+                config_path=config_file,
+                source=data_dir,
+                target=target,
+                resume=name == "resumed",
+            )
+            targets += [target]
+
+        # the manifest is only written with resume
+        con = create_engine(targets[0]).connect()
+        assert not sqlalchemy.inspect(con).has_table("_ingest_manifest")
+        con.close()
+
+        # simulate an interruption in the middle of the directory A01-2:
+        # its Nuclei rows are missing, and it is not in the manifest
+        con = create_engine(targets[1]).connect()
+        with con.begin():
+            # tables that are not ingested are left untouched
+            con.exec_driver_sql("CREATE TABLE Other (TableNumber INTEGER)")
+            con.exec_driver_sql("INSERT INTO Other VALUES (1)")
+            table_number = con.exec_driver_sql(
+                "SELECT table_number FROM _ingest_manifest WHERE directory = 'A01-2'"
+            ).scalar()
+            con.exec_driver_sql(
+                "DELETE FROM _ingest_manifest WHERE directory = 'A01-2'"
+            )
+            con.exec_driver_sql(
+                "DELETE FROM Nuclei WHERE TableNumber = {}".format(table_number)
+            )
+        con.close()
+
+        cytominer_database.ingest.seed(
+            config_path=config_file, source=data_dir, target=targets[1], resume=True
+        )
+
+        con = create_engine(targets[1]).connect()
+        assert pd.read_sql(sql="Other", con=con)["TableNumber"].tolist() == [1]
+        con.close()
+
+        for blob in cellpainting["ingest"]:
+            table_name = blob["table"].capitalize()
+            dfs = []
+            for target in targets:
+                con = create_engine(target).connect()
+                df = pd.read_sql(sql=table_name, con=con)
+                con.close()
+                dfs += [df.sort_values(list(df.columns[:3])).reset_index(drop=True)]
+
+            pd.testing.assert_frame_equal(dfs[0], dfs[1])
+
+
+def test_merge_shard_failure():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        database = os.path.join(temp_dir, "target.db")
+        shard = os.path.join(temp_dir, "shard.db")
+
+        connection = sqlite3.connect(database)
+        connection.execute("CREATE TABLE Cells (a INTEGER)")
+        connection.commit()
+        connection.close()
+
+        # the Cells table of the shard does not match the one of the target
+        connection = sqlite3.connect(shard)
+        connection.execute("CREATE TABLE Image (c INTEGER)")
+        connection.execute("INSERT INTO Image VALUES (1)")
+        connection.execute("CREATE TABLE Cells (b INTEGER)")
+        connection.commit()
+        connection.close()
+
+        with pytest.raises(sqlite3.OperationalError):
+            cytominer_database.ingest.merge_shard(shard, database)
+
+        # the target is unchanged and not locked
+        connection = sqlite3.connect(database, timeout=0)
+        tables = connection.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table'"
+        ).fetchall()
+        connection.execute("INSERT INTO Cells VALUES (1)")
+        connection.commit()
+        connection.close()
+
+        assert tables == [("Cells",)]
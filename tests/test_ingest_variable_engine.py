@@ -1,12 +1,19 @@
+import csv
 import os
+import shutil
 
+import numpy
 import pandas as pd
+import pyarrow
+import pyarrow.dataset
+import pyarrow.parquet as pq
 import tempfile
 from sqlalchemy import create_engine
 
 # import cytominer_database.ingest
 import cytominer_database.ingest_variable_engine
 import cytominer_database.munge
+import cytominer_database.utils
 import pytest
 
 
@@ -64,8 +71,550 @@ def test_seed(dataset, config_choice):
             assert df.shape[0] == blob["nrows"]
             assert df.shape[1] == blob["ncols"] + 1
 
+            if engine_type == "Parquet":
+                # string columns are not dictionary-encoded by default
+                for column in df.columns:
+                    assert df[column].dtype != "category"
+
             if table_name.lower() != "image":
                 assert (
                     df.groupby(["TableNumber", "ImageNumber"]).size().sum()
                     == blob["nrows"]
                 )
+
+
+@pytest.mark.parametrize("config_choice", ["config_Parquet.ini", "config_SQLite.ini"])
+def test_seed_workers(dataset, config_choice):
+    data_dir = dataset["data_dir"]
+    config_path = os.path.join(data_dir, config_choice)
+    config_file = cytominer_database.utils.read_config(config_path)
+    engine_type = config_file["ingestion_engine"]["engine"]
+
+    if dataset["munge"]:
+        cytominer_database.munge.munge(config_path, data_dir)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        outputs = {}
+        for workers in [1, 2]:
+            if engine_type == "Parquet":
+                target = os.path.join(temp_dir, "parquet_{}".format(workers))
+                os.mkdir(target)
+            elif engine_type == "SQLite":
+                sqlite_file = os.path.join(temp_dir, "test_{}.db".format(workers))
+                target = "sqlite:///{}".format(str(sqlite_file))
+
+            cytominer_database.ingest_variable_engine.seed(
+                config_path=config_path,
+                source=data_dir,
+                output_path=target,
+                workers=workers,
+            )
+            outputs[workers] = target
+
+        for blob in dataset["ingest"]:
+            table_name = blob["table"].capitalize()
+            dfs = []
+            for workers, target in outputs.items():
+                if engine_type == "Parquet":
+                    basename = ".".join([table_name, "parquet"])
+                    df = pd.read_parquet(path=os.path.join(target, basename))
+                elif engine_type == "SQLite":
+                    con = create_engine(target).connect()
+                    df = pd.read_sql(sql=table_name, con=con)
+                    con.close()
+                dfs += [df]
+
+            # parallel ingestion writes the same rows, in the same order
+            pd.testing.assert_frame_equal(dfs[0], dfs[1])
+
+
+def test_seed_csv_reader(dataset):
+    data_dir = dataset["data_dir"]
+    config_path = os.path.join(data_dir, "config_Parquet.ini")
+
+    if dataset["munge"]:
+        cytominer_database.munge.munge(config_path, data_dir)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        # missing metadata values are read as nulls by both parsers
+        source = os.path.join(temp_dir, "source")
+        shutil.copytree(data_dir, source)
+        for directory in os.listdir(source):
+            filename = os.path.join(source, directory, dataset["image_csv"])
+            if not os.path.isfile(filename):
+                continue
+            with open(filename, newline="") as fd:
+                rows = list(csv.reader(fd))
+            if len(rows) > 2:
+                column = rows[0].index("Metadata_Well")
+                rows[1][column] = ""
+                rows[2][column] = "NA"
+                with open(filename, "w", newline="") as fd:
+                    csv.writer(fd).writerows(rows)
+
+        outputs = {}
+        for csv_reader in ["pandas", "arrow"]:
+            config_file = cytominer_database.utils.read_config(config_path)
+            config_file["schema"]["ref_fraction"] = "1"
+            config_file["ingestion_engine"]["csv_reader"] = csv_reader
+            reader_config_path = os.path.join(temp_dir, csv_reader + ".ini")
+            with open(reader_config_path, "w") as fd:
+                config_file.write(fd)
+
+            target = os.path.join(temp_dir, csv_reader)
+            os.mkdir(target)
+            cytominer_database.ingest_variable_engine.seed(
+                config_path=reader_config_path, source=source, output_path=target
+            )
+            outputs[csv_reader] = target
+
+        for blob in dataset["ingest"]:
+            basename = ".".join([blob["table"].capitalize(), "parquet"])
+            pd.testing.assert_frame_equal(
+                pd.read_parquet(os.path.join(outputs["pandas"], basename)),
+                pd.read_parquet(os.path.join(outputs["arrow"], basename)),
+            )
+
+
+@pytest.mark.parametrize("engine", ["Parquet", "SQLite"])
+def test_seed_chunked(cellpainting, engine):
+    data_dir = cellpainting["data_dir"]
+    config_path = os.path.join(data_dir, "config_{}.ini".format(engine))
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        outputs = []
+        # max_memory = 1 streams every file, in chunks of 7 rows
+        for max_memory in ["0", "1"]:
+            config_file = cytominer_database.utils.read_config(config_path)
+            config_file["schema"]["ref_fraction"] = "1"
+            config_file["ingestion_engine"]["max_memory"] = max_memory
+            config_file["ingestion_engine"]["chunk_rows"] = "7"
+            chunked_config_path = os.path.join(temp_dir, max_memory + ".ini")
+            with open(chunked_config_path, "w") as fd:
+                config_file.write(fd)
+
+            if engine == "Parquet":
+                target = os.path.join(temp_dir, max_memory)
+                os.mkdir(target)
+            else:
+                target = "sqlite:///{}".format(
+                    os.path.join(temp_dir, max_memory + ".db")
+                )
+            cytominer_database.ingest_variable_engine.seed(
+                config_path=chunked_config_path, source=data_dir, output_path=target
+            )
+            outputs += [target]
+
+        for blob in cellpainting["ingest"]:
+            table_name = blob["table"].capitalize()
+            dfs = []
+            for target in outputs:
+                if engine == "Parquet":
+                    basename = ".".join([table_name, "parquet"])
+                    dfs += [pd.read_parquet(os.path.join(target, basename))]
+                else:
+                    con = create_engine(target).connect()
+                    dfs += [pd.read_sql(sql=f"SELECT * FROM {table_name}", con=con)]
+                    con.close()
+
+            # chunks have the column types of the whole file
+            pd.testing.assert_frame_equal(dfs[0], dfs[1])
+
+
+@pytest.mark.parametrize("max_memory", ["0", "1"])
+def test_seed_munge(htqc, max_memory):
+    with tempfile.TemporaryDirectory() as temp_dir:
+        # max_memory = 1 reads the object .csv files in chunks
+        config_file = cytominer_database.utils.read_config(
+            os.path.join(htqc["data_dir"], "config_Parquet.ini")
+        )
+        config_file["ingestion_engine"]["max_memory"] = max_memory
+        config_file["ingestion_engine"]["chunk_rows"] = "7"
+        config_path = os.path.join(temp_dir, "config.ini")
+        with open(config_path, "w") as fd:
+            config_file.write(fd)
+
+        outputs = []
+        # munge to .csv files, then ingest them; or split the object .csv files in memory
+        for munge in [False, True]:
+            source = os.path.join(temp_dir, "source_{}".format(munge))
+            shutil.copytree(
+                htqc["data_dir"],
+                source,
+                ignore=shutil.ignore_patterns(
+                    "Cells.csv", "Cytoplasm.csv", "Nuclei.csv"
+                ),
+            )
+
+            if not munge:
+                cytominer_database.munge.munge(config_path, source)
+
+            target = os.path.join(temp_dir, "output_{}".format(munge))
+            os.mkdir(target)
+            cytominer_database.ingest_variable_engine.seed(
+                config_path=config_path,
+                source=source,
+                output_path=target,
+                munge=munge,
+            )
+            outputs += [target]
+
+        assert not os.path.exists(os.path.join(source, "1", "Cells.csv"))
+
+        for blob in htqc["ingest"]:
+            basename = ".".join([blob["table"].capitalize(), "parquet"])
+            pd.testing.assert_frame_equal(
+                pd.read_parquet(os.path.join(outputs[0], basename)),
+                pd.read_parquet(os.path.join(outputs[1], basename)),
+            )
+
+
+def test_seed_resume(cellpainting):
+    data_dir = cellpainting["data_dir"]
+    config_path = os.path.join(data_dir, "config_Parquet.ini")
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        targets = []
+        for name in ["complete", "resumed"]:
+            target = os.path.join(temp_dir, name)
+            os.mkdir(target)
+            cytominer_database.ingest_variable_engine.seed(
+                config_path=config_path,
+                source=data_dir,
+                output_path=target,
+                resume=name == "resumed",
+            )
+            targets += [target]
+
+        # the manifest is only written with resume
+        assert not os.path.exists(os.path.join(targets[0], "_ingest_manifest.jsonl"))
+
+        # simulate an interruption: the last directory is not in the manifest
+        manifest_path = os.path.join(targets[1], "_ingest_manifest.jsonl")
+        with open(manifest_path) as fd:
+            lines = fd.readlines()
+        with open(manifest_path, "w") as fd:
+            fd.writelines(lines[:-1])
+
+        cytominer_database.ingest_variable_engine.seed(
+            config_path=config_path,
+            source=data_dir,
+            output_path=targets[1],
+            resume=True,
+        )
+
+        assert sorted(os.listdir(targets[0]) + ["_ingest_manifest.jsonl"]) == sorted(
+            os.listdir(targets[1])
+        )
+
+        for blob in cellpainting["ingest"]:
+            basename = ".".join([blob["table"].capitalize(), "parquet"])
+            dfs = []
+            for target in targets:
+                df = pd.read_parquet(os.path.join(target, basename))
+                dfs += [df.sort_values(list(df.columns[:3])).reset_index(drop=True)]
+
+            pd.testing.assert_frame_equal(dfs[0], dfs[1])
+
+
+@pytest.mark.parametrize("engine", ["Parquet", "SQLite"])
+def test_seed_infer(engine):
+    with tempfile.TemporaryDirectory() as temp_dir:
+        source = os.path.join(temp_dir, "plate")
+        # Cells.csv files that differ in columns and column types
+        contents = {
+            "1": {"a": [1, 2], "b": [3, 4], "d": [None, None]},
+            "2": {"a": [0.5, 1.5], "c": ["x", "y"], "d": [True, False]},
+        }
+        for directory, cells in contents.items():
+            os.makedirs(os.path.join(source, directory))
+            pd.DataFrame({"ImageNumber": [int(directory)]}).to_csv(
+                os.path.join(source, directory, "Image.csv"), index=False
+            )
+            pd.DataFrame(dict(cells, ImageNumber=int(directory))).to_csv(
+                os.path.join(source, directory, "Cells.csv"), index=False
+            )
+
+        config_path = os.path.join(temp_dir, "config.ini")
+        with open(config_path, "w") as fd:
+            fd.write(
+                "[ingestion_engine]\nengine = {}\n[schema]\nreference_option = infer\n".format(
+                    engine
+                )
+            )
+
+        if engine == "Parquet":
+            target = os.path.join(temp_dir, "output")
+            os.mkdir(target)
+        else:
+            target = "sqlite:///{}".format(os.path.join(temp_dir, "test.db"))
+
+        cytominer_database.ingest_variable_engine.seed(
+            config_path=config_path, source=source, output_path=target
+        )
+
+        if engine == "Parquet":
+            cells = pd.read_parquet(os.path.join(target, "Cells.parquet"))
+        else:
+            cells = pd.read_sql("SELECT * FROM Cells", create_engine(target))
+
+        assert list(cells.columns) == ["TableNumber", "a", "b", "d", "ImageNumber", "c"]
+        assert cells["a"].tolist() == [1.0, 2.0, 0.5, 1.5]
+        assert cells["c"].tolist()[2:] == ["x", "y"]
+        assert cells["b"].tolist()[:2] == [3, 4]
+        assert cells["b"].isna().tolist()[2:] == [True, True]
+        assert len(cells) == 4
+
+        if engine == "Parquet":
+            assert cells["a"].dtype == "float64"
+            assert cells["b"].dtype == "float64"  # nullable integer read back by pandas
+            assert cells["d"].tolist()[2:] == [True, False]
+            assert cells["ImageNumber"].dtype == "int64"
+
+
+def test_seed_infer_rows():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        source = os.path.join(temp_dir, "plate")
+        os.makedirs(os.path.join(source, "1"))
+        with open(os.path.join(source, "1", "Image.csv"), "w") as fd:
+            fd.write("ImageNumber\n1\n")
+        # a looks like an integer column in the first infer_rows rows
+        with open(os.path.join(source, "1", "Cells.csv"), "w") as fd:
+            fd.write("ImageNumber,ObjectNumber,a,b\n1,1,1,5\n1,2,2,6\n1,3,2.5,7\n")
+
+        config_path = os.path.join(temp_dir, "config.ini")
+        with open(config_path, "w") as fd:
+            fd.write(
+                "[ingestion_engine]\nengine = Parquet\n[schema]\nreference_option = infer\ninfer_rows = 2\n"
+            )
+
+        target = os.path.join(temp_dir, "output")
+        os.mkdir(target)
+
+        cytominer_database.ingest_variable_engine.seed(
+            config_path=config_path, source=source, output_path=target
+        )
+
+        cells = pd.read_parquet(os.path.join(target, "Cells.parquet"))
+
+        assert cells["a"].tolist() == [1.0, 2.0, 2.5]
+        # integer columns are kept
+        assert cells["b"].dtype == "int64"
+        assert cells["ObjectNumber"].dtype == "int64"
+
+
+@pytest.mark.parametrize("reference_option", ["sample", "infer"])
+def test_seed_precision(reference_option):
+    with tempfile.TemporaryDirectory() as temp_dir:
+        source = os.path.join(temp_dir, "plate")
+        for directory in ["1", "2"]:
+            os.makedirs(os.path.join(source, directory))
+            pd.DataFrame({"ImageNumber": [int(directory)]}).to_csv(
+                os.path.join(source, directory, "Image.csv"), index=False
+            )
+            pd.DataFrame(
+                {"ImageNumber": int(directory), "a": [1, 2], "b": [0.1, 0.2]}
+            ).to_csv(os.path.join(source, directory, "Cells.csv"), index=False)
+
+        config_path = os.path.join(temp_dir, "config.ini")
+        with open(config_path, "w") as fd:
+            fd.write(
+                "[ingestion_engine]\nengine = Parquet\n[schema]\nreference_option = {}\nprecision = single\n".format(
+                    reference_option
+                )
+            )
+
+        target = os.path.join(temp_dir, "output")
+        os.mkdir(target)
+
+        cytominer_database.ingest_variable_engine.seed(
+            config_path=config_path, source=source, output_path=target
+        )
+
+        schema = pq.read_schema(os.path.join(target, "Cells.parquet"))
+
+        assert schema.field("TableNumber").type == pyarrow.uint32()
+        assert schema.field("ImageNumber").type == pyarrow.int32()
+        assert schema.field("b").type == pyarrow.float32()
+
+        cells = pd.read_parquet(os.path.join(target, "Cells.parquet"))
+
+        assert cells["b"].tolist() == [numpy.float32(0.1), numpy.float32(0.2)] * 2
+
+        # a value out of the range of float32 is not stored as infinity
+        pd.DataFrame({"ImageNumber": 2, "a": [1, 2], "b": [0.1, 1e300]}).to_csv(
+            os.path.join(source, "2", "Cells.csv"), index=False
+        )
+        shutil.rmtree(target)
+        os.mkdir(target)
+
+        with pytest.raises(ValueError, match="precision = double"):
+            cytominer_database.ingest_variable_engine.seed(
+                config_path=config_path, source=source, output_path=target
+            )
+
+
+def test_seed_partitioned():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        source = os.path.join(temp_dir, "plate")
+        for directory, well in [("1", "A01"), ("2", "A02")]:
+            os.makedirs(os.path.join(source, directory))
+            pd.DataFrame(
+                {"ImageNumber": [1], "Metadata_Plate": ["P1"], "Metadata_Well": [well]}
+            ).to_csv(os.path.join(source, directory, "Image.csv"), index=False)
+            pd.DataFrame({"ImageNumber": 1, "a": [0.5, 1.5, int(directory)]}).to_csv(
+                os.path.join(source, directory, "Cells.csv"), index=False
+            )
+
+        config_path = os.path.join(temp_dir, "config.ini")
+        with open(config_path, "w") as fd:
+            fd.write(
+                "[ingestion_engine]\nengine = Parquet\n[parquet]\nlayout = partitioned\n"
+            )
+
+        target = os.path.join(temp_dir, "output")
+        os.mkdir(target)
+
+        cytominer_database.ingest_variable_engine.seed(
+            config_path=config_path, source=source, output_path=target
+        )
+
+        assert os.path.exists(
+            os.path.join(
+                target,
+                "Cells",
+                "Metadata_Plate=P1",
+                "Metadata_Well=A02",
+                "part-0.parquet",
+            )
+        )
+
+        cells = (
+            pyarrow.dataset.dataset(os.path.join(target, "Cells"), partitioning="hive")
+            .to_table(filter=pyarrow.dataset.field("Metadata_Well") == "A02")
+            .to_pandas()
+        )
+
+        assert cells["a"].tolist() == [0.5, 1.5, 2.0]
+
+        # the dataset of a previous ingest is not replaced silently
+        with pytest.raises(ValueError, match="not empty"):
+            cytominer_database.ingest_variable_engine.seed(
+                config_path=config_path, source=source, output_path=target
+            )
+
+
+def test_seed_checkpointed():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        source = os.path.join(temp_dir, "plate")
+        for directory in ["1", "2", "3"]:
+            os.makedirs(os.path.join(source, directory))
+            pd.DataFrame(
+                {"ImageNumber": [1], "Metadata_Well": ["A0" + directory]}
+            ).to_csv(os.path.join(source, directory, "Image.csv"), index=False)
+            pd.DataFrame({"ImageNumber": 1, "a": [0.5, int(directory)]}).to_csv(
+                os.path.join(source, directory, "Cells.csv"), index=False
+            )
+
+        config_path = os.path.join(temp_dir, "config.ini")
+        with open(config_path, "w") as fd:
+            fd.write(
+                "[ingestion_engine]\nengine = Parquet\n[parquet]\ncheckpoint_directories = 2\n"
+            )
+
+        target = os.path.join(temp_dir, "output")
+        os.mkdir(target)
+
+        cytominer_database.ingest_variable_engine.seed(
+            config_path=config_path, source=source, output_path=target
+        )
+
+        cells = os.path.join(target, "Cells")
+        assert sorted(os.listdir(cells)) == ["part-00000.parquet", "part-00001.parquet"]
+        complete = pd.read_parquet(cells)
+
+        # the ingest is killed while it writes the last directory: its part file has no
+        # footer and the directory is not recorded in the manifest
+        manifest = os.path.join(target, "_ingest_manifest.jsonl")
+        with open(manifest) as fd:
+            lines = fd.readlines()
+        assert len(lines) == 3
+        with open(manifest, "w") as fd:
+            fd.writelines(lines[:2])
+        with open(os.path.join(cells, "part-00001.parquet"), "r+b") as fd:
+            fd.truncate(16)
+
+        # part files are not overwritten silently
+        with pytest.raises(ValueError, match="part files"):
+            cytominer_database.ingest_variable_engine.seed(
+                config_path=config_path, source=source, output_path=target
+            )
+
+        cytominer_database.ingest_variable_engine.seed(
+            config_path=config_path, source=source, output_path=target, resume=True
+        )
+
+        # only the last directory is ingested again
+        assert sorted(os.listdir(cells)) == ["part-00000.parquet", "part-00002.parquet"]
+        pd.testing.assert_frame_equal(pd.read_parquet(cells), complete)
+
+        # the rows of a changed directory are removed from its part file
+        pd.DataFrame({"ImageNumber": 1, "a": [0.25, 1.0, 1.5]}).to_csv(
+            os.path.join(source, "1", "Cells.csv"), index=False
+        )
+
+        cytominer_database.ingest_variable_engine.seed(
+            config_path=config_path, source=source, output_path=target, resume=True
+        )
+
+        assert sorted(os.listdir(cells)) == [
+            "part-00000.parquet",
+            "part-00002.parquet",
+            "part-00003.parquet",
+        ]
+        assert pd.read_parquet(os.path.join(cells, "part-00000.parquet"))[
+            "a"
+        ].tolist() == [0.5, 2.0]
+        assert sorted(pd.read_parquet(cells)["a"].tolist()) == [
+            0.25,
+            0.5,
+            0.5,
+            1.0,
+            1.5,
+            2.0,
+            3.0,
+        ]
+
+
+def test_seed_checksum_cache():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        source = os.path.join(temp_dir, "plate")
+        for directory in ["1", "2"]:
+            os.makedirs(os.path.join(source, directory))
+            pd.DataFrame({"ImageNumber": [1], "a": [int(directory)]}).to_csv(
+                os.path.join(source, directory, "Image.csv"), index=False
+            )
+
+        cache_path = os.path.join(temp_dir, "cache", "checksums.json")
+        config_path = os.path.join(temp_dir, "config.ini")
+        with open(config_path, "w") as fd:
+            fd.write(
+                "[ingestion_engine]\nengine = Parquet\nchecksum_cache = {}\n".format(
+                    cache_path
+                )
+            )
+
+        target = os.path.join(temp_dir, "output")
+        os.mkdir(target)
+
+        cytominer_database.ingest_variable_engine.seed(
+            config_path=config_path, source=source, output_path=target
+        )
+
+        # the checksums of both image .csv files are saved at the end of the ingest
+        cache = cytominer_database.utils.ChecksumCache(cache_path)
+        image = pd.read_parquet(os.path.join(target, "Image.parquet"))
+        assert sorted(
+            cache.get(os.path.join(source, directory, "Image.csv"))
+            for directory in ["1", "2"]
+        ) == sorted(image["TableNumber"].tolist())
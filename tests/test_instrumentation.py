@@ -0,0 +1,102 @@
+import json
+import os
+
+import pandas as pd
+import pytest
+
+import cytominer_database.ingest
+import cytominer_database.ingest_variable_engine
+import cytominer_database.instrumentation
+
+
+@pytest.fixture
+def plate(tmpdir):
+    tmpdir = tmpdir.mkdir("plate")
+
+    for directory in ["1", "2"]:
+        pd.DataFrame({"ImageNumber": [int(directory)]}).to_csv(
+            tmpdir.join(directory, "Image.csv").ensure(), index=False
+        )
+        pd.DataFrame({"ImageNumber": [int(directory)] * 3, "a": [1, 2, 3]}).to_csv(
+            tmpdir.join(directory, "Cells.csv"), index=False
+        )
+
+    tmpdir.join("config.ini").write("[ingestion_engine]\nengine = Parquet\n")
+
+    return str(tmpdir)
+
+
+def test_stage_disabled():
+    assert not cytominer_database.instrumentation.is_enabled()
+
+    with cytominer_database.instrumentation.stage("parse", "Cells") as timer:
+        timer.count(rows=1)
+
+    assert timer is cytominer_database.instrumentation.NULL_STAGE
+
+    assert cytominer_database.instrumentation.remote(len) is len
+
+
+def test_recording(tmpdir):
+    with cytominer_database.instrumentation.recording(str(tmpdir)):
+        assert cytominer_database.instrumentation.is_enabled()
+
+        for rows in [2, 3]:
+            with cytominer_database.instrumentation.stage(
+                "parse", "Cells", "Cells.csv", bytes=10
+            ) as timer:
+                timer.count(rows=rows)
+
+        # a function run by a worker process sends its stages back with its result
+        result = cytominer_database.instrumentation.remote(parse_image)(4)
+
+        assert cytominer_database.instrumentation.receive(result) == 4
+
+    assert not cytominer_database.instrumentation.is_enabled()
+
+    with open(tmpdir.join("ingest_summary.json")) as fd:
+        summary = json.load(fd)
+
+    assert summary["stages"]["parse"]["count"] == 3
+    assert summary["stages"]["parse"]["rows"] == 9
+    assert summary["tables"]["Cells"]["parse"]["bytes"] == 20
+    assert summary["files"]["Cells.csv"]["parse"]["rows"] == 5
+
+    with open(tmpdir.join("ingest_trace.json")) as fd:
+        events = json.load(fd)["traceEvents"]
+
+    assert [event["name"] for event in events] == ["parse"] * 3
+    assert all(event["ph"] == "X" and event["dur"] >= 0 for event in events)
+
+
+def parse_image(rows):
+    with cytominer_database.instrumentation.stage("parse", "Image", rows=rows):
+        return rows
+
+
+@pytest.mark.parametrize(
+    "module,workers",
+    [
+        (cytominer_database.ingest_variable_engine, 1),
+        (cytominer_database.ingest_variable_engine, 2),
+        (cytominer_database.ingest, 2),
+    ],
+)
+def test_recording_ingest(plate, tmpdir, module, workers):
+    trace = os.path.join(str(tmpdir), "trace")
+
+    if module is cytominer_database.ingest:
+        target = "sqlite:///{}".format(os.path.join(str(tmpdir), "test.db"))
+    else:
+        target = str(tmpdir.mkdir("output"))
+
+    with cytominer_database.instrumentation.recording(trace):
+        module.seed(plate, target, os.path.join(plate, "config.ini"), workers=workers)
+
+    with open(os.path.join(trace, "ingest_summary.json")) as fd:
+        summary = json.load(fd)
+
+    # the stages of the worker processes are recorded as well
+    assert {"read", "validate", "parse", "write"} <= set(summary["stages"])
+    assert summary["tables"]["Cells"]["write"]["rows"] == 6
+    assert summary["files"][os.path.join(plate, "1", "Image.csv")]["read"]["bytes"] > 0
@@ -0,0 +1,104 @@
+import os
+
+import pytest
+
+import cytominer_database.inventory
+import cytominer_database.utils
+
+
+@pytest.fixture
+def plate(tmpdir):
+    # plate/
+    #   a/Image.csv, a/Cells.csv, a/notes.txt
+    #   b/Image.csv
+    #   empty/
+    #   batch/c/Image.csv
+    for filename in ["a/Image.csv", "a/Cells.csv", "b/Image.csv", "batch/c/Image.csv"]:
+        tmpdir.join(filename).write("ImageNumber\n1\n", ensure=True)
+
+    tmpdir.join("a", "notes.txt").write("not a CSV file")
+    tmpdir.mkdir("empty")
+
+    return str(tmpdir)
+
+
+@pytest.mark.parametrize("threads", [1, 4])
+def test_scan(plate, threads):
+    inventory = cytominer_database.inventory.scan(plate, threads=threads)
+
+    # the subdirectories of the source, as cytominer_database.utils.find_directories
+    assert inventory.directories == sorted(
+        cytominer_database.utils.find_directories(plate)
+    )
+
+    directory = os.path.join(plate, "a")
+
+    assert inventory.csvs(directory) == [
+        os.path.join(directory, "Cells.csv"),
+        os.path.join(directory, "Image.csv"),
+    ]
+
+    entry = inventory.entry(os.path.join(directory, "Cells.csv"))
+
+    assert entry.name == "Cells"
+    assert entry.size == os.path.getsize(entry.path)
+    assert entry.mtime_ns == os.stat(entry.path).st_mtime_ns
+
+    assert inventory.isfile(os.path.join(directory, "Image.csv"))
+    assert not inventory.isfile(os.path.join(directory, "Nuclei.csv"))
+
+    with pytest.raises(OSError):
+        inventory.getsize(os.path.join(directory, "Nuclei.csv"))
+
+    assert inventory.table_paths() == {
+        "Cells": [os.path.join(plate, "a", "Cells.csv")],
+        "Image": [
+            os.path.join(plate, "a", "Image.csv"),
+            os.path.join(plate, "b", "Image.csv"),
+        ],
+    }
+
+
+@pytest.mark.parametrize("threads", [1, 4])
+def test_scan_recursive(plate, threads):
+    inventory = cytominer_database.inventory.scan(
+        plate, recursive=True, threads=threads
+    )
+
+    # only the directories that contain CSV files, at any depth
+    assert inventory.directories == [
+        os.path.join(plate, "a"),
+        os.path.join(plate, "b"),
+        os.path.join(plate, "batch", "c"),
+    ]
+
+
+def test_inventory_subset(plate):
+    inventory = cytominer_database.inventory.scan(plate)
+
+    directory = os.path.join(plate, "b")
+
+    subset = inventory.subset([directory])
+
+    assert subset.directories == [directory]
+
+    # directories that are not in the inventory are listed when they are looked up
+    other = os.path.join(plate, "a")
+
+    assert subset.csvs(other) == inventory.csvs(other)
+
+
+def test_read_csv_set(plate):
+    config = cytominer_database.utils.read_config("")
+
+    directory = os.path.join(plate, "a")
+
+    inventory = cytominer_database.inventory.scan(plate)
+
+    compartments, image, scans = cytominer_database.utils.read_csv_set(
+        config, directory, inventory=inventory
+    )
+
+    assert compartments == [os.path.join(directory, "Cells.csv")]
+    assert image == os.path.join(directory, "Image.csv")
+    assert set(scans) == {image, compartments[0]}
@@ -0,0 +1,95 @@
+import pyarrow
+import pytest
+
+import cytominer_database.load
+
+CELLS = b"ImageNumber,ObjectNumber,a,b,c\n1,1,1,0.5,x\n1,2,2,,y\n"
+
+
+@pytest.fixture
+def schema():
+    return pyarrow.schema(
+        [
+            ("TableNumber", pyarrow.int64()),
+            ("ImageNumber", pyarrow.int64()),
+            ("ObjectNumber", pyarrow.int64()),
+            ("a", pyarrow.float64()),
+            ("b", pyarrow.float64()),
+            ("c", pyarrow.string()),
+        ]
+    )
+
+
+def test_parse_types(schema):
+    column_types = cytominer_database.load.parse_types(schema)
+
+    assert list(column_types) == ["ImageNumber", "ObjectNumber", "a", "b", "c"]
+    assert column_types["a"] == pyarrow.float64()
+
+    # the prefix of prefixed columns is removed
+    prefixed = pyarrow.schema(
+        [("ImageNumber", pyarrow.int64()), ("Image_a", pyarrow.float64())]
+    )
+
+    assert cytominer_database.load.parse_types(prefixed, "Image") == {
+        "ImageNumber": pyarrow.int64(),
+        "a": pyarrow.float64(),
+    }
+
+    assert cytominer_database.load.parse_types(None) is None
+
+
+@pytest.mark.parametrize("csv_reader", ["pandas", "arrow"])
+def test_get_and_modify_df_schema(tmpdir, schema, csv_reader):
+    filename = str(tmpdir.join("Cells.csv"))
+
+    dataframe = cytominer_database.load.get_and_modify_df(
+        filename, 7, True, buffer=CELLS, csv_reader=csv_reader, schema=schema
+    )
+
+    # the integer column "a" is parsed as float, as in the schema
+    assert dataframe.dtypes["a"] == "float64"
+    assert dataframe.dtypes["ImageNumber"] == "int64"
+    assert dataframe["a"].tolist() == [1.0, 2.0]
+    assert dataframe["TableNumber"].tolist() == [7, 7]
+
+
+def test_get_and_modify_table_schema(tmpdir, schema):
+    filename = str(tmpdir.join("Cells.csv"))
+
+    table = cytominer_database.load.get_and_modify_table(
+        filename, 7, True, buffer=CELLS, schema=schema
+    )
+
+    assert table.schema.equals(schema)
+
+
+@pytest.mark.parametrize("csv_reader", ["pandas", "arrow"])
+def test_get_and_modify_df_schema_mismatch(tmpdir, schema, csv_reader):
+    filename = str(tmpdir.join("Cells.csv"))
+
+    # "b" holds floats and a missing value: the file is parsed with inferred types
+    schema = schema.set(4, pyarrow.field("b", pyarrow.int64()))
+
+    dataframe = cytominer_database.load.get_and_modify_df(
+        filename, 7, True, buffer=CELLS, csv_reader=csv_reader, schema=schema
+    )
+
+    assert dataframe.dtypes["a"] == "int64"
+    assert dataframe.dtypes["b"] == "float64"
+
+
+def test_read_csv_chunks(tmpdir):
+    filename = str(tmpdir.join("Cells.csv"))
+
+    # "a" holds integers in the first chunk only, "b" in every chunk
+    with open(filename, "w") as fd:
+        fd.write("ImageNumber,a,b\n1,1,5\n1,2,6\n2,2.5,7\n")
+
+    chunks = list(cytominer_database.load.read_csv_chunks(filename, 2))
+
+    # every chunk has the column types of the whole file
+    for dataframe in chunks:
+        assert list(dataframe.dtypes) == ["int64", "float64", "int64"]
+
+    assert [dataframe["a"].tolist() for dataframe in chunks] == [[1.0, 2.0], [2.5]]
@@ -1,7 +1,9 @@
 import os.path
 
+import shutil
 import tempfile
 import cytominer_database.munge
+import cytominer_database.utils
 import pandas as pd
 from pandas.testing import assert_frame_equal
 
@@ -33,3 +35,80 @@ def test_munge(dataset):
                 )
 
                 assert_frame_equal(input_csv, output_csv)
+
+
+def test_read_compartments(htqc):
+    config_file = os.path.join(htqc["data_dir"], "config.ini")
+    config = cytominer_database.utils.read_config(config_file)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        directory = os.path.join(temp_dir, "1")
+        shutil.copytree(
+            os.path.join(htqc["data_dir"], "1"),
+            directory,
+            ignore=shutil.ignore_patterns("Cells.csv", "Cytoplasm.csv", "Nuclei.csv"),
+        )
+
+        object_csv, compartments = cytominer_database.munge.read_compartments(
+            config, directory, write_munged=True
+        )
+
+        assert object_csv == os.path.join(directory, "object.csv")
+        assert list(compartments) == ["Cells", "Cytoplasm", "Nuclei"]
+
+        for compartment_name, compartment in compartments.items():
+            csv_filename = compartment_name + ".csv"
+            expected = pd.read_csv(os.path.join(htqc["munged_dir"], "1", csv_filename))
+
+            assert_frame_equal(compartment, expected)
+            assert_frame_equal(
+                pd.read_csv(os.path.join(directory, csv_filename)), expected
+            )
+
+
+def test_munge_incremental(htqc):
+    config_file = os.path.join(htqc["data_dir"], "config.ini")
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        source = os.path.join(temp_dir, "source")
+        shutil.copytree(
+            htqc["data_dir"],
+            source,
+            ignore=shutil.ignore_patterns("Cells.csv", "Cytoplasm.csv", "Nuclei.csv"),
+        )
+
+        valid_directories = cytominer_database.munge.munge(
+            config_path=config_file, source=source, workers=2
+        )
+
+        assert valid_directories == [
+            os.path.join(source, "1"),
+            os.path.join(source, "2"),
+        ]
+
+        for directory in valid_directories:
+            for csv_filename in ["Cells.csv", "Cytoplasm.csv", "Nuclei.csv"]:
+                assert_frame_equal(
+                    pd.read_csv(os.path.join(directory, csv_filename)),
+                    pd.read_csv(
+                        os.path.join(
+                            directory.replace(source, htqc["munged_dir"]),
+                            csv_filename,
+                        )
+                    ),
+                )
+
+        cells = [
+            os.path.join(directory, "Cells.csv") for directory in valid_directories
+        ]
+        mtimes = [os.stat(path).st_mtime_ns for path in cells]
+
+        # the second directory's object CSV changes: only that directory is munged again
+        object_csv = os.path.join(valid_directories[1], "object.csv")
+        os.utime(object_csv, ns=(mtimes[1] + 1000, mtimes[1] + 1000))
+
+        cytominer_database.munge.munge(config_path=config_file, source=source)
+
+        assert os.stat(cells[0]).st_mtime_ns == mtimes[0]
+        assert os.stat(cells[1]).st_mtime_ns > mtimes[1]
+        assert cytominer_database.munge.is_munged(object_csv, valid_directories[1])
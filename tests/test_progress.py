@@ -0,0 +1,107 @@
+import os
+
+import pandas as pd
+import pyarrow
+import pytest
+
+import cytominer_database.ingest
+import cytominer_database.ingest_variable_engine
+import cytominer_database.progress
+
+
+@pytest.fixture
+def plate(tmpdir):
+    tmpdir = tmpdir.mkdir("plate")
+
+    for directory in ["1", "2", "3"]:
+        pd.DataFrame({"ImageNumber": [int(directory)]}).to_csv(
+            tmpdir.join(directory, "Image.csv").ensure(), index=False
+        )
+        pd.DataFrame({"ImageNumber": [int(directory)] * 3, "a": [1, 2, 3]}).to_csv(
+            tmpdir.join(directory, "Cells.csv"), index=False
+        )
+
+    tmpdir.join("config.ini").write("[ingestion_engine]\nengine = SQLite\n")
+
+    return str(tmpdir)
+
+
+def test_progress(tmpdir):
+    lines = []
+    metrics_file = str(tmpdir.join("ingest.prom"))
+
+    progress = cytominer_database.progress.Progress(0, metrics_file, lines.append)
+
+    progress.start(4)
+
+    progress.add_table("Cells", pd.DataFrame({"a": [1.0, 2.0]}))
+    progress.add_table("Image", pyarrow.table({"a": [1.0]}))
+    progress.end_directory()
+
+    assert len(lines) == 1
+    assert lines[0].startswith("[ingest] 1/4 directories (25.0%), 3 rows, 0.0 MB")
+    assert "ETA" in lines[0]
+
+    with open(metrics_file) as fd:
+        metrics = fd.read().splitlines()
+
+    assert "cytominer_database_ingest_directories_total 4.0" in metrics
+    assert "cytominer_database_ingest_directories_done 1.0" in metrics
+    assert 'cytominer_database_ingest_rows_total{table="Cells"} 2' in metrics
+    assert 'cytominer_database_ingest_bytes_total{table="Cells"} 16' in metrics
+
+    progress.end_directory(3)
+
+    assert lines[-1].startswith("[ingest] 4/4 directories (100.0%)")
+    assert lines[-1].endswith("ETA 0:00:00")
+
+    # the final report has the rates of the whole ingest, although no row was added since the last report
+    progress.close()
+
+    assert ", 0 rows/s" not in lines[-1]
+
+    # the metrics file can be read by the scraper
+    assert os.stat(metrics_file).st_mode & 0o777 == 0o644
+
+
+def test_progress_disabled():
+    lines = []
+
+    progress = cytominer_database.progress.Progress(None, echo=lines.append)
+
+    progress.start(1)
+    progress.add("Cells", 10)
+    progress.end_directory()
+    progress.close()
+
+    assert lines == []
+    assert progress.rows["Cells"] == 10
+
+
+@pytest.mark.parametrize(
+    "module,workers",
+    [
+        (cytominer_database.ingest_variable_engine, 1),
+        (cytominer_database.ingest, 1),
+        (cytominer_database.ingest, 2),
+    ],
+)
+def test_seed_progress(plate, tmpdir, module, workers):
+    lines = []
+
+    progress = cytominer_database.progress.Progress(0, echo=lines.append)
+
+    module.seed(
+        plate,
+        "sqlite:///{}".format(tmpdir.join("test.db")),
+        os.path.join(plate, "config.ini"),
+        workers=workers,
+        progress=progress,
+    )
+
+    assert progress.directories == 3
+    assert progress.rows == {"Image": 3, "Cells": 9}
+
+    # every directory (or shard), and the end
+    assert len(lines) == (4 if workers == 1 else 3)
+    assert lines[-1].startswith("[ingest] 3/3 directories (100.0%), 12 rows")
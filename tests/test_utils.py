@@ -0,0 +1,310 @@
+import os.path
+import warnings
+import zlib
+
+import pandas as pd
+import pyarrow
+import pyarrow.parquet as pq
+import pytest
+
+import cytominer_database.tableSchema
+import cytominer_database.utils
+
+
+@pytest.mark.parametrize(
+    "content,valid",
+    [
+        (b"a,b\n1,2\n", True),
+        (b"a,b\r\n1,2\r\n", True),
+        (b'a,b\n"1\n2",3\n', True),
+        (b"", False),
+        (b"a,b\n", False),
+        (b"a,b\n1,2,3\n", False),
+        (b"a,b\n1\n", False),
+        (b"a,b\n1,2\n\n", False),
+        (b"a,b\n\xff,2\n", False),
+        (b"a,b\n\xc3\xa9,2\n", True),
+        (b'a,b\n"1,5",2\n', True),
+        (b"a,b\r1,2\r", True),
+        (b"a,b\r\n1,2\r\n\r\n", False),
+        (b"a,b\n1,2", True),
+        (b"\na,b\n1,2\n", False),
+    ],
+)
+def test_validate_csv_buffer(tmpdir, content, valid):
+    assert cytominer_database.utils.validate_csv_buffer(content) == valid
+
+    csvfile = os.path.join(str(tmpdir), "Cells.csv")
+
+    with open(csvfile, "wb") as fd:
+        fd.write(content)
+
+    assert cytominer_database.utils.validate_csv_file(csvfile) == valid
+
+
+def test_scan_csv(tmpdir):
+    csvfile = os.path.join(str(tmpdir), "Image.csv")
+
+    with open(csvfile, "wb") as fd:
+        fd.write(b"ImageNumber,Metadata_Well\n1,A01\n")
+
+    valid, crc, buffer = cytominer_database.utils.scan_csv(csvfile)
+
+    assert valid
+    assert buffer == b"ImageNumber,Metadata_Well\n1,A01\n"
+    assert crc == zlib.crc32(buffer) & 0xFFFFFFFF
+    assert cytominer_database.utils.validate_csv(csvfile)
+
+
+def test_checksum_cache(tmpdir):
+    csvfile = os.path.join(str(tmpdir), "Image.csv")
+    cache_path = os.path.join(str(tmpdir), "cache", "checksums.json")
+
+    with open(csvfile, "wb") as fd:
+        fd.write(b"a,b\n1,2\n")
+
+    cache = cytominer_database.utils.ChecksumCache(cache_path)
+    crc = cytominer_database.utils.checksum(csvfile, cache)
+
+    assert crc == zlib.crc32(b"a,b\n1,2\n")
+    assert cytominer_database.utils.checksum(csvfile) == crc
+    # the cache file is written by save() only
+    assert not os.path.exists(cache_path)
+
+    cache.save()
+
+    # a new cache is read from disk, and the file is not hashed again
+    cache = cytominer_database.utils.ChecksumCache(cache_path)
+
+    assert cache.get(csvfile) == crc
+
+    stat = os.stat(csvfile)
+    cache.put(csvfile, 42, stat)
+
+    assert cytominer_database.utils.checksum(csvfile, cache) == 42
+
+    # a changed file is hashed again
+    with open(csvfile, "wb") as fd:
+        fd.write(b"a,b\n1,2\n3,4\n")
+
+    assert cytominer_database.utils.checksum(csvfile, cache) == zlib.crc32(
+        b"a,b\n1,2\n3,4\n"
+    )
+
+    # by default, the cache is kept in memory only
+    cache = cytominer_database.utils.open_checksum_cache(
+        cytominer_database.utils.read_config("")
+    )
+
+    assert cache.path is None
+
+
+def test_promote_type():
+    promote_type = cytominer_database.tableSchema.promote_type
+
+    assert promote_type(pyarrow.null(), pyarrow.int64()) == pyarrow.int64()
+    assert promote_type(pyarrow.int64(), pyarrow.float64()) == pyarrow.float64()
+    assert promote_type(pyarrow.float64(), pyarrow.bool_()) == pyarrow.float64()
+    assert promote_type(pyarrow.string(), pyarrow.int64()) == pyarrow.string()
+    assert promote_type(pyarrow.timestamp("s"), pyarrow.int64()) == pyarrow.string()
+    assert promote_type(pyarrow.int64(), pyarrow.int64()) == pyarrow.int64()
+
+
+@pytest.mark.parametrize(
+    "dictionary_columns,expected",
+    [
+        ("auto", ["Image_Metadata_Well", "Image_FileName_DNA"]),
+        ("none", []),
+        ("Image_Text, Image_Count", ["Image_Text"]),
+    ],
+)
+def test_dictionary_schema(dictionary_columns, expected):
+    config = cytominer_database.utils.read_config("")
+    config["parquet"]["dictionary_columns"] = dictionary_columns
+
+    schema = pyarrow.schema(
+        [
+            ("Image_Metadata_Well", pyarrow.string()),
+            ("Image_FileName_DNA", pyarrow.string()),
+            ("Image_Metadata_Site", pyarrow.int64()),
+            ("Image_Text", pyarrow.string()),
+            ("Image_Count", pyarrow.int64()),
+        ]
+    )
+
+    encoded = cytominer_database.tableSchema.dictionary_schema(schema, config)
+
+    # only string columns are encoded
+    assert [
+        field.name for field in encoded if pyarrow.types.is_dictionary(field.type)
+    ] == expected
+    assert encoded.names == schema.names
+
+
+def test_open_parquet_file(tmpdir):
+    config = cytominer_database.utils.read_config("")
+    config["parquet"]["compression"] = "zstd"
+    config["parquet"]["compression_level"] = "9"
+    config["parquet"]["delta_columns"] = "ImageNumber, ObjectNumber"
+    config["parquet"]["write_statistics"] = "ImageNumber"
+
+    table = pyarrow.table(
+        {"ImageNumber": [1, 1, 2], "Cells_a": [0.5, 1.5, 2.5], "Cells_b": ["x"] * 3}
+    )
+    destination = str(tmpdir.join("Cells.parquet"))
+
+    options = cytominer_database.tableSchema.get_parquet_options(table.schema, config)
+
+    # columns missing from the table are ignored
+    assert options["column_encoding"] == {"ImageNumber": "DELTA_BINARY_PACKED"}
+    assert options["use_dictionary"] == ["Cells_a", "Cells_b"]
+
+    writer = cytominer_database.tableSchema.open_parquet_file(
+        destination, table.schema, config
+    )
+    writer.write_table(table)
+    writer.close()
+
+    row_group = pq.ParquetFile(destination).metadata.row_group(0)
+    columns = [row_group.column(index) for index in range(3)]
+
+    assert [column.compression for column in columns] == ["ZSTD"] * 3
+    assert "DELTA_BINARY_PACKED" in columns[0].encodings
+    assert "RLE_DICTIONARY" in columns[2].encodings
+    assert [column.is_stats_set for column in columns] == [True, False, False]
+
+    config["parquet"]["compression"] = "lzma"
+
+    with pytest.raises(ValueError, match="compression"):
+        cytominer_database.tableSchema.get_parquet_options(table.schema, config)
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_sample_reference_paths(tmpdir, workers):
+    contents = {
+        "narrow": "a\n1\n",
+        "wide": "a,b\n1,2\n",
+        "widest": "a,b,c\n1,2\n",  # invalid
+    }
+    paths = []
+    for directory, content in contents.items():
+        tmpdir.mkdir(directory).join("Cells.csv").write(content)
+        paths += [os.path.join(str(tmpdir), directory, "Cells.csv")]
+
+    sample_reference_paths = cytominer_database.tableSchema.sample_reference_paths
+
+    assert cytominer_database.tableSchema.get_header_width(paths[2]) == 3
+
+    # the widest valid file is chosen
+    assert sample_reference_paths(1, {"Cells": list(paths)}, workers=workers) == {
+        "Cells": [paths[1]]
+    }
+
+    # a seed gives the same sample on every run
+    samples = [
+        sample_reference_paths(0.3, {"Cells": list(paths)}, random_seed=seed)
+        for seed in [0, 0, 1, 1]
+    ]
+    assert samples[0] == samples[1]
+    assert samples[2] == samples[3]
+
+
+@pytest.mark.parametrize("type_conversion", ["int2float", "all2string"])
+def test_type_convert_dataframe(type_conversion):
+    config = cytominer_database.utils.read_config("")
+    config["ingestion_engine"]["engine"] = "Parquet"
+    config["schema"]["type_conversion"] = type_conversion
+
+    dataframe = pd.DataFrame(
+        {
+            "TableNumber": [7, 7],
+            "ImageNumber": [1, 2],
+            "a": [1, 2],
+            "b": [0.5, 1.5],
+            "c": ["x", "y"],
+        }
+    )
+
+    converted = cytominer_database.utils.type_convert_dataframe(dataframe, config)
+
+    assert list(converted.columns) == list(dataframe.columns)
+
+    if type_conversion == "int2float":
+        # the key columns stay integers
+        assert list(converted.dtypes) == [
+            "int64",
+            "int64",
+            "float64",
+            "float64",
+            "object",
+        ]
+        assert converted["a"].tolist() == [1.0, 2.0]
+    else:
+        assert all(isinstance(value, str) for value in converted.to_numpy().ravel())
+
+    # same conversion as the Arrow tables
+    table = cytominer_database.utils.type_convert_table(
+        pyarrow.Table.from_pandas(dataframe, preserve_index=False), config
+    )
+
+    assert table.equals(pyarrow.Table.from_pandas(converted, preserve_index=False))
+
+    # the converted columns are assembled in a single block: inserting a column does not warn
+    wide = pd.DataFrame({"c{}".format(i): [i, i] for i in range(200)})
+    wide = cytominer_database.utils.type_convert_dataframe(wide, config)
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("error", pd.errors.PerformanceWarning)
+        wide.insert(0, "TableNumber", 7)
+
+
+def test_narrow_dataframe():
+    config = cytominer_database.utils.read_config("")
+    config["ingestion_engine"]["engine"] = "Parquet"
+    config["schema"]["precision"] = "single"
+
+    dataframe = pd.DataFrame(
+        {
+            "TableNumber": [4000000000, 7],
+            "ImageNumber": [1, 2],
+            "a": [0.5, None],
+            "c": ["x", "y"],
+        }
+    )
+
+    narrowed = cytominer_database.utils.narrow_dataframe(dataframe, config)
+
+    assert list(narrowed.dtypes) == ["uint32", "int32", "float32", "object"]
+    assert narrowed["TableNumber"].tolist() == [4000000000, 7]
+
+    schema = cytominer_database.utils.narrow_schema(
+        pyarrow.Schema.from_pandas(dataframe, preserve_index=False), config
+    )
+
+    assert schema.types[:3] == [pyarrow.uint32(), pyarrow.int32(), pyarrow.float32()]
+
+    # values that do not fit are not wrapped, or rounded to infinity
+    for column, value in [("ImageNumber", 2**31), ("a", 1e300)]:
+        with pytest.raises(ValueError, match=column):
+            cytominer_database.utils.narrow_dataframe(
+                dataframe.assign(**{column: [1, value]}), config
+            )
+
+        with pytest.raises(ValueError, match=column):
+            cytominer_database.utils.narrow_table(
+                pyarrow.Table.from_pandas(dataframe.assign(**{column: [1, value]})),
+                config,
+            )
+
+    config["schema"]["precision"] = "double"
+
+    assert cytominer_database.utils.narrow_dataframe(dataframe, config) is dataframe
+
+    # SQLite columns are not narrowed
+    config["ingestion_engine"]["engine"] = "SQLite"
+    config["schema"]["precision"] = "single"
+
+    with pytest.warns(UserWarning, match="precision = single"):
+        cytominer_database.utils.check_precision(config)
+
+    assert cytominer_database.utils.narrow_dataframe(dataframe, config) is dataframe
@@ -0,0 +1,216 @@
+import os.path
+
+import pandas as pd
+import pyarrow
+import pyarrow.dataset
+import pyarrow.parquet as pq
+import sqlalchemy
+
+import cytominer_database.write
+
+
+def test_conform_table():
+    schema = pyarrow.schema(
+        [
+            ("TableNumber", pyarrow.int64()),
+            ("ImageNumber", pyarrow.int64()),
+            ("Cells_AreaShape_Area", pyarrow.float64()),
+            ("Cells_Location_Center_X", pyarrow.float64()),
+        ]
+    )
+
+    table = pyarrow.table(
+        {
+            "ImageNumber": pyarrow.array([1, 1], pyarrow.int64()),
+            "TableNumber": pyarrow.array([7, 7], pyarrow.int64()),
+            "Cells_AreaShape_Area": pyarrow.array([10, 20], pyarrow.int64()),
+            "Cells_Extra": pyarrow.array(["a", "b"]),
+        }
+    )
+
+    conformed = cytominer_database.write.conform_table(table, schema)
+
+    assert conformed.schema == schema
+    assert conformed.column("Cells_AreaShape_Area").to_pylist() == [10.0, 20.0]
+    assert conformed.column("Cells_Location_Center_X").null_count == 2
+    assert conformed.column("TableNumber").to_pylist() == [7, 7]
+
+
+def test_insert_rows(tmpdir):
+    engine = sqlalchemy.create_engine(
+        "sqlite:///{}".format(os.path.join(str(tmpdir), "test.db"))
+    )
+    dataframe = pd.DataFrame({"ImageNumber": [1, 2], 'Cells_"Quoted"': [0.5, None]})
+
+    with engine.connect() as con:
+        with con.begin():
+            cytominer_database.write.insert_rows(dataframe, "Cells", con)
+            # the table is known to exist, and is not inspected again
+            assert "Cells" in con.info["cytominer_database.tables"]
+            cytominer_database.write.insert_rows(dataframe, "Cells", con)
+
+        cells = pd.read_sql(sql="Cells", con=con)
+
+    engine.dispose()
+
+    assert list(cells.columns) == ["ImageNumber", 'Cells_"Quoted"']
+    assert cells["ImageNumber"].tolist() == [1, 2, 1, 2]
+
+
+def test_buffered_parquet_writer(tmpdir):
+    schema = pyarrow.schema([("ObjectNumber", pyarrow.int64())])
+    destination = os.path.join(str(tmpdir), "Cells.parquet")
+
+    writer = cytominer_database.write.BufferedParquetWriter(
+        pq.ParquetWriter(destination, schema),
+        row_group_rows=100,
+        row_group_bytes=1 << 20,
+    )
+    for start in range(0, 250, 40):
+        table = pyarrow.table(
+            {"ObjectNumber": pyarrow.array(range(start, min(start + 40, 250)))}
+        )
+        writer.write_table(table)
+    writer.close()
+
+    metadata = pq.ParquetFile(destination).metadata
+    assert [
+        metadata.row_group(index).num_rows for index in range(metadata.num_row_groups)
+    ] == [100, 100, 50]
+    assert pq.read_table(destination).column("ObjectNumber").to_pylist() == list(
+        range(250)
+    )
+
+
+def test_partitioned_parquet_writer(tmpdir):
+    partitions = cytominer_database.write.PartitionIndex(
+        ["Metadata_Plate", "Metadata_Well"]
+    )
+
+    def open_file(path, schema):
+        return cytominer_database.write.BufferedParquetWriter(
+            pq.ParquetWriter(path, schema), row_group_rows=100, row_group_bytes=1 << 20
+        )
+
+    image = pyarrow.table(
+        {
+            "TableNumber": [7, 7],
+            "ImageNumber": [1, 2],
+            "Image_Metadata_Plate": ["P1", "P1"],
+            "Image_Metadata_Well": ["A01", "B/02"],
+        }
+    )
+    cells = pyarrow.table(
+        {
+            "TableNumber": [7, 7, 7, 8],
+            "ImageNumber": [1, 2, 1, 1],
+            "ObjectNumber": [1, 1, 2, 1],
+        }
+    )
+
+    writers = [
+        cytominer_database.write.PartitionedParquetWriter(
+            str(tmpdir.join(name)),
+            table.schema,
+            partitions,
+            open_file,
+            max_open_files=1,
+            image=name == "Image",
+        )
+        for name, table in [("Image", image), ("Cells", cells)]
+    ]
+    writers[0].write_table(image)
+    # the partition of every row is found by the image it belongs to
+    for start in range(4):
+        writers[1].write_table(cells.slice(start, 1))
+    for writer in writers:
+        writer.close()
+
+    well = tmpdir.join("Cells", "Metadata_Plate=P1", "Metadata_Well=A01")
+
+    # A01 is written to again after its file was closed for B/02
+    assert sorted(os.listdir(str(well))) == ["part-0.parquet", "part-1.parquet"]
+    assert sorted(os.listdir(str(tmpdir.join("Cells", "Metadata_Plate=P1")))) == [
+        "Metadata_Well=A01",
+        "Metadata_Well=B%2F02",
+    ]
+    # rows of an unknown image
+    assert tmpdir.join(
+        "Cells",
+        "Metadata_Plate=__HIVE_DEFAULT_PARTITION__",
+        "Metadata_Well=__HIVE_DEFAULT_PARTITION__",
+        "part-0.parquet",
+    ).check()
+
+    # the partition columns of the image table are stored in the directory names only
+    table = pq.read_table(
+        str(tmpdir.join("Image", "Metadata_Plate=P1", "Metadata_Well=A01"))
+    )
+    assert table.column_names == ["TableNumber", "ImageNumber"]
+
+    dataset = pyarrow.dataset.dataset(
+        str(tmpdir.join("Cells")), partitioning="hive"
+    ).to_table()
+    assert sorted(
+        zip(
+            dataset.column("ImageNumber").to_pylist(),
+            dataset.column("Metadata_Well").to_pylist(),
+        ),
+        key=str,
+    ) == [(1, "A01"), (1, "A01"), (1, None), (2, "B/02")]
+
+
+def test_buffer_budget(tmpdir):
+    table = pyarrow.table({"TableNumber": [7] * 100, "ObjectNumber": range(100)})
+    budget = cytominer_database.write.BufferBudget(int(table.nbytes * 1.5))
+
+    writers = [
+        cytominer_database.write.BufferedParquetWriter(
+            pq.ParquetWriter(str(tmpdir.join(name)), table.schema),
+            row_group_rows=1000,
+            row_group_bytes=1 << 20,
+        )
+        for name in ["a.parquet", "b.parquet"]
+    ]
+    writers[0].write_table(table)
+    writers[0].write_table(table)
+    budget.add(writers[0])
+    writers[1].write_table(table)
+    budget.add(writers[1])
+
+    # the largest buffer is written to its file
+    assert [writer.nbytes for writer in writers] == [0, table.nbytes]
+
+    budget.remove(writers[1])
+    for writer in writers:
+        writer.close()
+
+    assert pq.read_metadata(str(tmpdir.join("a.parquet"))).num_row_groups == 1
+    assert pq.read_table(str(tmpdir.join("b.parquet"))).equals(table)
+
+
+def test_checkpointed_parquet_writer(tmpdir):
+    def open_file(path, schema):
+        return cytominer_database.write.BufferedParquetWriter(
+            pq.ParquetWriter(path, schema), row_group_rows=100, row_group_bytes=1 << 20
+        )
+
+    cells = pyarrow.table({"TableNumber": [7, 7, 8], "ObjectNumber": [1, 2, 1]})
+
+    writer = cytominer_database.write.CheckpointedParquetWriter(
+        str(tmpdir.join("Cells")), cells.schema, open_file
+    )
+    writer.write_table(cells.slice(0, 2))
+    # the part file is complete once it is checkpointed
+    writer.checkpoint(1)
+    assert pq.read_table(str(tmpdir.join("Cells", "part-00000.parquet"))).num_rows == 2
+    # no file is opened for a checkpoint without rows
+    writer.checkpoint(2)
+    writer.write_table(cells.slice(2, 1))
+    writer.close()
+
+    assert sorted(os.listdir(str(tmpdir.join("Cells")))) == [
+        "part-00000.parquet",
+        "part-00002.parquet",
+    ]
+    assert pq.read_table(str(tmpdir.join("Cells"))).equals(cells)